@@ -0,0 +1,137 @@
+"""Maintenance commands.
+
+    python -m app.cli <command>
+"""
+import argparse
+import asyncio
+from app.database import SessionLocal, engine
+
+
+async def rebuild_search_index(args):
+    from app.core.search import rebuild_search_documents
+
+    async with SessionLocal() as db:
+        count = await rebuild_search_documents(db)
+    print(f"Rebuilt search documents for {count} artisans")
+
+
+async def reconcile_stats(args):
+    from app.core.stats import reconcile_artisan_stats
+
+    async with SessionLocal() as db:
+        count = await reconcile_artisan_stats(db, dry_run=args.dry_run)
+    verb = "would correct" if args.dry_run else "corrected"
+    print(f"Artisan aggregates: {verb} {count} artisans")
+
+
+async def rebuild_review_stats(args):
+    from app.core.stats import rebuild_review_stats as rebuild
+
+    async with SessionLocal() as db:
+        count = await rebuild(db)
+    print(f"Rebuilt review statistics for {count} artisans")
+
+
+async def check_review_stats(args):
+    from app.core.stats import check_review_stats as check
+
+    async with SessionLocal() as db:
+        mismatched = await check(db)
+    if mismatched:
+        print(f"Review statistics out of date for {len(mismatched)} artisans: {mismatched[:20]}")
+        raise SystemExit(1)
+    print("Review statistics are consistent")
+
+
+async def rebuild_facet_counts(args):
+    from app.core.facets import rebuild_facet_counts as rebuild
+
+    async with SessionLocal() as db:
+        count = await rebuild(db)
+    print(f"Rebuilt {count} facet counts")
+
+
+async def check_facet_counts(args):
+    from app.core.facets import check_facet_counts as check
+
+    async with SessionLocal() as db:
+        mismatched = await check(db)
+    if mismatched:
+        sample = sorted(mismatched.items())[:20]
+        print(f"Facet counts out of date for {len(mismatched)} keys (stored, expected): {sample}")
+        raise SystemExit(1)
+    print("Facet counts are consistent")
+
+
+async def purge_tokens(args):
+    from app.core.tokens import purge_expired_tokens
+
+    async with SessionLocal() as db:
+        count = await purge_expired_tokens(db)
+    print(f"Purged {count} expired refresh tokens and revocations")
+
+
+async def import_artisans(args):
+    from app.core.onboarding import import_artisans as run_import, read_records
+
+    async with SessionLocal() as db:
+        report = await run_import(db, read_records(args.path), batch_size=args.batch_size, workers=args.workers)
+    for line, reason in report.skipped:
+        print(f"line {line}: {reason}")
+    print(f"Imported {report.created} artisans, skipped {len(report.skipped)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Fi-Khidmatik maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("rebuild-search-index", help="recompute every artisan search document")
+    command.set_defaults(handler=rebuild_search_index)
+
+    command = commands.add_parser(
+        "reconcile-stats",
+        help="rebuild artisan rating and job counters from reviews and bookings"
+    )
+    command.add_argument("--dry-run", action="store_true", help="only report how many artisans drifted")
+    command.set_defaults(handler=reconcile_stats)
+
+    command = commands.add_parser("rebuild-review-stats", help="recompute artisan_review_stats from reviews")
+    command.set_defaults(handler=rebuild_review_stats)
+
+    command = commands.add_parser(
+        "check-review-stats",
+        help="compare artisan_review_stats with reviews; exits 1 on mismatch"
+    )
+    command.set_defaults(handler=check_review_stats)
+
+    command = commands.add_parser("rebuild-facet-counts", help="recompute artisan_facet_counts from artisans")
+    command.set_defaults(handler=rebuild_facet_counts)
+
+    command = commands.add_parser(
+        "check-facet-counts",
+        help="compare artisan_facet_counts with artisans; exits 1 on mismatch"
+    )
+    command.set_defaults(handler=check_facet_counts)
+
+    command = commands.add_parser("purge-tokens", help="delete expired refresh tokens and revocations")
+    command.set_defaults(handler=purge_tokens)
+
+    command = commands.add_parser("import-artisans", help="create artisans from a .csv or .jsonl file")
+    command.add_argument("path")
+    command.add_argument("--batch-size", type=int, default=500, help="artisans per transaction")
+    command.add_argument("--workers", type=int, default=0, help="password hashing processes (default: CPUs)")
+    command.set_defaults(handler=import_artisans)
+
+    args = parser.parse_args(argv)
+    asyncio.run(_run(args))
+
+
+async def _run(args):
+    try:
+        await args.handler(args)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
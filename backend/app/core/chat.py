@@ -0,0 +1,342 @@
+"""Chat fan-out and persistence.
+
+Connections subscribe to a conversation on a ChatHub, which fans events out
+to per-connection bounded queues. Messages and read receipts go through a
+MessageWriter that persists them in batches. The in-process hub only reaches
+connections of the same worker; set_hub installs a broker-backed hub
+(Redis pub/sub, NATS...) for multi-worker deployments.
+"""
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import bindparam, case, insert, update
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+from app.config import settings
+from app.database import SessionLocal
+from app.models.chat import Conversation, Message
+from app.schemas.chat import MessageResponse
+
+logger = logging.getLogger(__name__)
+
+# Queued in place of an event when a subscriber fell too far behind
+OVERFLOW = None
+
+# Length of conversations.last_message_preview
+PREVIEW_LENGTH = 200
+
+# Largest id a read receipt may name: messages.id is a 32-bit INTEGER
+MAX_MESSAGE_ID = 2**31 - 1
+
+# Queued to the MessageWriter to stop it after a last flush
+_STOP = object()
+
+
+class Subscriber:
+    """One connection's view of a conversation: a bounded event queue."""
+
+    def __init__(self, conversation_id: int, maxsize: int):
+        self.conversation_id = conversation_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def offer(self, event: dict) -> bool:
+        """Queue an event without waiting; False once the queue has overflowed.
+
+        A full queue means the client is not reading. Instead of buffering
+        without bound (or slowing everyone else down), its backlog is dropped
+        and it is told to reconnect and catch up from the message history.
+        """
+        if self.overflowed:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+            return False
+
+
+class ChatHub(ABC):
+    """Publish/subscribe by conversation."""
+
+    @abstractmethod
+    def subscribe(self, conversation_id: int) -> Subscriber:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, subscriber: Subscriber):
+        ...
+
+    @abstractmethod
+    async def publish(self, conversation_id: int, event: dict):
+        ...
+
+
+class InProcessHub(ChatHub):
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscriber]] = defaultdict(set)
+
+    def subscribe(self, conversation_id: int) -> Subscriber:
+        subscriber = Subscriber(conversation_id, self.queue_size)
+        self._subscribers[conversation_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.conversation_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.conversation_id]
+
+    async def publish(self, conversation_id: int, event: dict):
+        for subscriber in list(self._subscribers.get(conversation_id, ())):
+            if not subscriber.offer(event):
+                self.unsubscribe(subscriber)
+
+    def connection_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+_conversations = Conversation.__table__
+_messages = Message.__table__
+
+# Per (conversation, sender) in a batch: bump activity and the other side's unread count
+_sent_by_customer = _conversations.c.customer_id == bindparam("b_sender_id")
+_CONVERSATION_ACTIVITY = (
+    update(_conversations)
+    .where(_conversations.c.id == bindparam("b_conversation_id"))
+    .values(
+        last_message_at=bindparam("b_at"),
+        last_message_preview=bindparam("b_preview"),
+        customer_unread_count=_conversations.c.customer_unread_count
+        + case((_sent_by_customer, 0), else_=bindparam("b_count")),
+        artisan_unread_count=_conversations.c.artisan_unread_count
+        + case((_sent_by_customer, bindparam("b_count")), else_=0),
+    )
+)
+
+_MARK_READ = (
+    update(_messages)
+    .where(
+        _messages.c.conversation_id == bindparam("b_conversation_id"),
+        _messages.c.sender_id != bindparam("b_reader_id"),
+        _messages.c.id <= bindparam("b_up_to_id"),
+        _messages.c.is_read.is_(False)
+    )
+    .values(is_read=True)
+)
+
+
+def _decrement(column):
+    return case((column > bindparam("b_marked"), column - bindparam("b_marked")), else_=0)
+
+
+_read_by_customer = _conversations.c.customer_id == bindparam("b_reader_id")
+_READ_COUNTERS = (
+    update(_conversations)
+    .where(_conversations.c.id == bindparam("b_conversation_id"))
+    .values(
+        customer_unread_count=case(
+            (_read_by_customer, _decrement(_conversations.c.customer_unread_count)),
+            else_=_conversations.c.customer_unread_count
+        ),
+        artisan_unread_count=case(
+            (_read_by_customer, _conversations.c.artisan_unread_count),
+            else_=_decrement(_conversations.c.artisan_unread_count)
+        ),
+    )
+)
+
+
+def _activity_params(rows: List[dict], now: datetime) -> List[dict]:
+    """Parameters for _CONVERSATION_ACTIVITY, one set per (conversation, sender).
+
+    Ordered by each group's last message so that the preview left on a
+    conversation is its latest message.
+    """
+    groups: Dict[Tuple[int, int], dict] = {}
+    for position, row in enumerate(rows):
+        key = (row["conversation_id"], row["sender_id"])
+        group = groups.setdefault(key, {
+            "b_conversation_id": row["conversation_id"], "b_sender_id": row["sender_id"],
+            "b_at": now, "b_count": 0,
+        })
+        group["b_count"] += 1
+        group["b_preview"] = row["content"][:PREVIEW_LENGTH]
+        group["position"] = position
+    params = sorted(groups.values(), key=lambda group: group["position"])
+    for group in params:
+        del group["position"]
+    return params
+
+
+def _is_transient(exc: Exception) -> bool:
+    """Whether a failed write may succeed if retried as is.
+
+    The database was unreachable, busy or slow; integrity and data errors
+    (and anything else) would fail the same way again.
+    """
+    if isinstance(exc, DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+    return isinstance(exc, (PoolTimeoutError, OSError, asyncio.TimeoutError))
+
+
+class MessageWriter:
+    """Persists chat messages and read receipts in batches.
+
+    Senders queue a message and wait for it to be stored (they need its id).
+    A single background task drains whatever has queued up since its last
+    flush and writes it in one transaction: one multi-row INSERT ... RETURNING
+    for messages and one executemany UPDATE of conversation activity (last
+    message, unread counters). Read receipts follow in a transaction of their
+    own, so a bad receipt cannot cost anyone their messages. Batches
+    therefore grow with load and cost no added latency when idle. The queue
+    is bounded, so senders wait (and stop reading their sockets) when the
+    database falls behind.
+
+    When messages fail to store, their senders get the error. Read receipts
+    that fail are kept for the next flush if the error was transient
+    (_is_transient), and otherwise retried one by one so that only the
+    receipts the database rejects are dropped.
+    """
+
+    def __init__(self, sessionmaker=SessionLocal, batch_size: int = 500, queue_size: int = 10_000):
+        self.sessionmaker = sessionmaker
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._reads: Dict[Tuple[int, int], int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def send(self, conversation_id: int, sender_id: int, content: str) -> MessageResponse:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((conversation_id, sender_id, content, future))
+        return await future
+
+    def mark_read(self, conversation_id: int, reader_id: int, up_to_id: int):
+        """Mark the other side's messages up to `up_to_id` read (on the next flush)."""
+        if not 0 < up_to_id <= MAX_MESSAGE_ID:
+            raise ValueError(f"Message id out of range: {up_to_id}")
+        self._ensure_started()
+        key = (conversation_id, reader_id)
+        self._reads[key] = max(self._reads.get(key, 0), up_to_id)
+        try:
+            self._queue.put_nowait(None)  # wake the writer
+        except asyncio.QueueFull:
+            pass  # busy writer: it flushes reads with the next batch anyway
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            stopping = _STOP in batch
+            messages = [item for item in batch if item is not None and item is not _STOP]
+            reads, self._reads = self._reads, {}
+            if messages:
+                try:
+                    stored = await self._flush_messages(messages)
+                except Exception as exc:
+                    # Senders get the error and may resend
+                    logger.exception("Failed to persist %d chat messages", len(messages))
+                    for *_, future in messages:
+                        if not future.done():
+                            future.set_exception(exc)
+                else:
+                    for (*_, future), message in zip(messages, stored):
+                        if not future.done():
+                            future.set_result(message)
+            if reads:
+                await self._write_reads(reads)
+            if stopping:
+                return
+
+    async def _flush_messages(self, messages: List[tuple]) -> List[MessageResponse]:
+        async with self.sessionmaker() as db:
+            now = datetime.utcnow()
+            rows = [
+                {"conversation_id": conversation_id, "sender_id": sender_id, "content": content,
+                 "is_read": False, "created_at": now}
+                for conversation_id, sender_id, content, _ in messages
+            ]
+            ids = (await db.execute(
+                insert(Message).returning(Message.id, sort_by_parameter_order=True), rows
+            )).scalars().all()
+            await db.execute(_CONVERSATION_ACTIVITY, _activity_params(rows, now))
+            await db.commit()
+        return [MessageResponse(id=message_id, **row) for message_id, row in zip(ids, rows)]
+
+    async def _write_reads(self, reads: Dict[Tuple[int, int], int]):
+        try:
+            await self._flush_reads(reads)
+            return
+        except Exception as exc:
+            if _is_transient(exc) or len(reads) == 1:
+                self._failed_reads(reads, exc)
+                return
+        # Rejected by the database: find the receipts it rejects
+        for key, up_to_id in reads.items():
+            try:
+                await self._flush_reads({key: up_to_id})
+            except Exception as exc:
+                self._failed_reads({key: up_to_id}, exc)
+
+    def _failed_reads(self, reads: Dict[Tuple[int, int], int], exc: Exception):
+        if not _is_transient(exc):
+            logger.error("Dropped %d chat read receipts: %r", len(reads), exc)
+            return
+        logger.warning("Failed to persist %d chat read receipts, retrying: %r", len(reads), exc)
+        for key, up_to_id in reads.items():
+            self._reads[key] = max(self._reads.get(key, 0), up_to_id)
+
+    async def _flush_reads(self, reads: Dict[Tuple[int, int], int]):
+        async with self.sessionmaker() as db:
+            for (conversation_id, reader_id), up_to_id in reads.items():
+                # One statement per reader so the number of rows marked read is
+                # known; the reader's unread counter drops by exactly that much
+                marked = (await db.execute(_MARK_READ, {
+                    "b_conversation_id": conversation_id, "b_reader_id": reader_id, "b_up_to_id": up_to_id
+                })).rowcount
+                if marked:
+                    await db.execute(_READ_COUNTERS, {
+                        "b_conversation_id": conversation_id, "b_reader_id": reader_id, "b_marked": marked
+                    })
+            await db.commit()
+
+    async def close(self):
+        """Stop the writer after flushing what is queued."""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+
+_hub: ChatHub = InProcessHub(settings.CHAT_SUBSCRIBER_QUEUE_SIZE)
+message_writer = MessageWriter(
+    batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+    queue_size=settings.CHAT_WRITE_QUEUE_SIZE
+)
+
+
+def set_hub(hub: ChatHub):
+    global _hub
+    _hub = hub
+
+
+def get_hub() -> ChatHub:
+    return _hub
@@ -0,0 +1,221 @@
+"""Listing facets: artisan counts by category, city, availability and rating.
+
+artisan_facet_counts holds the number of artisans for every (category, city,
+availability, rating bucket) key, so the facets of a listing are sums over
+its rows (a few hundred, however many artisans there are) instead of a
+GROUP BY over artisans joined to their services. Each facet applies every
+filter but its own: a listing filtered on plumbing still counts the other
+categories.
+
+Writers keep the table current in their own transaction: load_facet_keys
+before changing an artisan, refresh_artisan_facets after. Text searches
+match a set of artisans the table knows nothing about; their facets are
+counted from the source tables over every match
+(app.core.search.matching_artisans), at a cost that grows with the matches.
+"""
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.artisan import Artisan, ArtisanService, ArtisanFacetCount
+
+# Category of the keys that count every artisan once
+ALL_CATEGORIES = ""
+
+# Rating facet: artisans rated at least each threshold
+RATING_THRESHOLDS = (4.5, 4.0, 3.0, 2.0, 1.0)
+
+KEY_COLUMNS = ("category", "city", "is_available", "rating_bucket")
+
+# (category, city, is_available, rating_bucket)
+FacetKey = Tuple[str, str, bool, int]
+
+
+def rating_bucket(rating: Optional[float]) -> int:
+    """Half stars below `rating`: 4.49 is in bucket 8, 4.5 in bucket 9."""
+    return min(10, max(0, int((rating or 0.0) * 2)))
+
+
+def facet_keys(city: str, is_available: Optional[bool], rating: Optional[float],
+               categories: Iterable[str]) -> Set[FacetKey]:
+    """Keys one artisan counts under."""
+    bucket = rating_bucket(rating)
+    return {(category, city, bool(is_available), bucket) for category in {ALL_CATEGORIES, *categories}}
+
+
+async def load_facet_keys(db: AsyncSession, artisan_id: int) -> Set[FacetKey]:
+    row = (await db.execute(
+        select(Artisan.city, Artisan.is_available, Artisan.rating).where(Artisan.id == artisan_id)
+    )).first()
+    if row is None:
+        return set()
+    categories = (await db.scalars(
+        select(ArtisanService.category).where(ArtisanService.artisan_id == artisan_id)
+    )).all()
+    return facet_keys(row.city, row.is_available, row.rating, categories)
+
+
+async def apply_facet_changes(db: AsyncSession, changes: Dict[FacetKey, int]):
+    """Add `changes` (key: artisans) to artisan_facet_counts in the current transaction.
+
+    Like app.core.stats.record_review_stats, an upsert whose increments are
+    applied by the database, so concurrent writers cannot lose updates.
+    """
+    rows = [
+        {**dict(zip(KEY_COLUMNS, key)), "artisan_count": delta}
+        for key, delta in changes.items() if delta
+    ]
+    if not rows:
+        return
+    table = ArtisanFacetCount.__table__
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[column] for column in KEY_COLUMNS],
+            set_={"artisan_count": table.c.artisan_count + statement.excluded.artisan_count}
+        )
+        await db.execute(statement, rows)
+        return
+
+    for row in rows:
+        result = await db.execute(
+            update(table)
+            .where(*(table.c[column] == row[column] for column in KEY_COLUMNS))
+            .values(artisan_count=table.c.artisan_count + row["artisan_count"])
+        )
+        if result.rowcount == 0:
+            await db.execute(insert(table).values(**row))
+
+
+async def refresh_artisan_facets(db: AsyncSession, artisan_id: int, previous: Set[FacetKey]):
+    """Move an artisan from its `previous` keys to its current ones."""
+    await db.flush()
+    current = await load_facet_keys(db, artisan_id)
+    changes = {key: 1 for key in current - previous}
+    changes.update({key: -1 for key in previous - current})
+    await apply_facet_changes(db, changes)
+
+
+async def record_rating_change(db: AsyncSession, artisan_id: int, old_rating: float, new_rating: float):
+    """Move an artisan whose rating changed to its new rating bucket, if it changed bucket."""
+    old_bucket = rating_bucket(old_rating)
+    if old_bucket == rating_bucket(new_rating):
+        return
+    current = await load_facet_keys(db, artisan_id)
+    changes = {key: 1 for key in current}
+    changes.update({(category, city, available, old_bucket): -1 for category, city, available, _ in current})
+    await apply_facet_changes(db, changes)
+
+
+async def record_new_artisans(db: AsyncSession, keys: Iterable[Set[FacetKey]]):
+    """Count newly inserted artisans, given the keys of each."""
+    await apply_facet_changes(db, Counter(key for artisan_keys in keys for key in artisan_keys))
+
+
+async def load_facet_counts(db: AsyncSession) -> Dict[FacetKey, int]:
+    rows = (await db.execute(
+        select(*(ArtisanFacetCount.__table__.c[column] for column in KEY_COLUMNS), ArtisanFacetCount.artisan_count)
+        .where(ArtisanFacetCount.artisan_count > 0)
+    )).all()
+    return {tuple(row[:4]): row.artisan_count for row in rows}
+
+
+async def compute_facet_counts(db: AsyncSession, artisan_ids=None) -> Dict[FacetKey, int]:
+    """Facet counts from `artisans` and `artisan_services`.
+
+    Of every artisan, or of those in `artisan_ids`, a selectable of ids such
+    as app.core.search.matching_artisans returns.
+    """
+    artisans = select(Artisan.id, Artisan.city, Artisan.is_available, Artisan.rating)
+    services = select(ArtisanService.artisan_id, ArtisanService.category).distinct()
+    if artisan_ids is not None:
+        artisans = artisans.where(Artisan.id.in_(artisan_ids))
+        services = services.where(ArtisanService.artisan_id.in_(artisan_ids))
+
+    categories = defaultdict(list)
+    for row in (await db.execute(services)).all():
+        categories[row.artisan_id].append(row.category)
+
+    counts = Counter()
+    for row in (await db.execute(artisans)).all():
+        counts.update(facet_keys(row.city, row.is_available, row.rating, categories.get(row.id, ())))
+    return dict(counts)
+
+
+async def rebuild_facet_counts(db: AsyncSession) -> int:
+    """Replace artisan_facet_counts with counts from the source tables (backfill)."""
+    counts = await compute_facet_counts(db)
+    await db.execute(delete(ArtisanFacetCount))
+    if counts:
+        await db.execute(insert(ArtisanFacetCount), [
+            {**dict(zip(KEY_COLUMNS, key)), "artisan_count": count} for key, count in counts.items()
+        ])
+    await db.commit()
+    return len(counts)
+
+
+async def check_facet_counts(db: AsyncSession) -> Dict[FacetKey, Tuple[int, int]]:
+    """Keys whose stored count disagrees with the source tables: (stored, expected)."""
+    expected = await compute_facet_counts(db)
+    stored = await load_facet_counts(db)
+    return {
+        key: (stored.get(key, 0), expected.get(key, 0))
+        for key in set(expected) | set(stored)
+        if stored.get(key, 0) != expected.get(key, 0)
+    }
+
+
+def summarize_facets(
+    counts: Dict[FacetKey, int],
+    city: Optional[str] = None,
+    category: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    is_available: Optional[bool] = None,
+) -> dict:
+    """Facets of a listing with the given filters, from facet counts.
+
+    The city filter matches like the listing's (a case-insensitive
+    substring); min_rating applies at half-star precision, rounded down.
+    """
+    min_bucket = rating_bucket(min_rating) if min_rating is not None else 0
+    selected = category or ALL_CATEGORIES
+
+    def matches(key: FacetKey, ignore: str) -> bool:
+        _, key_city, key_available, bucket = key
+        return (
+            (ignore == "city" or not city or city.lower() in key_city.lower())
+            and (ignore == "availability" or is_available is None or key_available == is_available)
+            and (ignore == "rating" or bucket >= min_bucket)
+        )
+
+    total = 0
+    categories, cities, availability, ratings = Counter(), Counter(), Counter(), Counter()
+    for key, count in counts.items():
+        key_category, key_city, key_available, bucket = key
+        if key_category != ALL_CATEGORIES and matches(key, "category"):
+            categories[key_category] += count
+        if key_category != selected:
+            continue
+        if matches(key, ""):
+            total += count
+        if matches(key, "city"):
+            cities[key_city] += count
+        if matches(key, "availability"):
+            availability["available" if key_available else "unavailable"] += count
+        if matches(key, "rating"):
+            for threshold in RATING_THRESHOLDS:
+                if bucket >= threshold * 2:
+                    ratings[f"{threshold:g}"] += count
+
+    return {
+        "total": total,
+        "categories": dict(categories.most_common()),
+        "cities": dict(cities.most_common()),
+        "availability": dict(availability),
+        "ratings": {f"{threshold:g}": ratings[f"{threshold:g}"] for threshold in RATING_THRESHOLDS},
+    }
@@ -0,0 +1,116 @@
+import math
+from typing import List, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Precision stored on artisans: a 6-char geohash is a ~1.2km x 0.6km cell
+GEOHASH_PRECISION = 6
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Upper bound on the number of cells (index range scans) used for one search
+MAX_SEARCH_CELLS = 32
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points, in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def encode_geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # geohash interleaves bits starting with longitude
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """(height, width) in degrees of a geohash cell at the given precision."""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) enclosing the circle around a point.
+
+    Longitude wrap-around at the antimeridian is not handled; the box is clamped.
+    """
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(lat))
+    d_lng = 180.0 if cos_lat < 1e-6 else min(180.0, d_lat / cos_lat)
+    return (
+        max(-90.0, lat - d_lat),
+        min(90.0, lat + d_lat),
+        max(-180.0, lng - d_lng),
+        min(180.0, lng + d_lng),
+    )
+
+
+def _cells_at_precision(bbox: Tuple[float, float, float, float], precision: int) -> List[str]:
+    min_lat, max_lat, min_lng, max_lng = bbox
+    cell_h, cell_w = cell_size_degrees(precision)
+
+    # Snap to the grid so that every cell overlapping the box is visited once
+    lat_start = math.floor((min_lat + 90.0) / cell_h)
+    lat_end = math.floor(min(max_lat + 90.0, 180.0 - 1e-9) / cell_h)
+    lng_start = math.floor((min_lng + 180.0) / cell_w)
+    lng_end = math.floor(min(max_lng + 180.0, 360.0 - 1e-9) / cell_w)
+
+    cells = []
+    for i in range(lat_start, lat_end + 1):
+        center_lat = -90.0 + (i + 0.5) * cell_h
+        for j in range(lng_start, lng_end + 1):
+            center_lng = -180.0 + (j + 0.5) * cell_w
+            cells.append(encode_geohash(center_lat, center_lng, precision))
+    return cells
+
+
+def covering_cells(
+    bbox: Tuple[float, float, float, float],
+    max_cells: int = MAX_SEARCH_CELLS
+) -> List[str]:
+    """Geohash prefixes covering a bounding box.
+
+    Uses the finest precision (at most GEOHASH_PRECISION) that needs no more
+    than `max_cells` prefixes, so each search is a handful of index range scans.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        min_lat, max_lat, min_lng, max_lng = bbox
+        cell_h, cell_w = cell_size_degrees(precision)
+        estimate = (math.ceil((max_lat - min_lat) / cell_h) + 1) * (math.ceil((max_lng - min_lng) / cell_w) + 1)
+        if estimate > max_cells * 2:
+            continue
+        cells = _cells_at_precision(bbox, precision)
+        if len(cells) <= max_cells:
+            return sorted(set(cells))
+    return _cells_at_precision(bbox, 1)
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Smallest string greater than every geohash starting with `prefix`."""
+    return prefix + "~"
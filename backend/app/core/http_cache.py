@@ -0,0 +1,181 @@
+import hashlib
+import re
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+from app.config import settings
+from app.core.cache import TTLCache
+
+# Public GET routes served from the response cache, with the Cache-Control
+# header sent to clients. Catalog lists change on deploys only; artisan pages
+# change whenever the artisan edits them, so clients revalidate every time
+# (a 304 costs no query and no serialization).
+STATIC = "public, max-age=3600"
+REVALIDATE = "public, no-cache"
+
+CACHE_RULES = (
+    (re.compile(r"^/api/categories$"), STATIC),
+    (re.compile(r"^/api/cities$"), STATIC),
+    (re.compile(r"^/api/artisans/categories$"), STATIC),
+    (re.compile(r"^/api/artisans/\d+$"), REVALIDATE),
+    (re.compile(r"^/api/reviews/stats/\d+$"), REVALIDATE),
+)
+
+# Query strings cached per path; others are served uncached
+MAX_VARIANTS = 16
+
+# Not replayed from the cache: recomputed for each response
+HOP_HEADERS = {"content-length", "etag", "cache-control"}
+
+# (body, headers of the response as sent by the route, etag)
+CachedResponse = Tuple[bytes, List[Tuple[str, str]], str]
+
+# What a path's cache key holds: its responses by query string
+CachedVariants = Dict[str, CachedResponse]
+
+
+class CacheBackend(ABC):
+    """Storage for cached responses.
+
+    The default keeps entries in process memory. A shared store (Redis,
+    memcached) can be plugged in with set_cache_backend so that invalidations
+    reach every worker.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[CachedVariants]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: CachedVariants, ttl: float):
+        ...
+
+    @abstractmethod
+    async def delete(self, *keys: str):
+        ...
+
+    @abstractmethod
+    async def clear(self):
+        ...
+
+
+class InMemoryBackend(CacheBackend):
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[CachedVariants]:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: CachedVariants, ttl: float):
+        self.cache.set(key, value, ttl)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.cache.delete(key)
+
+    async def clear(self):
+        self.cache.clear()
+
+
+_backend: CacheBackend = InMemoryBackend(settings.HTTP_CACHE_SIZE, settings.HTTP_CACHE_TTL_SECONDS)
+
+
+def set_cache_backend(backend: CacheBackend):
+    global _backend
+    _backend = backend
+
+
+def get_cache_backend() -> CacheBackend:
+    return _backend
+
+
+# Invalidations per cache key in this process. A fill that was already
+# running when its key was invalidated may have read the old data, so it is
+# not stored.
+_invalidations: Counter = Counter()
+
+
+async def invalidate_artisan(artisan_id: int):
+    """Drop the cached profile and review stats of one artisan."""
+    keys = (f"/api/artisans/{artisan_id}", f"/api/reviews/stats/{artisan_id}")
+    _invalidations.update(keys)
+    await _backend.delete(*keys)
+
+
+def make_etag(body: bytes) -> str:
+    # Strong validator: the hash of the exact bytes sent
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _cache_control(path: str) -> Optional[str]:
+    for pattern, cache_control in CACHE_RULES:
+        if pattern.match(path):
+            return cache_control
+    return None
+
+
+class HTTPCacheMiddleware(BaseHTTPMiddleware):
+    """Serve the routes in CACHE_RULES from a response cache, with ETag/304.
+
+    Entries are keyed on the path and hold a response per query string (up
+    to MAX_VARIANTS), so that invalidating a path drops every variant of
+    it. They expire after HTTP_CACHE_TTL_SECONDS; routes that change an
+    artisan call invalidate_artisan after committing. The cached routes read
+    from the primary, so a refill never sees a replica that is behind the
+    invalidating commit.
+
+    The route's own headers are cached and replayed with the body; headers
+    that depend on the request (CORS) are added by the middleware around
+    this one.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        cache_control = _cache_control(request.url.path) if request.method in ("GET", "HEAD") else None
+        if cache_control is None:
+            return await call_next(request)
+
+        key, query = request.url.path, request.url.query
+        head = request.method == "HEAD"
+        variants = await _backend.get(key) or {}
+        cached = variants.get(query)
+        if cached is None:
+            generation = _invalidations[key]
+            # The routes answer GET only: HEAD is filled from GET, without the body
+            request.scope["method"] = "GET"
+            try:
+                response = await call_next(request)
+            finally:
+                request.scope["method"] = "HEAD" if head else "GET"
+            if response.status_code != 200:
+                return response
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            headers = [(name, value) for name, value in response.headers.items() if name not in HOP_HEADERS]
+            cached = (body, headers, make_etag(body))
+            if _invalidations[key] == generation:
+                # Re-read: other variants may have been stored meanwhile
+                variants = await _backend.get(key) or {}
+                if query in variants or len(variants) < MAX_VARIANTS:
+                    await _backend.set(key, {**variants, query: cached}, settings.HTTP_CACHE_TTL_SECONDS)
+
+        body, headers, etag = cached
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            response = Response(status_code=304)
+        elif head:
+            response = Response(headers={"Content-Length": str(len(body))})
+        else:
+            response = Response(content=body)
+        for name, value in headers:
+            response.headers.append(name, value)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+        return response
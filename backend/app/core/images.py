@@ -0,0 +1,90 @@
+"""Image validation and thumbnails.
+
+process_image runs in a worker process (see app.core.uploads.image_pool):
+decoding and resizing are CPU-bound and would stall the event loop.
+"""
+import os
+from typing import Dict, Optional
+from app.config import settings
+
+# Thumbnail name -> longest side in pixels
+THUMBNAIL_SIZES = {"sm": 160, "md": 480, "lg": 1080}
+
+# Which thumbnail each kind of response shows
+AVATAR_THUMBNAIL = "sm"
+PORTFOLIO_THUMBNAIL = "md"
+
+ALLOWED_FORMATS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+# Decompression-bomb guard: refuse images above this many pixels
+MAX_IMAGE_PIXELS = 40_000_000
+
+UPLOADS_URL = "/uploads/"
+
+
+def _is_upload(url: Optional[str]) -> bool:
+    if not url:
+        return False
+    return url.startswith(UPLOADS_URL) or bool(
+        settings.STORAGE_PUBLIC_URL and url.startswith(settings.STORAGE_PUBLIC_URL)
+    )
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """File extension of an allowed image format, from its first bytes."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def thumbnail_url(url: Optional[str], size: str) -> Optional[str]:
+    """URL of a thumbnail of an uploaded image; other URLs are returned as is."""
+    if not _is_upload(url):
+        return url
+    stem = url.rsplit(".", 1)[0]
+    return f"{stem}_{size}.webp"
+
+
+def thumbnail_urls(url: Optional[str]) -> Dict[str, str]:
+    if not _is_upload(url):
+        return {}
+    return {size: thumbnail_url(url, size) for size in THUMBNAIL_SIZES}
+
+
+def process_image(source: str, directory: str, stem: str) -> str:
+    """Validate an uploaded image, store it and its WebP thumbnails.
+
+    Moves `source` to `directory/stem.<ext>` and writes
+    `directory/stem_<size>.webp` for each of THUMBNAIL_SIZES. Returns the
+    stored file name; raises ValueError for anything that is not an image in
+    ALLOWED_FORMATS.
+    """
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    try:
+        with Image.open(source) as image:
+            image_format = image.format
+            image.verify()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as exc:
+        raise ValueError("Invalid image") from exc
+    if image_format not in ALLOWED_FORMATS:
+        raise ValueError("Unsupported image format")
+
+    os.makedirs(directory, exist_ok=True)
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        for size, pixels in THUMBNAIL_SIZES.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail((pixels, pixels), Image.LANCZOS)
+            thumbnail.save(os.path.join(directory, f"{stem}_{size}.webp"), "WEBP", quality=80, method=4)
+
+    name = f"{stem}.{ALLOWED_FORMATS[image_format]}"
+    os.replace(source, os.path.join(directory, name))
+    return name
@@ -0,0 +1,140 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User
+from app.models.artisan import Artisan, ArtisanService
+from app.schemas.artisan import ArtisanListResponse, ServiceResponse
+from app.core.pagination import decode_cursor, encode_cursor
+
+# Only the columns ArtisanListResponse needs
+LIST_COLUMNS = (
+    Artisan.id,
+    Artisan.user_id,
+    User.full_name,
+    User.avatar,
+    Artisan.bio,
+    Artisan.city,
+    Artisan.rating,
+    Artisan.total_reviews,
+    Artisan.is_available,
+    Artisan.is_verified,
+)
+
+SERVICE_COLUMNS = (
+    ArtisanService.artisan_id,
+    ArtisanService.id,
+    ArtisanService.category,
+    ArtisanService.name,
+    ArtisanService.description,
+    ArtisanService.price_min,
+    ArtisanService.price_max,
+    ArtisanService.price_type,
+)
+
+
+def artisan_filters(
+    city: Optional[str] = None,
+    category: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    is_available: Optional[bool] = None,
+) -> list:
+    """WHERE clauses on `artisans` for the listing filters.
+
+    The category filter is an EXISTS so it never multiplies rows; text search
+    is applied separately through app.core.search.ranked_matches, which
+    takes these clauses.
+    """
+    clauses = []
+
+    if city:
+        clauses.append(Artisan.city.ilike(f"%{city}%"))
+
+    if category:
+        clauses.append(
+            select(ArtisanService.id).where(
+                ArtisanService.artisan_id == Artisan.id,
+                ArtisanService.category == category
+            ).exists()
+        )
+
+    if min_rating is not None:
+        clauses.append(Artisan.rating >= min_rating)
+
+    if is_available is not None:
+        clauses.append(Artisan.is_available == is_available)
+
+    return clauses
+
+
+async def load_services(db: AsyncSession, artisan_ids: Iterable[int]) -> Dict[int, List[ServiceResponse]]:
+    """Services for a page of artisans in a single batched query."""
+    services = defaultdict(list)
+    artisan_ids = list(artisan_ids)
+    if not artisan_ids:
+        return services
+
+    rows = (await db.execute(
+        select(*SERVICE_COLUMNS)
+        .where(ArtisanService.artisan_id.in_(artisan_ids))
+        .order_by(ArtisanService.artisan_id, ArtisanService.id)
+    )).all()
+    for row in rows:
+        data = row._asdict()
+        services[data.pop("artisan_id")].append(ServiceResponse(**data))
+    return services
+
+
+async def list_artisans(
+    db: AsyncSession,
+    filters: list,
+    cursor: Optional[str],
+    limit: int,
+    skip: int = 0,
+    ranking=None,
+) -> Tuple[List[ArtisanListResponse], Optional[str]]:
+    """One page of the artisan listing.
+
+    Artisans are filtered, ordered and limited in a subquery over `artisans`
+    alone, then joined to `users` for the projection; services are loaded in
+    one extra query. Pages are ordered by (rating, id) descending, or by
+    (rank, id) when a `ranking` selectable of (artisan_id, rank) from a text
+    search is given. Returns the page and the cursor of the next one.
+    """
+    if ranking is not None:
+        sort_key = ranking.c.rank
+        page = select(Artisan.id, sort_key.label("sort_key")).join(
+            ranking, ranking.c.artisan_id == Artisan.id
+        )
+    else:
+        sort_key = Artisan.rating
+        page = select(Artisan.id, sort_key.label("sort_key"))
+
+    page = page.where(*filters)
+    if cursor:
+        key, artisan_id = decode_cursor(cursor, float, int)
+        page = page.where(tuple_(sort_key, Artisan.id) < tuple_(key, artisan_id))
+    page = page.order_by(sort_key.desc(), Artisan.id.desc()).limit(limit + 1)
+    if skip and not cursor:
+        page = page.offset(skip)
+    page = page.subquery()
+
+    rows = (await db.execute(
+        select(*LIST_COLUMNS, page.c.sort_key)
+        .join(page, page.c.id == Artisan.id)
+        .join(User, User.id == Artisan.user_id)
+        .order_by(page.c.sort_key.desc(), page.c.id.desc())
+    )).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].sort_key, rows[-1].id)
+
+    services = await load_services(db, [row.id for row in rows])
+    result = []
+    for row in rows:
+        data = row._asdict()
+        data.pop("sort_key")
+        result.append(ArtisanListResponse(**data, services=services.get(row.id, [])))
+    return result, next_cursor
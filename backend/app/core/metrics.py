@@ -0,0 +1,237 @@
+"""Request metrics: latency, database work and serialization per route.
+
+MetricsMiddleware times every HTTP request and counts its SQL statements
+(app.database.track_queries); TimedRoute splits off serialization, the
+response-model validation and JSON encoding that follow the endpoint. Per
+route (method and path template) the latest METRICS_WINDOW requests give the
+p50/p95/p99 exposed on /metrics in the Prometheus text format; each response
+also reports its own timings in a Server-Timing header. Requests running more than
+N_PLUS_ONE_THRESHOLD statements are counted and logged with their most
+repeated statement, which is usually a query issued in a loop.
+
+Metrics are per process: with several workers, scrape each one.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi.routing import APIRoute
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from app.config import settings
+from app.database import engine, get_pool_stats, replica_engines, track_queries
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+UNMATCHED = "unmatched"  # requests no route matched share one label
+
+
+class Window:
+    """Latest samples of one measurement, plus running totals."""
+
+    def __init__(self, size: int):
+        self._samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self._samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, quantiles: Iterable[float] = QUANTILES) -> List[Tuple[float, float]]:
+        samples = sorted(self._samples)
+        if not samples:
+            return []
+        return [(q, samples[min(len(samples) - 1, int(q * len(samples)))]) for q in quantiles]
+
+
+class RouteMetrics:
+    def __init__(self, window: int):
+        self.duration = Window(window)
+        self.db_statements = Window(window)
+        self.db_duration = Window(window)
+        self.serialization = Window(window)
+        self.statuses: Counter = Counter()
+        self.n_plus_one = 0
+
+
+class RequestTiming:
+    """Serialization time of the current request, filled in by TimedRoute."""
+
+    __slots__ = ("endpoint_done", "serialization")
+
+    def __init__(self):
+        self.endpoint_done: Optional[float] = None
+        self.serialization = 0.0
+
+
+_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+_routes: Dict[Tuple[str, str], RouteMetrics] = {}
+_lock = threading.Lock()
+
+
+def _endpoint_done():
+    timing = _timing.get()
+    if timing is not None:
+        timing.endpoint_done = time.perf_counter()
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records when its endpoint returns.
+
+    What the handler does after that (validating the return value against
+    the response model, encoding it, building the response) is the request's
+    serialization time.
+    """
+
+    def get_route_handler(self):
+        call = self.dependant.call
+        if not getattr(call, "_timed", False):
+            if asyncio.iscoroutinefunction(call):
+                @functools.wraps(call)
+                async def endpoint(*args, **kwargs):
+                    try:
+                        return await call(*args, **kwargs)
+                    finally:
+                        _endpoint_done()
+            else:
+                @functools.wraps(call)
+                def endpoint(*args, **kwargs):
+                    try:
+                        return call(*args, **kwargs)
+                    finally:
+                        _endpoint_done()
+            endpoint._timed = True
+            self.dependant.call = endpoint
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request):
+            response = await handler(request)
+            timing = _timing.get()
+            if timing is not None and timing.endpoint_done is not None:
+                timing.serialization = time.perf_counter() - timing.endpoint_done
+            return response
+
+        return timed_handler
+
+
+def record(method: str, route: str, status_code: int, duration: float, statements: int,
+           db_duration: float, serialization: float) -> RouteMetrics:
+    with _lock:
+        metrics = _routes.get((method, route))
+        if metrics is None:
+            metrics = _routes[(method, route)] = RouteMetrics(settings.METRICS_WINDOW)
+        metrics.duration.add(duration)
+        metrics.db_statements.add(statements)
+        metrics.db_duration.add(db_duration)
+        metrics.serialization.add(serialization)
+        metrics.statuses[status_code] += 1
+    return metrics
+
+
+def _flag_n_plus_one(method: str, route: str, metrics: RouteMetrics, statements: int, repeats: Counter):
+    metrics.n_plus_one += 1
+    if metrics.n_plus_one == 1:
+        statement, count = repeats.most_common(1)[0]
+        logger.warning(
+            "%s %s ran %d SQL statements (N_PLUS_ONE_THRESHOLD is %d); most repeated, %d times:\n%s",
+            method, route, statements, settings.N_PLUS_ONE_THRESHOLD, count, statement
+        )
+
+
+def server_timing(duration: float, statements: int, db_duration: float, serialization: float) -> str:
+    return (
+        f'app;dur={duration * 1000:.1f}, '
+        f'db;dur={db_duration * 1000:.1f};desc="{statements} queries", '
+        f'serialize;dur={serialization * 1000:.1f}'
+    )
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Record latency, statements and serialization time of each request."""
+
+    async def dispatch(self, request: Request, call_next):
+        timing = RequestTiming()
+        token = _timing.set(timing)
+        start = time.perf_counter()
+        try:
+            with track_queries() as queries:
+                response = await call_next(request)
+        finally:
+            _timing.reset(token)
+        duration = time.perf_counter() - start
+
+        route = request.scope.get("route")
+        label = getattr(route, "path", UNMATCHED)
+        metrics = record(request.method, label, response.status_code, duration,
+                         queries.statements, queries.duration, timing.serialization)
+        if queries.statements > settings.N_PLUS_ONE_THRESHOLD:
+            _flag_n_plus_one(request.method, label, metrics, queries.statements, queries.repeats)
+
+        if settings.SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = server_timing(
+                duration, queries.statements, queries.duration, timing.serialization
+            )
+        return response
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _summary(lines: List[str], name: str, help_text: str, attribute: str, routes):
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} summary")
+    for (method, route), metrics in routes:
+        window: Window = getattr(metrics, attribute)
+        for quantile, value in window.quantiles():
+            lines.append(f"{name}{_labels(method=method, route=route, quantile=quantile)} {value:.6g}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {window.total:.6g}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {window.count}")
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        routes = sorted(_routes.items())
+        lines = ["# HELP http_requests_total Requests served, by status code",
+                 "# TYPE http_requests_total counter"]
+        for (method, route), metrics in routes:
+            for status_code, count in sorted(metrics.statuses.items()):
+                lines.append(f"http_requests_total{_labels(method=method, route=route, status=status_code)} {count}")
+        _summary(lines, "http_request_duration_seconds", "Time to the response start", "duration", routes)
+        _summary(lines, "http_request_db_statements", "SQL statements per request", "db_statements", routes)
+        _summary(lines, "http_request_db_duration_seconds", "Time in SQL statements per request",
+                 "db_duration", routes)
+        _summary(lines, "http_request_serialization_seconds", "Response validation and encoding time",
+                 "serialization", routes)
+        lines.append("# HELP http_requests_n_plus_one_total Requests over N_PLUS_ONE_THRESHOLD statements")
+        lines.append("# TYPE http_requests_n_plus_one_total counter")
+        for (method, route), metrics in routes:
+            lines.append(f"http_requests_n_plus_one_total{_labels(method=method, route=route)} {metrics.n_plus_one}")
+
+    pools = [("primary", get_pool_stats(engine))]
+    pools += [(f"replica{i}", get_pool_stats(replica)) for i, replica in enumerate(replica_engines)]
+    for key, metric_type, help_text in (
+        ("checked_out", "gauge", "Connections in use"),
+        ("overflow", "gauge", "Connections beyond the pool size"),
+        ("checkouts", "counter", "Connections handed out"),
+        ("timeouts", "counter", "Checkouts that timed out"),
+        ("wait_ms_p95", "gauge", "95th percentile checkout wait, milliseconds"),
+    ):
+        samples = [(name, stats[key]) for name, stats in pools if key in stats]
+        if samples:
+            lines.append(f"# HELP db_pool_{key} {help_text}")
+            lines.append(f"# TYPE db_pool_{key} {metric_type}")
+            lines.extend(f"db_pool_{key}{_labels(engine=name)} {value}" for name, value in samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,208 @@
+"""Artisan onboarding: registration and bulk imports.
+
+Users, profiles, services and search documents are written with one
+multi-row INSERT per table (RETURNING the generated ids) and the facet
+counts with one upsert, in a single transaction: one registration costs the
+same few statements as a batch of a thousand. Bulk INSERTs skip mapper
+events, so what the events would compute (the geohash) is filled in here.
+"""
+import asyncio
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterator, List, Sequence, Tuple
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User, UserRole
+from app.models.artisan import Artisan, ArtisanService
+from app.models.search import ArtisanSearchDocument
+from app.schemas.user import UserCreate
+from app.schemas.artisan import ArtisanCreate
+from app.core.geo import encode_geohash
+from app.core.passwords import get_password_hash
+from app.core.search import document_fields, index_documents
+from app.core.facets import facet_keys, record_new_artisans
+
+# Columns of an import record that are JSON in CSV files
+JSON_COLUMNS = ("services", "working_hours")
+
+
+async def create_artisans(
+    db: AsyncSession,
+    registrations: Sequence[Tuple[UserCreate, ArtisanCreate, str]]
+) -> List[User]:
+    """Insert artisans given as (user, profile, password hash); returns the users.
+
+    Does not commit.
+    """
+    users = (await db.scalars(
+        insert(User).returning(User, sort_by_parameter_order=True),
+        [
+            {
+                "email": user.email,
+                "phone": user.phone,
+                "hashed_password": hashed_password,
+                "full_name": user.full_name,
+                "role": UserRole.ARTISAN,
+                "preferred_language": user.preferred_language,
+            }
+            for user, _, hashed_password in registrations
+        ]
+    )).all()
+
+    profiles = [profile for _, profile, _ in registrations]
+    artisan_ids = (await db.scalars(
+        insert(Artisan).returning(Artisan.id, sort_by_parameter_order=True),
+        [
+            {
+                "user_id": user.id,
+                "bio": profile.bio,
+                "experience_years": profile.experience_years,
+                "city": profile.city,
+                "address": profile.address,
+                "latitude": profile.latitude,
+                "longitude": profile.longitude,
+                "geohash": encode_geohash(profile.latitude, profile.longitude)
+                if profile.latitude is not None and profile.longitude is not None else None,
+                "service_radius_km": profile.service_radius_km,
+                "working_hours": profile.working_hours,
+            }
+            for user, profile in zip(users, profiles)
+        ]
+    )).all()
+
+    services = [
+        {"artisan_id": artisan_id, **service.model_dump()}
+        for artisan_id, profile in zip(artisan_ids, profiles)
+        for service in profile.services
+    ]
+    if services:
+        await db.execute(insert(ArtisanService), services)
+
+    documents = {
+        artisan_id: document_fields(
+            user.full_name, profile.bio, [(service.name, service.description) for service in profile.services]
+        )
+        for artisan_id, user, profile in zip(artisan_ids, users, profiles)
+    }
+    await db.execute(insert(ArtisanSearchDocument), [
+        {"artisan_id": artisan_id, **fields} for artisan_id, fields in documents.items()
+    ])
+    index_documents(documents)
+    await record_new_artisans(db, [
+        facet_keys(profile.city, True, 0.0, [service.category for service in profile.services])
+        for profile in profiles
+    ])
+
+    return users
+
+
+@dataclass
+class ImportReport:
+    created: int = 0
+    skipped: List[Tuple[int, str]] = field(default_factory=list)  # (line, reason)
+
+
+def read_records(path: str) -> Iterator[Tuple[int, dict]]:
+    """(line number, record) from a .csv or .jsonl file."""
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.endswith(".csv"):
+            for line, row in enumerate(csv.DictReader(file), start=2):
+                record = {key: value for key, value in row.items() if key and value not in (None, "")}
+                for column in JSON_COLUMNS:
+                    if column in record:
+                        try:
+                            record[column] = json.loads(record[column])
+                        except ValueError:
+                            pass  # reported by validation
+                yield line, record
+        else:
+            for line, text in enumerate(file, start=1):
+                if text.strip():
+                    try:
+                        yield line, json.loads(text)
+                    except ValueError:
+                        yield line, None
+
+
+def _parse(record) -> Tuple[UserCreate, ArtisanCreate]:
+    if not isinstance(record, dict):
+        raise ValueError("not a JSON object")
+    return UserCreate(**record), ArtisanCreate(**record)
+
+
+async def import_artisans(
+    db: AsyncSession,
+    records: Iterator[Tuple[int, dict]],
+    batch_size: int = 500,
+    workers: int = 0
+) -> ImportReport:
+    """Create artisans from import records, one transaction per batch.
+
+    Records need the UserCreate and ArtisanCreate fields, password included.
+    Invalid records, and emails or phones that are already registered (or
+    repeated in the file), are skipped and reported.
+    """
+    report = ImportReport()
+    seen_emails, seen_phones = set(), set()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        batch = []
+        for line, record in records:
+            try:
+                user, profile = _parse(record)
+            except (ValueError, TypeError, ValidationError) as exc:
+                report.skipped.append((line, f"invalid record: {exc}".splitlines()[0]))
+                continue
+            if user.email in seen_emails or (user.phone and user.phone in seen_phones):
+                report.skipped.append((line, "duplicate email or phone in file"))
+                continue
+            seen_emails.add(user.email)
+            if user.phone:
+                seen_phones.add(user.phone)
+            batch.append((line, user, profile))
+            if len(batch) >= batch_size:
+                await _import_batch(db, batch, pool, report)
+                batch = []
+        if batch:
+            await _import_batch(db, batch, pool, report)
+    return report
+
+
+async def _import_batch(db: AsyncSession, batch, pool: ProcessPoolExecutor, report: ImportReport):
+    emails = [user.email for _, user, _ in batch]
+    phones = [user.phone for _, user, _ in batch if user.phone]
+    taken = set((await db.execute(
+        select(User.email, User.phone).where(or_(User.email.in_(emails), User.phone.in_(phones)))
+    )).all())
+    taken_emails = {email for email, _ in taken}
+    taken_phones = {phone for _, phone in taken if phone}
+
+    accepted = []
+    for line, user, profile in batch:
+        if user.email in taken_emails or (user.phone and user.phone in taken_phones):
+            report.skipped.append((line, "email or phone already registered"))
+        else:
+            accepted.append((line, user, profile))
+    if not accepted:
+        return
+
+    loop = asyncio.get_running_loop()
+    hashes = await asyncio.gather(*(
+        loop.run_in_executor(pool, get_password_hash, user.password) for _, user, _ in accepted
+    ))
+    try:
+        await create_artisans(db, [
+            (user, profile, hashed_password) for (_, user, profile), hashed_password in zip(accepted, hashes)
+        ])
+        await db.commit()
+    except IntegrityError as exc:
+        # Registered concurrently: skip the whole batch rather than guess which row
+        await db.rollback()
+        reason = f"batch rejected by the database: {exc.orig}".splitlines()[0]
+        report.skipped.extend((line, reason) for line, _, _ in accepted)
+        return
+    report.created += len(accepted)
@@ -0,0 +1,85 @@
+"""Password hashing off the request path.
+
+bcrypt costs ~250 ms of CPU per call at the default cost. Hashing runs in a
+dedicated process pool so login bursts neither block the event loop nor
+take the threadpool shared by every sync dependency and file operation.
+At most PASSWORD_HASH_QUEUE_LIMIT hashes wait or run at once: beyond that,
+requests fail fast with 503 instead of queueing behind seconds of work.
+"""
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from passlib.context import CryptContext
+from app.config import settings
+
+# Hashes with any other cost are rehashed on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_in_flight = 0
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """(valid, new hash or None): a new hash when the stored one uses another cost."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def hash_pool() -> Optional[ProcessPoolExecutor]:
+    """The hashing pool; None when PASSWORD_HASH_WORKERS is 0 (threadpool)."""
+    global _hash_pool
+    if _hash_pool is None and settings.PASSWORD_HASH_WORKERS > 0:
+        _hash_pool = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+    return _hash_pool
+
+
+def shutdown_hash_pool():
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+async def _run(fn, *args):
+    global _in_flight
+    if _in_flight >= settings.PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    _in_flight += 1
+    try:
+        pool = hash_pool()
+        if pool is None:
+            return await run_in_threadpool(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    finally:
+        _in_flight -= 1
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run(get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run(verify_password, plain_password, hashed_password)
+
+
+async def verify_and_update_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _run(verify_and_update, plain_password, hashed_password)
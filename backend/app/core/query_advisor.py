@@ -0,0 +1,133 @@
+"""Development aid: EXPLAIN the queries of slow requests.
+
+With QUERY_ADVISOR_ENABLED, every statement a request runs is recorded, and
+when the request takes longer than QUERY_ADVISOR_THRESHOLD_MS its SELECTs
+are EXPLAINed in the background. Plans that read a whole table (a Seq Scan
+on PostgreSQL, a SCAN without an index on SQLite) are logged as warnings
+with the route, so a missing index shows up while the route is being
+written rather than in production.
+
+Recording costs a list append per statement; the EXPLAINs run after the
+response, on their own connection. Not meant for production traffic.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from app.config import settings
+from app.database import Base
+
+logger = logging.getLogger(__name__)
+
+# Distinct statements EXPLAINed per slow request
+MAX_EXPLAINED = 20
+
+# (statement, parameters, engine) of the current request
+_statements: contextvars.ContextVar[Optional[List[tuple]]] = contextvars.ContextVar(
+    "query_advisor_statements", default=None
+)
+_engines: Dict[object, AsyncEngine] = {}
+_pending = set()
+
+
+def install(*engines: AsyncEngine):
+    """Record the statements run through these engines."""
+    for engine in engines:
+        if engine.sync_engine not in _engines:
+            _engines[engine.sync_engine] = engine
+            event.listen(engine.sync_engine, "before_cursor_execute", _record)
+
+
+def _record(conn, cursor, statement, parameters, context, executemany):
+    statements = _statements.get()
+    if statements is not None and not executemany:
+        statements.append((statement, parameters, conn.engine))
+
+
+def _is_select(statement: str) -> bool:
+    return statement.lstrip()[:6].upper() in ("SELECT", "WITH ")
+
+
+def _seq_scans_postgresql(plan) -> List[str]:
+    scans = []
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node.get("Node Type") == "Seq Scan":
+            scans.append(node.get("Relation Name", "?"))
+        nodes.extend(node.get("Plans", ()))
+    return scans
+
+
+def _seq_scans_sqlite(rows) -> List[str]:
+    # "SCAN artisans" reads the table; "SCAN artisans USING INDEX ..." and SEARCH
+    # do not, and scans of subqueries (materialized, in memory) are not reported
+    scans = []
+    for *_, detail in rows:
+        words = detail.split()
+        if words[0] == "SCAN" and len(words) > 1 and words[1] in Base.metadata.tables and "USING" not in words:
+            scans.append(words[1])
+    return scans
+
+
+async def explain(engine: AsyncEngine, statement: str, parameters) -> Tuple[List[str], str]:
+    """(tables read by a sequential scan, plan text) of one statement."""
+    async with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            result = await conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return _seq_scans_postgresql(plan), json.dumps(plan[0]["Plan"], indent=1)
+        if engine.dialect.name == "sqlite":
+            rows = (await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)).all()
+            return _seq_scans_sqlite(rows), "\n".join(row[-1] for row in rows)
+    return [], ""
+
+
+async def advise(route: str, elapsed_ms: float, statements: List[tuple]):
+    seen = set()
+    for statement, parameters, sync_engine in statements:
+        if statement in seen or not _is_select(statement) or sync_engine not in _engines:
+            continue
+        seen.add(statement)
+        if len(seen) > MAX_EXPLAINED:
+            break
+        try:
+            scans, plan = await explain(_engines[sync_engine], statement, parameters)
+        except Exception:
+            logger.debug("Could not EXPLAIN %s", statement, exc_info=True)
+            continue
+        if scans:
+            logger.warning(
+                "%s took %.0f ms; sequential scan of %s in:\n%s\nplan:\n%s",
+                route, elapsed_ms, ", ".join(scans), statement, plan
+            )
+
+
+class QueryAdvisorMiddleware(BaseHTTPMiddleware):
+    """Record each request's statements; EXPLAIN them when it is slow."""
+
+    async def dispatch(self, request: Request, call_next):
+        statements = []
+        token = _statements.set(statements)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _statements.reset(token)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if elapsed_ms >= settings.QUERY_ADVISOR_THRESHOLD_MS and statements:
+            route = request.scope.get("route")
+            label = f"{request.method} {route.path if route is not None else request.url.path}"
+            task = asyncio.create_task(advise(label, elapsed_ms, statements))
+            _pending.add(task)
+            task.add_done_callback(_pending.discard)
+        return response
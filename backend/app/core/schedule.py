@@ -0,0 +1,149 @@
+import re
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Suggested slots of artisans who never filled in their working hours; their
+# bookings are not restricted to these
+DEFAULT_WORKING_HOURS = {day: {"start": "08:00", "end": "18:00"} for day in WEEKDAYS[:6]}
+
+DEFAULT_DURATION_MINUTES = 60
+SLOT_STEP_MINUTES = 30
+
+# "14:30", "14h30", "9h", "09:00"
+_TIME_RE = re.compile(r"^\s*(\d{1,2})\s*[:hH]\s*(\d{2})?\s*$")
+
+Interval = Tuple[datetime, datetime]
+
+
+def parse_time(value: Optional[str]) -> Optional[time]:
+    if not value:
+        return None
+    match = _TIME_RE.match(value)
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def booking_interval(scheduled_date: datetime, scheduled_time: Optional[str], duration: Optional[int]) -> Interval:
+    """[start, end) of a booking.
+
+    `scheduled_time` is free-form; when it does not parse as a clock time the
+    time part of `scheduled_date` is used.
+    """
+    start = scheduled_date.replace(tzinfo=None)
+    clock = parse_time(scheduled_time)
+    if clock is not None:
+        start = datetime.combine(start.date(), clock)
+    return start, start + timedelta(minutes=duration or DEFAULT_DURATION_MINUTES)
+
+
+def working_windows(working_hours: Optional[dict], day: date) -> List[Interval]:
+    """Working intervals of one day.
+
+    A day maps to {"start": "08:00", "end": "18:00"}, a list of such shifts,
+    or nothing / {"closed": true} when the artisan does not work.
+    """
+    hours = working_hours if working_hours else DEFAULT_WORKING_HOURS
+    shifts = hours.get(WEEKDAYS[day.weekday()])
+    if not shifts:
+        return []
+    if isinstance(shifts, dict):
+        shifts = [shifts]
+
+    windows = []
+    for shift in shifts:
+        if not isinstance(shift, dict) or shift.get("closed"):
+            continue
+        start, end = parse_time(shift.get("start")), parse_time(shift.get("end"))
+        if start is None or end is None or end <= start:
+            continue
+        windows.append((datetime.combine(day, start), datetime.combine(day, end)))
+    return sorted(windows)
+
+
+def within_working_hours(working_hours: Optional[dict], start: datetime, end: datetime) -> bool:
+    return any(
+        window_start <= start and end <= window_end
+        for window_start, window_end in working_windows(working_hours, start.date())
+    )
+
+
+class IntervalIndex:
+    """Sorted busy intervals with O(log n) overlap queries.
+
+    Intervals are sorted by start; a running maximum of their ends lets one
+    bisect decide whether any interval starting before `end` reaches past
+    `start`.
+    """
+
+    def __init__(self, intervals: Iterable[Interval] = ()):
+        self.intervals = sorted(intervals)
+        self._starts = [start for start, _ in self.intervals]
+        self._max_ends = []
+        latest = None
+        for _, end in self.intervals:
+            latest = end if latest is None or end > latest else latest
+            self._max_ends.append(latest)
+
+    def __len__(self) -> int:
+        return len(self.intervals)
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        i = bisect_left(self._starts, end)
+        return i > 0 and self._max_ends[i - 1] > start
+
+    def free(self, start: datetime, end: datetime) -> List[Interval]:
+        """Sub-intervals of [start, end) not covered by any busy interval."""
+        gaps = []
+        cursor = start
+        i = bisect_left(self._starts, start)
+        # An interval starting earlier may still cover `start`
+        if i > 0 and self._max_ends[i - 1] > cursor:
+            cursor = self._max_ends[i - 1]
+        for busy_start, busy_end in self.intervals[i:]:
+            if busy_start >= end:
+                break
+            if busy_start > cursor:
+                gaps.append((cursor, min(busy_start, end)))
+            cursor = max(cursor, busy_end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+
+def open_slots(
+    working_hours: Optional[dict],
+    busy: IntervalIndex,
+    first_day: date,
+    last_day: date,
+    duration: int = DEFAULT_DURATION_MINUTES,
+    step: int = SLOT_STEP_MINUTES,
+    not_before: Optional[datetime] = None,
+) -> List[Interval]:
+    """Bookable [start, end) slots between two days, inclusive.
+
+    Slots start on `step`-minute marks of the working window and must fit
+    entirely in a gap between busy intervals.
+    """
+    length = timedelta(minutes=duration)
+    step_delta = timedelta(minutes=step)
+    slots = []
+    day = first_day
+    while day <= last_day:
+        for window_start, window_end in working_windows(working_hours, day):
+            for gap_start, gap_end in busy.free(window_start, window_end):
+                # Align to the window's grid so slots line up across gaps
+                offset = (gap_start - window_start) % step_delta
+                slot = gap_start if not offset else gap_start + (step_delta - offset)
+                while slot + length <= gap_end:
+                    if not_before is None or slot >= not_before:
+                        slots.append((slot, slot + length))
+                    slot += step_delta
+        day += timedelta(days=1)
+    return slots
@@ -0,0 +1,333 @@
+import math
+import re
+import asyncio
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import case, func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User
+from app.models.artisan import Artisan, ArtisanService
+from app.models.search import ArtisanSearchDocument, search_vector
+from app.core.pagination import decode_cursor
+
+# Upper bound on the ranked, filtered matches a PostgreSQL search returns
+MAX_RESULTS = 1000
+
+# Field weights, mirroring the A/B/C tsvector weights on PostgreSQL
+FIELD_WEIGHTS = {"name_text": 1.0, "services_text": 0.4, "bio_text": 0.2}
+
+STOPWORDS = {
+    # French
+    "a", "au", "aux", "de", "des", "du", "en", "et", "la", "le", "les",
+    "l", "d", "un", "une", "pour", "par", "sur", "avec",
+    # Arabic
+    "في", "من", "على", "الى", "عن", "و",
+}
+
+_ARABIC_FOLDING = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    "ـ": None,  # tatweel
+})
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def normalize(text: Optional[str]) -> str:
+    """Fold case and diacritics so French and Arabic text match loosely.
+
+    NFKD decomposition strips French accents and Arabic harakat alike (both
+    are combining marks); Arabic letter variants are then folded.
+    """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return stripped.translate(_ARABIC_FOLDING)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(normalize(text)) if token not in STOPWORDS]
+
+
+def document_fields(full_name: str, bio: Optional[str], services) -> Dict[str, str]:
+    """Search document columns from an artisan's name, bio and (name, description) services."""
+    return {
+        "name_text": " ".join(tokenize(full_name)),
+        "services_text": " ".join(
+            token for name, description in services
+            for token in tokenize(name) + tokenize(description)
+        ),
+        "bio_text": " ".join(tokenize(bio)),
+    }
+
+
+def index_documents(documents: Dict[int, Dict[str, str]]):
+    """Apply search documents written in bulk to this process's fallback index."""
+    for artisan_id, fields in documents.items():
+        _fallback_index.update(artisan_id, fields)
+
+
+async def refresh_artisan_document(db: AsyncSession, artisan_id: int):
+    """Rebuild the search document of one artisan in the current transaction."""
+    await db.flush()
+    row = (await db.execute(
+        select(User.full_name, Artisan.bio)
+        .join(User, User.id == Artisan.user_id)
+        .where(Artisan.id == artisan_id)
+    )).first()
+    if row is None:
+        return
+
+    services = (await db.execute(
+        select(ArtisanService.name, ArtisanService.description)
+        .where(ArtisanService.artisan_id == artisan_id)
+    )).all()
+
+    fields = document_fields(row.full_name, row.bio, [(service.name, service.description) for service in services])
+
+    document = await db.get(ArtisanSearchDocument, artisan_id)
+    if document is None:
+        db.add(ArtisanSearchDocument(artisan_id=artisan_id, **fields))
+    else:
+        for field, value in fields.items():
+            setattr(document, field, value)
+
+    _fallback_index.update(artisan_id, fields)
+
+
+async def rebuild_search_documents(db: AsyncSession) -> int:
+    """Recompute every artisan's search document (backfill)."""
+    artisan_ids = (await db.execute(select(Artisan.id).order_by(Artisan.id))).scalars().all()
+    for artisan_id in artisan_ids:
+        await refresh_artisan_document(db, artisan_id)
+    await db.commit()
+    reset_fallback_index()
+    return len(artisan_ids)
+
+
+class InvertedIndex:
+    """In-process inverted index over search documents.
+
+    Fallback for databases without full-text search (SQLite test and dev
+    runs). It is loaded from `artisan_search_documents` on first use and kept
+    current by refresh_artisan_document within this process. Query terms
+    match as prefixes, results are ranked with BM25.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._load_lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self):
+        # Mutations never await, so they are atomic on the event loop
+        self._loaded = False
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._documents: Dict[int, Dict[str, float]] = {}
+        self._lengths: Dict[int, float] = {}
+        self._total_length = 0.0
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+
+    def _weighted_terms(self, fields: Dict[str, str]) -> Dict[str, float]:
+        terms = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in (fields.get(field) or "").split():
+                terms[token] += weight
+        return terms
+
+    def _remove(self, artisan_id: int):
+        for token in self._documents.pop(artisan_id, {}):
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(artisan_id, None)
+                if not postings:
+                    del self._postings[token]
+                    self._vocabulary_dirty = True
+        self._total_length -= self._lengths.pop(artisan_id, 0.0)
+
+    def _add(self, artisan_id: int, fields: Dict[str, str]):
+        terms = self._weighted_terms(fields)
+        self._documents[artisan_id] = terms
+        self._lengths[artisan_id] = sum(terms.values())
+        self._total_length += self._lengths[artisan_id]
+        for token, frequency in terms.items():
+            if token not in self._postings:
+                self._vocabulary_dirty = True
+            self._postings[token][artisan_id] = frequency
+
+    def update(self, artisan_id: int, fields: Dict[str, str]):
+        if not self._loaded:
+            return  # picked up from the table on first load
+        self._remove(artisan_id)
+        self._add(artisan_id, fields)
+
+    async def _ensure_loaded(self, db: AsyncSession):
+        async with self._load_lock:
+            if self._loaded:
+                return
+            rows = (await db.execute(select(
+                ArtisanSearchDocument.artisan_id,
+                ArtisanSearchDocument.name_text,
+                ArtisanSearchDocument.services_text,
+                ArtisanSearchDocument.bio_text
+            ))).all()
+            for row in rows:
+                self._add(row.artisan_id, row._asdict())
+            self._loaded = True
+
+    def _expand(self, prefix: str) -> List[str]:
+        if self._vocabulary_dirty or not self._vocabulary:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        start = bisect_left(self._vocabulary, prefix)
+        matches = []
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            matches.append(token)
+        return matches
+
+    async def search(
+        self, db: AsyncSession, terms: List[str], limit: Optional[int] = MAX_RESULTS
+    ) -> List[Tuple[int, float]]:
+        if not self._loaded:
+            await self._ensure_loaded(db)
+        total = len(self._documents)
+        if not total:
+            return []
+        average_length = self._total_length / total or 1.0
+
+        scores: Optional[Dict[int, float]] = None
+        for term in terms:
+            term_scores = defaultdict(float)
+            for token in self._expand(term):
+                postings = self._postings[token]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for artisan_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[artisan_id] / average_length)
+                    term_scores[artisan_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+            # Every term must match (AND semantics, like the tsquery)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {i: s + term_scores[i] for i, s in scores.items() if i in term_scores}
+            if not scores:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [(artisan_id, round(score, 6)) for artisan_id, score in ranked[:limit]]
+
+
+_fallback_index = InvertedIndex()
+
+
+def reset_fallback_index():
+    """Drop the in-process index; it is reloaded from the table on next use."""
+    _fallback_index.reset()
+
+
+async def warm_search_index(db: AsyncSession):
+    """Load the in-process index now rather than on the first search."""
+    if db.get_bind().dialect.name != "postgresql":
+        await _fallback_index._ensure_loaded(db)
+
+
+def _tsquery(terms: List[str]):
+    # Tokens contain letters and digits only, so they are safe in a tsquery
+    return func.to_tsquery(literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms))
+
+
+def _document_vector():
+    return search_vector(
+        ArtisanSearchDocument.name_text,
+        ArtisanSearchDocument.services_text,
+        ArtisanSearchDocument.bio_text
+    )
+
+
+async def matching_artisans(db: AsyncSession, query: str):
+    """Selectable of the ids of every artisan matching `query`, unranked.
+
+    Returns None when the query has no searchable terms or nothing matches.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return None
+
+    if db.get_bind().dialect.name == "postgresql":
+        return select(ArtisanSearchDocument.artisan_id).where(_document_vector().op("@@")(_tsquery(terms)))
+
+    matches = await _fallback_index.search(db, terms, limit=None)
+    if not matches:
+        return None
+    return select(Artisan.id).where(Artisan.id.in_([artisan_id for artisan_id, _ in matches]))
+
+
+async def ranked_matches(
+    db: AsyncSession,
+    query: str,
+    filters: Sequence = (),
+    cursor: Optional[str] = None,
+    limit: int = MAX_RESULTS,
+    skip: int = 0,
+):
+    """Selectable of (artisan_id, rank) for artisans matching `query` and `filters`.
+
+    `filters` are WHERE clauses on `artisans` (app.core.listing.artisan_filters),
+    applied before anything is cut off, so a match that passes them is never
+    crowded out by better-ranked ones that do not. Returns None when the
+    query has no searchable terms or nothing matches.
+
+    On PostgreSQL the GIN-indexed tsvector is ranked in the database and the
+    best MAX_RESULTS filtered matches are returned. Elsewhere the in-process
+    inverted index ranks every match, the filters run in SQL over the matched
+    ids, and only the rows the listing page can use (after `cursor`, `skip`
+    plus `limit` plus one) are returned.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return None
+
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery = _tsquery(terms)
+        vector = _document_vector()
+        return (
+            select(
+                ArtisanSearchDocument.artisan_id.label("artisan_id"),
+                func.ts_rank(vector, tsquery).label("rank")
+            )
+            .join(Artisan, Artisan.id == ArtisanSearchDocument.artisan_id)
+            .where(vector.op("@@")(tsquery), *filters)
+            .order_by(literal_column("rank").desc())
+            .limit(MAX_RESULTS)
+            .subquery("search_rank")
+        )
+
+    matches = await _fallback_index.search(db, terms, limit=None)
+    if matches and filters:
+        passing = set((await db.scalars(
+            select(Artisan.id).where(Artisan.id.in_([artisan_id for artisan_id, _ in matches]), *filters)
+        )).all())
+        matches = [match for match in matches if match[0] in passing]
+    if cursor:
+        key, after_id = decode_cursor(cursor, float, int)
+        matches = [(artisan_id, rank) for artisan_id, rank in matches if (rank, artisan_id) < (key, after_id)]
+        skip = 0
+    matches = matches[:skip + limit + 1]
+    if not matches:
+        return None
+    ranks = dict(matches)
+    return (
+        select(
+            Artisan.id.label("artisan_id"),
+            case(ranks, value=Artisan.id, else_=0.0).label("rank")
+        )
+        .where(Artisan.id.in_(ranks))
+        .subquery("search_rank")
+    )
@@ -1,57 +1,46 @@
-from datetime import datetime, timedelta
+from dataclasses import dataclass
 from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
-from app.database import get_db
-from app.models.user import User
+from app.database import get_db, read_sessionmaker
+from app.models.user import User, UserRole
+from app.models.artisan import Artisan
+from app.core.cache import TTLCache
+from app.core import tokens
+from app.core.tokens import create_access_token  # noqa: F401  (re-exported)
+from app.core.passwords import (  # noqa: F401  (re-exported)
+    verify_password,
+    get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
+    verify_and_update_async,
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
-
-def create_refresh_token(data: dict) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
+optional_security = HTTPBearer(auto_error=False)
 
 def decode_token(token: str) -> dict:
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
-    except JWTError:
+    payload = tokens.decode_token(token)
+    if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return payload
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
-    token = credentials.credentials
-    payload = decode_token(token)
+def token_user_id(payload: dict) -> Optional[int]:
+    # "sub" must be a string in a JWT; tokens carry the user id as its decimal form
+    try:
+        return int(payload.get("sub"))
+    except (TypeError, ValueError):
+        return None
+
+def _access_token_user_id(credentials: HTTPAuthorizationCredentials) -> int:
+    payload = decode_token(credentials.credentials)
 
     if payload.get("type") != "access":
         raise HTTPException(
@@ -59,14 +48,93 @@ async def get_current_user(
             detail="Invalid token type"
         )
 
-    user_id: int = payload.get("sub")
+    user_id = token_user_id(payload)
     if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
         )
+    return user_id
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated caller, as much as most routes need to know."""
+    id: int
+    role: UserRole
+    is_active: bool
+    artisan_id: Optional[int] = None
+
+_principal_cache = TTLCache(maxsize=settings.PRINCIPAL_CACHE_SIZE, ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+def invalidate_principal(user_id: int):
+    """Drop a cached principal; call after changing a user outside the ORM."""
+    _principal_cache.delete(user_id)
+
+@event.listens_for(User, "after_update")
+def _invalidate_on_user_change(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.is_active.history.has_changes() or state.attrs.role.history.has_changes():
+        invalidate_principal(target.id)
+
+@event.listens_for(User, "after_delete")
+def _invalidate_on_user_delete(mapper, connection, target):
+    invalidate_principal(target.id)
+
+@event.listens_for(Artisan, "after_insert")
+@event.listens_for(Artisan, "after_delete")
+def _invalidate_on_artisan_change(mapper, connection, target):
+    if target.user_id is not None:
+        invalidate_principal(target.user_id)
+
+async def load_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    """Cached principal of a user; one User/Artisan query on a miss."""
+    principal = _principal_cache.get(user_id)
+    if principal is None:
+        row = (await db.execute(
+            select(User.id, User.role, User.is_active, Artisan.id.label("artisan_id"))
+            .outerjoin(Artisan, Artisan.user_id == User.id)
+            .where(User.id == user_id)
+        )).first()
+        if row is None:
+            return None
+        principal = Principal(**row._asdict())
+        _principal_cache.set(user_id, principal)
+    return principal
+
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """Authenticate without loading the User row when the principal is cached."""
+    await tokens.revocations.sync_if_stale(db)
+    user_id = _access_token_user_id(credentials)
+
+    principal = await load_principal(db, user_id)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found"
+        )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    if not principal.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Inactive user"
+        )
+
+    # Attribute this session's writes to the user (read-your-writes routing)
+    db.info["user_id"] = principal.id
+
+    return principal
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    await tokens.revocations.sync_if_stale(db)
+    user_id = _access_token_user_id(credentials)
+
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -79,8 +147,61 @@ async def get_current_user(
             detail="Inactive user"
         )
 
+    # Attribute this session's writes to the user (read-your-writes routing)
+    db.info["user_id"] = user.id
+
     return user
 
+def get_current_artisan_id(principal: Principal = Depends(get_current_principal)) -> int:
+    """Artisan profile id of the caller; 404 for users without a profile."""
+    if principal.artisan_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Artisan profile not found"
+        )
+    return principal.artisan_id
+
+async def get_current_artisan(
+    request: Request,
+    artisan_id: int = Depends(get_current_artisan_id),
+    db: AsyncSession = Depends(get_db)
+) -> Artisan:
+    """The caller's Artisan row, loaded once per request.
+
+    Only routes that modify the profile need the row; the rest should depend
+    on get_current_artisan_id, which costs no query at all.
+    """
+    artisan = getattr(request.state, "current_artisan", None)
+    if artisan is None:
+        artisan = await db.get(Artisan, artisan_id)
+        if artisan is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Artisan profile not found"
+            )
+        request.state.current_artisan = artisan
+    return artisan
+
+def access_token_user_id(token: str) -> Optional[int]:
+    """User id of a valid access token, None for anything else (never raises)."""
+    payload = tokens.decode_token(token)
+    if payload is None or payload.get("type") != "access":
+        return None
+    return token_user_id(payload)
+
+def get_optional_user_id(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> Optional[int]:
+    """User id from a bearer token if one is sent; public routes never fail on it."""
+    if credentials is None:
+        return None
+    return access_token_user_id(credentials.credentials)
+
+async def get_read_db(user_id: Optional[int] = Depends(get_optional_user_id)):
+    """Session for read-only routes: a replica unless the caller just wrote."""
+    async with read_sessionmaker(user_id)() as db:
+        yield db
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
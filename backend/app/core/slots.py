@@ -0,0 +1,122 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.artisan import Artisan
+from app.models.booking import Booking, BookingStatus
+from app.core.cache import TTLCache
+from app.core.schedule import IntervalIndex, booking_interval
+
+# Bookings that occupy the artisan's time
+BLOCKING_STATUSES = (BookingStatus.ACCEPTED, BookingStatus.IN_PROGRESS)
+
+# Bookings a new request may not overlap: a pending request holds its slot
+# until the artisan accepts or rejects it
+HELD_STATUSES = (BookingStatus.PENDING, *BLOCKING_STATUSES)
+
+# Longest range one slots request may cover
+MAX_SLOT_RANGE_DAYS = 31
+
+# Busy intervals are cached per artisan for this many days from today
+SLOT_CACHE_HORIZON_DAYS = 31
+
+_busy_cache = TTLCache(maxsize=settings.SLOT_CACHE_SIZE, ttl=settings.SLOT_CACHE_TTL_SECONDS)
+
+
+def invalidate_slots(artisan_id: int):
+    """Drop an artisan's cached busy intervals; call after a booking changes."""
+    _busy_cache.delete(artisan_id)
+
+
+async def busy_index(
+    db: AsyncSession,
+    artisan_id: int,
+    start: datetime,
+    end: datetime,
+    exclude_booking_id: Optional[int] = None,
+    statuses=BLOCKING_STATUSES
+) -> IntervalIndex:
+    """Bookings of an artisan in `statuses` overlapping [start, end)."""
+    query = select(Booking.starts_at, Booking.ends_at).where(
+        Booking.artisan_id == artisan_id,
+        Booking.status.in_(statuses),
+        Booking.starts_at < end,
+        Booking.ends_at > start
+    )
+    if exclude_booking_id is not None:
+        query = query.where(Booking.id != exclude_booking_id)
+    return IntervalIndex(tuple(row) for row in (await db.execute(query)).all())
+
+
+async def cached_busy_index(db: AsyncSession, artisan_id: int, start: datetime, end: datetime) -> IntervalIndex:
+    """Held intervals for slot listings, served from a per-artisan cache.
+
+    Pending requests count, since a new request overlapping one is refused.
+    Only reads go through the cache; booking writes re-check against the
+    database under the artisan lock (see ensure_slot_free).
+    """
+    cached = _busy_cache.get(artisan_id)
+    if cached is not None and cached[0] <= start and end <= cached[1]:
+        return cached[2]
+
+    horizon_start = datetime.combine(date.today(), time.min)
+    horizon_end = horizon_start + timedelta(days=SLOT_CACHE_HORIZON_DAYS)
+    if start < horizon_start or end > horizon_end:
+        return await busy_index(db, artisan_id, start, end, statuses=HELD_STATUSES)
+
+    index = await busy_index(db, artisan_id, horizon_start, horizon_end, statuses=HELD_STATUSES)
+    _busy_cache.set(artisan_id, (horizon_start, horizon_end, index))
+    return index
+
+
+async def lock_artisan(db: AsyncSession, artisan_id: int) -> Optional[Artisan]:
+    """Load an artisan with its row locked until the transaction ends.
+
+    Booking writes for one artisan take this lock first, which serializes
+    their conflict checks. PostgreSQL locks the row (SELECT ... FOR UPDATE).
+    SQLite has no row locks and runs reads outside a transaction, so a no-op
+    write takes its database-wide write lock instead.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        await db.execute(
+            update(Artisan)
+            .where(Artisan.id == artisan_id)
+            .values(id=Artisan.id, updated_at=Artisan.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+    return await db.scalar(
+        select(Artisan)
+        .where(Artisan.id == artisan_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+
+
+async def ensure_slot_free(
+    db: AsyncSession,
+    artisan_id: int,
+    start: datetime,
+    end: datetime,
+    exclude_booking_id: Optional[int] = None,
+    statuses=BLOCKING_STATUSES
+):
+    """Raise 409 if [start, end) overlaps a booking in `statuses`; hold lock_artisan first."""
+    if await busy_index(db, artisan_id, start, end, exclude_booking_id, statuses):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Time slot is no longer available"
+        )
+
+
+async def claim_slot(db: AsyncSession, booking: Booking):
+    """Lock the artisan and check that an existing booking's time is still free.
+
+    Used when a booking moves into a blocking status (accepted, in progress).
+    Only blocking bookings are checked: pending requests that overlapped
+    before creation was checked against them must stay acceptable.
+    """
+    start, end = booking_interval(booking.scheduled_date, booking.scheduled_time, booking.estimated_duration)
+    await lock_artisan(db, booking.artisan_id)
+    await ensure_slot_free(db, booking.artisan_id, start, end, booking.id)
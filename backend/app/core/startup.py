@@ -0,0 +1,71 @@
+"""Process start-up: warm-up and readiness.
+
+Importing the app touches neither the database nor the filesystem, and the
+schema is managed with Alembic (`alembic upgrade head`), not at start-up.
+Once the server runs, warm_up opens the pool's first connections and loads
+the per-process caches concurrently, in the background: /health (liveness)
+answers at once, /ready (readiness) only when the worker is warm and its
+database reachable, so a load balancer sends traffic to warm workers only.
+"""
+import asyncio
+import logging
+from typing import Tuple
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.config import settings
+from app.database import SessionLocal, engine, replica_engines
+from app.core import tokens
+from app.core.search import warm_search_index
+
+logger = logging.getLogger(__name__)
+
+_warm = False
+
+
+async def warm_pool(target: AsyncEngine, connections: int):
+    """Open `connections` connections at once and return them to the pool."""
+    if not isinstance(target.pool, AsyncAdaptedQueuePool):
+        connections = 1  # single-connection pools (in-memory SQLite)
+    opened = [target.connect() for _ in range(max(1, connections))]
+    try:
+        await asyncio.gather(*(connection.start() for connection in opened))
+        await asyncio.gather(*(connection.exec_driver_sql("SELECT 1") for connection in opened))
+    finally:
+        await asyncio.gather(*(connection.close() for connection in opened), return_exceptions=True)
+
+
+async def warm_caches():
+    async with SessionLocal() as db:
+        await tokens.revocations.sync(db, full=True)
+        await warm_search_index(db)
+
+
+async def warm_up():
+    """Warm this worker, retrying until the database is reachable."""
+    global _warm
+    delay = 0.5
+    while True:
+        try:
+            await asyncio.gather(
+                *(warm_pool(target, settings.DB_POOL_WARM_CONNECTIONS) for target in (engine, *replica_engines)),
+                warm_caches()
+            )
+        except Exception:
+            logger.exception("Warm-up failed; retrying in %.1f s", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+            continue
+        _warm = True
+        return
+
+
+async def readiness() -> Tuple[bool, str]:
+    """(ready, reason): warmed up and the primary answers a query."""
+    if not _warm:
+        return False, "warming up"
+    try:
+        async with engine.connect() as connection:
+            await asyncio.wait_for(connection.exec_driver_sql("SELECT 1"), settings.READINESS_TIMEOUT_SECONDS)
+    except Exception:
+        return False, "database unavailable"
+    return True, "ready"
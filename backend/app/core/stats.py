@@ -0,0 +1,220 @@
+import math
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, List
+from sqlalchemy import Numeric, and_, case, cast, delete, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.artisan import Artisan
+from app.models.booking import Booking, BookingStatus
+from app.models.review import Review, ArtisanReviewStats, SUB_RATINGS
+from app.core.facets import rebuild_facet_counts, record_rating_change
+
+# Ratings closer than this are considered equal when reconciling
+RATING_TOLERANCE = 0.005
+
+
+def average_rating(rating_sum: float, count: int) -> float:
+    """Average rounded half up like the database's round(): 2.625 is 2.63, not 2.62."""
+    if not count:
+        return 0.0
+    return float(Decimal(str(rating_sum / count)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+
+async def record_review(db: AsyncSession, artisan_id: int, rating: float):
+    """Add one review to an artisan's aggregates in a single UPDATE.
+
+    The new values are computed by the database from the row being updated,
+    so concurrent reviews never overwrite each other. `rating` is kept as a
+    stored column because the listing sorts and paginates on it; the rating
+    facet follows it.
+    """
+    new_sum = Artisan.rating_sum + rating
+    new_count = Artisan.total_reviews + 1
+    row = (await db.execute(
+        update(Artisan)
+        .where(Artisan.id == artisan_id)
+        .values(
+            rating_sum=new_sum,
+            total_reviews=new_count,
+            rating=func.round(cast(new_sum / new_count, Numeric), 2)
+        )
+        .returning(Artisan.rating_sum, Artisan.total_reviews, Artisan.rating)
+        .execution_options(synchronize_session=False)
+    )).first()
+    if row is not None:
+        old_rating = average_rating(row.rating_sum - rating, row.total_reviews - 1)
+        await record_rating_change(db, artisan_id, old_rating, row.rating)
+
+
+async def record_completed_job(db: AsyncSession, artisan_id: int):
+    await db.execute(
+        update(Artisan)
+        .where(Artisan.id == artisan_id)
+        .values(completed_jobs=Artisan.completed_jobs + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def reconcile_artisan_stats(db: AsyncSession, dry_run: bool = False) -> int:
+    """Recompute every artisan's aggregates from `reviews` and `bookings`.
+
+    Reviews and completed bookings are each aggregated in one grouped query;
+    only artisans whose stored values differ are updated, and the facet
+    counts are rebuilt after corrected ratings. Returns how many artisans
+    were (or, with dry_run, would be) corrected.
+    """
+    reviews = {
+        row.artisan_id: (row.rating_sum, row.total_reviews)
+        for row in (await db.execute(
+            select(
+                Review.artisan_id,
+                func.sum(Review.rating).label("rating_sum"),
+                func.count(Review.id).label("total_reviews")
+            ).group_by(Review.artisan_id)
+        )).all()
+    }
+    completed = dict((await db.execute(
+        select(Booking.artisan_id, func.count(Booking.id))
+        .where(Booking.status == BookingStatus.COMPLETED)
+        .group_by(Booking.artisan_id)
+    )).all())
+
+    corrections = []
+    for artisan in (await db.execute(select(
+        Artisan.id, Artisan.rating_sum, Artisan.total_reviews, Artisan.rating, Artisan.completed_jobs
+    ))).all():
+        rating_sum, total_reviews = reviews.get(artisan.id, (0.0, 0))
+        expected = {
+            "rating_sum": float(rating_sum or 0.0),
+            "total_reviews": total_reviews,
+            "rating": average_rating(rating_sum or 0.0, total_reviews),
+            "completed_jobs": completed.get(artisan.id, 0),
+        }
+        if (
+            artisan.total_reviews != expected["total_reviews"]
+            or artisan.completed_jobs != expected["completed_jobs"]
+            or abs((artisan.rating_sum or 0.0) - expected["rating_sum"]) > 1e-9
+            or abs((artisan.rating or 0.0) - expected["rating"]) > RATING_TOLERANCE
+        ):
+            corrections.append({"id": artisan.id, **expected})
+
+    if corrections and not dry_run:
+        # Bulk UPDATE by primary key (executemany)
+        await db.execute(update(Artisan), corrections)
+        await db.commit()
+        await rebuild_facet_counts(db)
+    return len(corrections)
+
+
+def star_bucket(rating: float) -> int:
+    """Histogram bucket of a rating: floor(rating), within 1-5."""
+    return min(5, max(1, math.floor(rating)))
+
+
+def review_increments(review: Review) -> Dict[str, float]:
+    """Changes one review makes to its artisan's ArtisanReviewStats row."""
+    increments = {f"star_{star_bucket(review.rating)}": 1}
+    for name in SUB_RATINGS:
+        value = getattr(review, f"{name}_rating")
+        if value is not None:
+            increments[f"{name}_sum"] = value
+            increments[f"{name}_count"] = 1
+    return increments
+
+
+async def record_review_stats(db: AsyncSession, review: Review):
+    """Add a review to artisan_review_stats in the current transaction.
+
+    An upsert whose increments are applied by the database, so concurrent
+    reviews of one artisan cannot lose updates.
+    """
+    increments = review_increments(review)
+    table = ArtisanReviewStats.__table__
+    now = datetime.utcnow()
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        statement = dialect_insert(table).values(artisan_id=review.artisan_id, updated_at=now, **increments)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.artisan_id],
+            set_={
+                **{column: table.c[column] + statement.excluded[column] for column in increments},
+                "updated_at": statement.excluded.updated_at,
+            }
+        )
+        await db.execute(statement)
+        return
+
+    result = await db.execute(
+        update(table)
+        .where(table.c.artisan_id == review.artisan_id)
+        .values(updated_at=now, **{column: table.c[column] + value for column, value in increments.items()})
+    )
+    if result.rowcount == 0:
+        await db.execute(insert(table).values(artisan_id=review.artisan_id, updated_at=now, **increments))
+
+
+def _stats_columns():
+    # Same buckets as star_bucket: below 2 counts as 1, 5 and up as 5
+    stars = []
+    for star in range(1, 6):
+        bounds = []
+        if star > 1:
+            bounds.append(Review.rating >= star)
+        if star < 5:
+            bounds.append(Review.rating < star + 1)
+        stars.append(func.sum(case((and_(*bounds), 1), else_=0)).label(f"star_{star}"))
+
+    sub_ratings = []
+    for name in SUB_RATINGS:
+        column = getattr(Review, f"{name}_rating")
+        sub_ratings.append(func.coalesce(func.sum(column), 0.0).label(f"{name}_sum"))
+        sub_ratings.append(func.count(column).label(f"{name}_count"))
+    return stars + sub_ratings
+
+
+async def compute_review_stats(db: AsyncSession) -> Dict[int, dict]:
+    """Review statistics of every reviewed artisan, from `reviews` in one grouped pass."""
+    rows = (await db.execute(
+        select(Review.artisan_id, *_stats_columns()).group_by(Review.artisan_id)
+    )).all()
+    return {row.artisan_id: {k: v for k, v in row._asdict().items() if k != "artisan_id"} for row in rows}
+
+
+async def rebuild_review_stats(db: AsyncSession) -> int:
+    """Replace artisan_review_stats with values recomputed from `reviews` (backfill)."""
+    stats = await compute_review_stats(db)
+    now = datetime.utcnow()
+    await db.execute(delete(ArtisanReviewStats))
+    if stats:
+        await db.execute(insert(ArtisanReviewStats), [
+            {"artisan_id": artisan_id, "updated_at": now, **values}
+            for artisan_id, values in stats.items()
+        ])
+    await db.commit()
+    return len(stats)
+
+
+async def check_review_stats(db: AsyncSession) -> List[int]:
+    """Ids of artisans whose stored review statistics disagree with `reviews`."""
+    expected = await compute_review_stats(db)
+    columns = [column.name for column in ArtisanReviewStats.__table__.columns
+               if column.name not in ("artisan_id", "updated_at")]
+    stored = {
+        row.artisan_id: row._asdict()
+        for row in (await db.execute(select(
+            ArtisanReviewStats.artisan_id,
+            *[ArtisanReviewStats.__table__.c[column] for column in columns]
+        ))).all()
+    }
+
+    mismatched = []
+    for artisan_id in sorted(set(expected) | set(stored)):
+        want = expected.get(artisan_id, {})
+        have = stored.get(artisan_id, {})
+        if any(abs((want.get(column) or 0) - (have.get(column) or 0)) > 1e-6 for column in columns):
+            mismatched.append(artisan_id)
+    return mismatched
@@ -0,0 +1,309 @@
+"""Content-addressed file storage.
+
+Stored files are named after the SHA-256 of their content and sharded into
+two levels of directories (ab/cd/abcd...ef.png), so identical uploads share
+one object and a URL never changes meaning: responses are served with an
+immutable, year-long Cache-Control and the digest as a strong ETag.
+
+LocalStorage keeps objects under UPLOAD_DIR and serves them itself (ETag,
+If-None-Match, Range). S3Storage keeps them in an S3-compatible bucket
+(AWS, MinIO...), which serves ranges and conditional requests natively.
+set_storage installs another implementation.
+"""
+import asyncio
+import email.utils
+from abc import ABC, abstractmethod
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+import aiofiles.os
+import anyio
+from fastapi import HTTPException, Request, status
+from starlette.responses import FileResponse, RedirectResponse, Response
+from app.config import settings
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Files stored before content addressing (and anything not named by digest)
+MUTABLE = "public, no-cache"
+
+# Scratch space for uploads in progress; never served
+TMP_DIR = "tmp"
+
+_CONTENT_NAME = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})[\w.-]*$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def content_key(digest: str, suffix: str = "") -> str:
+    """Storage key of content with the given SHA-256 hex digest."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{suffix}"
+
+
+def content_digest(key: str) -> Optional[str]:
+    """Digest a content-addressed key was named after, None for other keys."""
+    match = _CONTENT_NAME.match(key)
+    return match.group(1) if match else None
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end inclusive) of a single-range Range header.
+
+    None when the header should be ignored (malformed or several ranges:
+    the whole file is sent). Raises 416 for a range outside the file.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    else:
+        start, end = max(size - int(last), 0), size - 1
+        if int(last) == 0:
+            start = size
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+class FileRangeResponse(FileResponse):
+    """FileResponse for `count` bytes of a file starting at `offset`."""
+
+    def __init__(self, path: str, offset: int, count: int, **kwargs):
+        super().__init__(path, **kwargs)
+        self.offset = offset
+        self.count = count
+        self.headers["content-length"] = str(count)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.offset)
+            remaining = self.count
+            while True:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                remaining -= len(chunk)
+                more_body = remaining > 0 and len(chunk) > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                if not more_body:
+                    break
+
+
+class Storage(ABC):
+    """Where uploaded files live and how they are served."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def put(self, source: str, key: str):
+        """Store the local file `source` under `key`; `source` is consumed.
+
+        Storing an existing content-addressed key is a no-op: same key,
+        same bytes.
+        """
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    def url(self, key: str) -> str:
+        return f"/uploads/{key}"
+
+    @abstractmethod
+    async def serve(self, request: Request, key: str) -> Response:
+        ...
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep) or path.startswith(os.path.join(self.root, TMP_DIR, "")):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        return path
+
+    async def exists(self, key: str) -> bool:
+        return await aiofiles.os.path.isfile(self.path(key))
+
+    async def put(self, source: str, key: str):
+        path = self.path(key)
+        if content_digest(key) and await aiofiles.os.path.isfile(path):
+            await aiofiles.os.remove(source)
+            return
+        await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Same filesystem as the upload scratch directory: an atomic rename
+        await aiofiles.os.replace(source, path)
+
+    async def delete(self, key: str):
+        try:
+            await aiofiles.os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    async def serve(self, request: Request, key: str) -> Response:
+        path = self.path(key)
+        try:
+            stat_result = await aiofiles.os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+        digest = content_digest(key)
+        if digest:
+            etag = f'"{digest}"'
+        else:
+            etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE if digest else MUTABLE,
+            "Accept-Ranges": "bytes",
+            "Last-Modified": email.utils.formatdate(stat_result.st_mtime, usegmt=True),
+        }
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        size = stat_result.st_size
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        byte_range = None
+        if "range" in request.headers and request.headers.get("if-range", etag) == etag:
+            try:
+                byte_range = parse_range(request.headers["range"], size)
+            except HTTPException as exc:
+                exc.headers.update(headers)
+                raise
+
+        if settings.STORAGE_ACCEL_REDIRECT:
+            # The front proxy sends the file (sendfile, ranges) from its own
+            # internal location mapped onto UPLOAD_DIR
+            headers["X-Accel-Redirect"] = settings.STORAGE_ACCEL_REDIRECT.rstrip("/") + "/" + key
+            return Response(headers=headers, media_type=media_type)
+
+        if byte_range is None:
+            return FileRangeResponse(path, 0, size, headers=headers, media_type=media_type,
+                                     stat_result=stat_result)
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return FileRangeResponse(path, start, end - start + 1, status_code=status.HTTP_206_PARTIAL_CONTENT,
+                                 headers=headers, media_type=media_type, stat_result=stat_result)
+
+
+class S3Storage(Storage):
+    """Objects in an S3-compatible bucket.
+
+    `client` is a boto3 S3 client; by default one is built from the S3_*
+    settings (S3_ENDPOINT_URL points it at MinIO or another local stand-in).
+    boto3 calls block, so they run in worker threads.
+    """
+
+    def __init__(self, bucket: str, client=None, public_url: str = ""):
+        if client is None:
+            import boto3  # only needed for this backend
+
+            client = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL or None,
+                region_name=settings.S3_REGION or None,
+                aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+                aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+            )
+        self.bucket = bucket
+        self.client = client
+        self.public_url = public_url.rstrip("/")
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+        except Exception as exc:
+            if _s3_status(exc) == 404:
+                return False
+            raise
+        return True
+
+    async def put(self, source: str, key: str):
+        if not (content_digest(key) and await self.exists(key)):
+            extra = {
+                "ContentType": mimetypes.guess_type(key)[0] or "application/octet-stream",
+                "CacheControl": IMMUTABLE if content_digest(key) else MUTABLE,
+            }
+            await asyncio.to_thread(self.client.upload_file, source, self.bucket, key, ExtraArgs=extra)
+        await aiofiles.os.remove(source)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return super().url(key)
+
+    async def serve(self, request: Request, key: str) -> Response:
+        # Private bucket: send the client to a signed URL; the redirect is
+        # cacheable for part of the signature's lifetime
+        expires = settings.S3_URL_EXPIRE_SECONDS
+        url = await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires
+        )
+        return RedirectResponse(
+            url, status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+            headers={"Cache-Control": f"private, max-age={expires // 2}"}
+        )
+
+
+def _s3_status(exc: Exception) -> Optional[int]:
+    response = getattr(exc, "response", None) or {}
+    code = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    if code is None and response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+        return 404
+    return code
+
+
+_storage: Optional[Storage] = None
+
+
+def set_storage(storage: Storage):
+    global _storage
+    _storage = storage
+
+
+def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _storage = S3Storage(settings.S3_BUCKET, public_url=settings.STORAGE_PUBLIC_URL)
+        else:
+            _storage = LocalStorage(settings.UPLOAD_DIR)
+    return _storage
@@ -0,0 +1,270 @@
+"""Signed tokens: keyring, verification and revocation.
+
+Tokens carry the id of the key that signed them in the `kid` header, so
+keys can be rotated: add a key to JWT_KEYS, make it JWT_ACTIVE_KID, and drop
+the old one once the tokens it signed have expired. Tokens without a `kid`
+were signed with SECRET_KEY. Verification is python-jose's, with the key
+picked by `kid` from the keyring.
+
+Every token has an id (`jti`) and belongs to a refresh-token family (`fam`),
+started at login. Refreshing rotates the refresh token; presenting one that
+was already rotated means it leaked, and the whole family is revoked. Revoked
+ids are mirrored by each worker in a RevocationList, synced from the
+revoked_tokens table every REVOCATION_SYNC_SECONDS, so checking a token never
+queries the database.
+"""
+import asyncio
+import hashlib
+import math
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional, Set
+from jose import JWTError, jwt
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.token import RefreshToken, RevokedToken
+
+DEFAULT_KID = "default"
+
+ALGORITHMS = ("HS256", "HS384", "HS512")
+
+
+class Keyring:
+    """Signing secrets by key id."""
+
+    def __init__(self, keys: Dict[str, str], active_kid: str, algorithm: str):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported JWT algorithm {algorithm}")
+        if active_kid not in keys:
+            raise ValueError(f"JWT_ACTIVE_KID {active_kid!r} is not in JWT_KEYS")
+        self.algorithm = algorithm
+        self.active_kid = active_kid
+        self.secrets = dict(keys)
+
+    @classmethod
+    def from_settings(cls) -> "Keyring":
+        keys = {DEFAULT_KID: settings.SECRET_KEY}
+        for entry in filter(None, (part.strip() for part in settings.JWT_KEYS.split(","))):
+            kid, _, secret = entry.partition(":")
+            keys[kid.strip()] = secret.strip()
+        return cls(keys, settings.JWT_ACTIVE_KID or DEFAULT_KID, settings.ALGORITHM)
+
+    def sign(self, claims: dict) -> str:
+        return jwt.encode(claims, self.secrets[self.active_kid], algorithm=self.algorithm,
+                          headers={"kid": self.active_kid})
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Claims of an unexpired token signed by one of the keys, else None."""
+        try:
+            kid = jwt.get_unverified_header(token).get("kid", DEFAULT_KID)
+            # The header is not verified yet: kid may be anything JSON
+            secret = self.secrets.get(kid) if isinstance(kid, str) else None
+            if secret is None:
+                return None
+            return jwt.decode(token, secret, algorithms=[self.algorithm], options={"require_exp": True})
+        except (JWTError, AttributeError):
+            return None
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter: no false negatives, `error_rate` false positives."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """This worker's copy of the revoked token ids.
+
+    Lookups go through a Bloom filter first: for the common case (nothing
+    revoked) a check is a fixed number of bit probes however long the list
+    gets; the exact set only settles the filter's rare false positives. New
+    revocations are fetched incrementally; a periodic full sync rebuilds the
+    filter without the ids whose tokens have expired.
+
+    Incremental syncs select by `revoked_at` rather than by id: ids are
+    allocated when a row is inserted but become visible when its
+    transaction commits, possibly after a higher id was already synced. Each
+    sync re-reads the REVOCATION_SYNC_OVERLAP_SECONDS before the newest
+    revocation it has seen, so a revocation committed up to that long after
+    its timestamp is still picked up.
+    """
+
+    def __init__(self, capacity: int, sync_seconds: float, full_sync_seconds: float, overlap_seconds: float):
+        self.capacity = capacity
+        self.sync_seconds = sync_seconds
+        self.full_sync_seconds = full_sync_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._ids: Set[str] = set()
+        self._bloom = BloomFilter(capacity)
+        self._seen_until: Optional[datetime] = None  # newest revoked_at synced
+        self._synced_at = float("-inf")
+        self._full_synced_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    def is_revoked(self, *token_ids: Optional[str]) -> bool:
+        return any(
+            token_id is not None and token_id in self._bloom and token_id in self._ids
+            for token_id in token_ids
+        )
+
+    def add(self, token_id: str):
+        self._ids.add(token_id)
+        self._bloom.add(token_id)
+
+    async def sync(self, db: AsyncSession, full: bool = False):
+        now = time.monotonic()
+        query = select(RevokedToken.token_id, RevokedToken.revoked_at).where(
+            RevokedToken.expires_at > datetime.utcnow()
+        )
+        if not full and self._seen_until is not None:
+            query = query.where(RevokedToken.revoked_at >= self._seen_until - self.overlap)
+        rows = (await db.execute(query)).all()
+
+        if full:
+            self._ids = set()
+            self._bloom = BloomFilter(max(self.capacity, 2 * len(rows)))
+            self._full_synced_at = now
+        for row in rows:
+            self.add(row.token_id)
+            if row.revoked_at is not None and (self._seen_until is None or row.revoked_at > self._seen_until):
+                self._seen_until = row.revoked_at
+        self._synced_at = now
+
+    async def sync_if_stale(self, db: AsyncSession):
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_seconds or self._lock.locked():
+            return  # fresh enough, or another request is syncing
+        async with self._lock:
+            await self.sync(db, full=now - self._full_synced_at >= self.full_sync_seconds)
+
+
+keyring = Keyring.from_settings()
+revocations = RevocationList(
+    capacity=settings.REVOCATION_BLOOM_CAPACITY,
+    sync_seconds=settings.REVOCATION_SYNC_SECONDS,
+    full_sync_seconds=settings.REVOCATION_FULL_SYNC_SECONDS,
+    overlap_seconds=settings.REVOCATION_SYNC_OVERLAP_SECONDS
+)
+
+
+class TokenPair(NamedTuple):
+    access_token: str
+    refresh_token: str
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex
+
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    expires_delta = expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    claims = {**data, "sub": str(data["sub"]), "type": "access", "jti": _new_id(),
+              "exp": int(time.time() + expires_delta.total_seconds())}
+    return keyring.sign(claims)
+
+
+def decode_token(token: str) -> Optional[dict]:
+    """Claims of a valid, unexpired and unrevoked token, else None."""
+    claims = keyring.verify(token)
+    if claims is None:
+        return None
+    if revocations.is_revoked(claims.get("jti"), claims.get("fam")):
+        return None
+    return claims
+
+
+async def issue_tokens(db: AsyncSession, user_id: int, family_id: Optional[str] = None) -> TokenPair:
+    """Access and refresh tokens; starts a new family unless one is given.
+
+    Adds the refresh token's row to the session; the caller commits.
+    """
+    family_id = family_id or _new_id()
+    jti = _new_id()
+    expires_at = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    db.add(RefreshToken(jti=jti, user_id=user_id, family_id=family_id, expires_at=expires_at))
+    refresh_token = keyring.sign({
+        "sub": str(user_id), "type": "refresh", "jti": jti, "fam": family_id,
+        "exp": int((expires_at - datetime(1970, 1, 1)).total_seconds()),
+    })
+    return TokenPair(create_access_token({"sub": user_id, "fam": family_id}), refresh_token)
+
+
+class RefreshReused(Exception):
+    """A rotated refresh token was presented again; its family is now revoked."""
+
+
+async def rotate_refresh_token(db: AsyncSession, claims: dict) -> TokenPair:
+    """Exchange a verified refresh token for a new pair, once.
+
+    The token is marked used with a conditional UPDATE, so two concurrent
+    refreshes with the same token cannot both succeed. Commits.
+    """
+    jti, family_id = claims.get("jti"), claims.get("fam")
+    result = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.jti == jti, RefreshToken.used_at.is_(None))
+        .values(used_at=datetime.utcnow())
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        if await db.get(RefreshToken, jti) is not None:
+            await revoke_family(db, family_id)
+            raise RefreshReused()
+        raise LookupError("Unknown refresh token")
+
+    pair = await issue_tokens(db, int(claims["sub"]), family_id)
+    await db.commit()
+    return pair
+
+
+async def revoke(db: AsyncSession, token_ids: Iterable[str], expires_at: datetime):
+    """Record revoked ids and apply them to this worker at once. Commits."""
+    token_ids = list(token_ids)
+    for token_id in token_ids:
+        if await db.scalar(select(RevokedToken.id).where(RevokedToken.token_id == token_id)) is None:
+            db.add(RevokedToken(token_id=token_id, expires_at=expires_at))
+    await db.commit()
+    for token_id in token_ids:
+        revocations.add(token_id)
+
+
+async def revoke_family(db: AsyncSession, family_id: str):
+    """Revoke every access and refresh token of a family. Commits."""
+    expires_at = await db.scalar(
+        select(RefreshToken.expires_at)
+        .where(RefreshToken.family_id == family_id)
+        .order_by(RefreshToken.expires_at.desc())
+        .limit(1)
+    )
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.used_at.is_(None))
+        .values(used_at=datetime.utcnow())
+    )
+    await revoke(db, [family_id], expires_at or datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS))
+
+
+async def purge_expired_tokens(db: AsyncSession) -> int:
+    """Delete refresh tokens and revocations past their expiry. Commits."""
+    now = datetime.utcnow()
+    removed = (await db.execute(delete(RefreshToken).where(RefreshToken.expires_at <= now))).rowcount
+    removed += (await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))).rowcount
+    await db.commit()
+    return removed
@@ -0,0 +1,234 @@
+"""Streaming multipart uploads.
+
+Request bodies are parsed chunk by chunk as they arrive: file parts go
+straight to a temporary file on disk and the size limit is enforced while
+streaming, so neither memory nor disk ever holds more than MAX_FILE_SIZE
+per file. Each file's SHA-256 is computed on the way, for content-addressed
+storage (app.core.storage).
+"""
+import asyncio
+import hashlib
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, Request, status
+from multipart.multipart import MultipartParser, parse_options_header
+from app.config import settings
+from app.core.images import THUMBNAIL_SIZES, process_image, sniff_format
+from app.core.storage import TMP_DIR, content_key, get_storage
+
+# Largest accepted text field in an upload form
+MAX_FIELD_SIZE = 10_000
+
+# Allowance for multipart boundaries, part headers and text fields
+FORM_OVERHEAD = 64 * 1024
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+
+def image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS)
+    return _image_pool
+
+
+def shutdown_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large (max {settings.MAX_FILE_SIZE // (1024 * 1024)}MB)"
+    )
+
+
+class UploadForm:
+    """Text fields and stored file parts of a multipart request."""
+
+    def __init__(self, file_fields: Sequence[str], max_file_size: int):
+        self.file_fields = set(file_fields)
+        self.max_file_size = max_file_size
+        self.fields: Dict[str, str] = {}
+        self.files: Dict[str, str] = {}  # field name -> temporary path
+        self.digests: Dict[str, "hashlib._Hash"] = {}  # temporary path -> SHA-256 so far
+        self._pending: List[Tuple[str, bytes]] = []
+        self._handles = {}
+        self._error: Optional[HTTPException] = None
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._name: Optional[str] = None
+        self._path: Optional[str] = None  # file part being received
+        self._is_file = False
+        self._size = 0
+        self._data = b""
+
+    # Parser callbacks (synchronous; file data is written after each chunk)
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._name = self._path = None
+        self._is_file = False
+        self._size = 0
+        self._data = b""
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        self._name = options.get(b"name", b"").decode("utf-8", "replace")
+        self._is_file = b"filename" in options
+        if self._is_file and self._name in self.file_fields and self._name not in self.files:
+            self._path = os.path.join(settings.UPLOAD_DIR, TMP_DIR, uuid.uuid4().hex)
+            self.files[self._name] = self._path
+            self.digests[self._path] = hashlib.sha256()
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._error is not None:
+            return
+        self._size += end - start
+        if self._is_file:
+            if self._path is None:
+                return  # unexpected file field: discarded
+            if self._size > self.max_file_size:
+                self._error = _too_large()
+                return
+            self._pending.append((self._path, data[start:end]))
+        elif self._size > MAX_FIELD_SIZE:
+            self._error = HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Form field too large"
+            )
+        else:
+            self._data += data[start:end]
+
+    def on_part_end(self):
+        if not self._is_file and self._name:
+            self.fields[self._name] = self._data.decode("utf-8", "replace")
+
+    async def _write_pending(self):
+        pending, self._pending = self._pending, []
+        for path, data in pending:
+            if path not in self._handles:
+                self._handles[path] = await aiofiles.open(path, "wb")
+            await self._handles[path].write(data)
+            self.digests[path].update(data)
+
+    async def _close(self):
+        handles, self._handles = self._handles, {}
+        for handle in handles.values():
+            await handle.close()
+
+    async def discard(self):
+        """Delete temporary files that were not handed to store_image."""
+        await self._close()
+        for path in self.files.values():
+            try:
+                await aiofiles.os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.files = {}
+
+
+async def parse_upload(request: Request, file_fields: Sequence[str]) -> UploadForm:
+    """Stream a multipart/form-data body to disk.
+
+    Only file parts named in `file_fields` are kept (the first of each);
+    oversized files or fields abort the upload with 413.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Expected multipart/form-data"
+        )
+
+    # Reject early when the client announces an oversized body
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.MAX_FILE_SIZE * len(file_fields) + FORM_OVERHEAD:
+        raise _too_large()
+
+    form = UploadForm(file_fields, settings.MAX_FILE_SIZE)
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": form.on_part_begin,
+        "on_part_data": form.on_part_data,
+        "on_part_end": form.on_part_end,
+        "on_header_field": form.on_header_field,
+        "on_header_value": form.on_header_value,
+        "on_header_end": form.on_header_end,
+        "on_headers_finished": form.on_headers_finished,
+    })
+
+    await aiofiles.os.makedirs(os.path.join(settings.UPLOAD_DIR, TMP_DIR), exist_ok=True)
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if form._error is not None:
+                raise form._error
+            await form._write_pending()
+        parser.finalize()
+        await form._close()
+    except BaseException:
+        await form.discard()
+        raise
+    return form
+
+
+async def store_image(form: UploadForm, field: str) -> Optional[str]:
+    """Validate an uploaded image, store it and its thumbnails; returns its URL.
+
+    Files are stored by content digest: an image that was uploaded before is
+    not decoded again and reuses the stored original and thumbnails.
+    Decoding and resizing run in the image process pool.
+    """
+    path = form.files.pop(field, None)
+    if path is None:
+        return None
+    digest = form.digests.pop(path).hexdigest()
+    storage = get_storage()
+    scratch = None
+    try:
+        async with aiofiles.open(path, "rb") as file:
+            extension = sniff_format(await file.read(16))
+        if extension is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image format")
+        key = content_key(digest, f".{extension}")
+        if await storage.exists(key):
+            return storage.url(key)
+
+        scratch = os.path.join(settings.UPLOAD_DIR, TMP_DIR, uuid.uuid4().hex)
+        loop = asyncio.get_running_loop()
+        try:
+            name = await loop.run_in_executor(image_pool(), process_image, path, scratch, digest)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+        # Thumbnails first: once the original exists, so do they
+        for size in THUMBNAIL_SIZES:
+            await storage.put(os.path.join(scratch, f"{digest}_{size}.webp"), content_key(digest, f"_{size}.webp"))
+        key = content_key(digest, name[len(digest):])
+        await storage.put(os.path.join(scratch, name), key)
+        return storage.url(key)
+    finally:
+        if await aiofiles.os.path.exists(path):
+            await aiofiles.os.remove(path)
+        if scratch is not None:
+            await asyncio.to_thread(shutil.rmtree, scratch, True)
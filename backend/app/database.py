@@ -1,16 +1,266 @@
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import contextvars
+import itertools
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Async drivers for the URL schemes accepted in DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False) if driver else url
+
+
+class PoolMetrics:
+    """Checkout counters and wait times of an InstrumentedPool."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._waits.append(wait)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            count = self.checkouts + self.timeouts
+
+            def percentile(p):
+                return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": round(self.total_wait / count * 1000, 3) if count else 0.0,
+                "wait_ms_p95": round(percentile(0.95) * 1000, 3),
+                "wait_ms_max": round(self.max_wait * 1000, 3),
+            }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - start)
+        return connection
+
+
+def engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}  # in-memory SQLite keeps SQLAlchemy's single-connection pool
+
+    options = {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if parsed.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        options["connect_args"] = {
+            "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}
+        }
+    return options
+
+
+class PrimarySession(Session):
+    """Session on the primary; remembers which users just wrote.
+
+    Set `session.info["user_id"]` to attribute the session's writes to a user
+    (get_current_user does); after a commit that flushed changes, that user's
+    reads are routed to the primary for REPLICA_STICKY_SECONDS.
+    """
+
+
+class ReplicaSession(Session):
+    """Session on a read replica; refuses to flush writes."""
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _flag_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _record_writer(session):
+    if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+        mark_recent_write(session.info["user_id"])
+
+
+@event.listens_for(PrimarySession, "after_soft_rollback")
+def _clear_write_flag(session, previous_transaction):
+    session.info.pop("wrote", None)
+
+
+@event.listens_for(ReplicaSession, "before_flush")
+def _refuse_replica_writes(session, flush_context, instances):
+    if session.new or session.dirty or session.deleted:
+        raise exc.InvalidRequestError("Read replica sessions are read-only")
 
-Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+def _sessionmaker(bind, sync_session_class):
+    return async_sessionmaker(
+        bind=bind,
+        class_=AsyncSession,
+        sync_session_class=sync_session_class,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
+
+engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    **engine_options(settings.DATABASE_URL)
+)
+SessionLocal = _sessionmaker(engine, PrimarySession)
+
+replica_engines = [
+    create_async_engine(async_database_url(url), **engine_options(url))
+    for url in settings.DATABASE_REPLICA_URLS
+]
+_replica_sessionmakers = itertools.cycle([
+    _sessionmaker(replica_engine, ReplicaSession) for replica_engine in replica_engines
+])
+
+
+class QueryStats:
+    """Statements run, and time spent in them, within a track_queries block."""
+
+    __slots__ = ("statements", "duration", "repeats")
+
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0
+        self.repeats: Counter = Counter()  # statement text -> executions
+
+
+_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+@contextmanager
+def track_queries():
+    """Count the statements this task (and the tasks it starts) runs."""
+    stats = QueryStats()
+    token = _query_stats.set(stats)
     try:
-        yield db
+        yield stats
     finally:
-        db.close()
+        _query_stats.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _query_stats.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _query_stats.get()
+    started = conn.info.get("query_started")
+    if stats is None or not started:
+        return
+    stats.duration += time.perf_counter() - started.pop()
+    stats.statements += 1
+    stats.repeats[statement] += 1
+
+
+def _discard_failed(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+for _engine in (engine, *replica_engines):
+    event.listen(_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(_engine.sync_engine, "handle_error", _discard_failed)
+
+# user id -> monotonic deadline until which that user reads from the primary.
+# Process-local: with several workers, stickiness holds only on the worker that
+# served the write, so REPLICA_STICKY_SECONDS should cover typical replica lag.
+_recent_writers: Dict[int, float] = {}
+
+Base = declarative_base()
+
+def mark_recent_write(user_id: int):
+    now = time.monotonic()
+    _recent_writers[user_id] = now + settings.REPLICA_STICKY_SECONDS
+    if len(_recent_writers) > 10_000:
+        for key in [k for k, deadline in _recent_writers.items() if deadline <= now]:
+            del _recent_writers[key]
+
+def read_sessionmaker(user_id: Optional[int] = None) -> async_sessionmaker:
+    """Session factory for a read-only request.
+
+    Round-robins over the replicas, except for users who wrote recently (read
+    your own writes) or when no replica is configured.
+    """
+    if not replica_engines:
+        return SessionLocal
+    if user_id is not None and _recent_writers.get(user_id, 0) > time.monotonic():
+        return SessionLocal
+    return next(_replica_sessionmakers)
+
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
+
+def get_pool_stats(target=engine) -> dict:
+    """Current pool occupancy plus checkout wait statistics of one engine."""
+    pool = target.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": pool._max_overflow,
+        })
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        stats.update(metrics.snapshot())
+    return stats
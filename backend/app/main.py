@@ -1,23 +1,44 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-import os
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.config import settings
-from app.database import engine, Base
-from app.routers import auth, artisans, bookings, reviews
+from app.database import engine, replica_engines, get_pool_stats
+from app.routers import auth, artisans, bookings, reviews, chat, uploads
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.http_cache import HTTPCacheMiddleware
+from app.core.chat import message_writer
+from app.core.uploads import shutdown_image_pool
+from app.core.passwords import shutdown_hash_pool
+from app.core import metrics, query_advisor, startup
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background: liveness answers at once, /ready once warm
+    warm_up = asyncio.create_task(startup.warm_up())
+    yield
+    warm_up.cancel()
+    await message_writer.close()
+    shutdown_image_pool()
+    shutdown_hash_pool()
+    for target in (engine, *replica_engines):
+        await target.dispose()
 
 app = FastAPI(
     title=settings.APP_NAME,
     description="API pour la plateforme Fi-Khidmatik - Services à domicile",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
+# ETag/304 and response caching for public catalog routes (inside CORS, whose
+# headers depend on the request's Origin)
+app.add_middleware(HTTPCacheMiddleware)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -25,20 +46,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
-# Create uploads directory
-os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
+# Development: EXPLAIN the queries of slow requests
+if settings.QUERY_ADVISOR_ENABLED:
+    query_advisor.install(engine, *replica_engines)
+    app.add_middleware(query_advisor.QueryAdvisorMiddleware)
+
+# Per-route latency, SQL statements and serialization time (outermost: times everything)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+app.router.route_class = metrics.TimedRoute
+
+app.include_router(uploads.router)
 
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(artisans.router, prefix="/api")
 app.include_router(bookings.router, prefix="/api")
 app.include_router(reviews.router, prefix="/api")
+app.include_router(chat.router, prefix="/api")
 
 @app.get("/")
-def root():
+async def root():
     return {
         "message": "Bienvenue sur l'API Fi-Khidmatik",
         "docs": "/docs",
@@ -46,12 +78,33 @@ def root():
     }
 
 @app.get("/health")
-def health_check():
+async def health_check():
+    """Liveness: the process serves requests."""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: warmed up and the database is reachable."""
+    ready, reason = await startup.readiness()
+    return JSONResponse(
+        {"status": reason},
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/db-pool")
+async def db_pool_stats():
+    stats = get_pool_stats()
+    if replica_engines:
+        stats["replicas"] = [get_pool_stats(replica) for replica in replica_engines]
+    return stats
+
 # Service categories endpoint
 @app.get("/api/categories")
-def get_service_categories():
+async def get_service_categories():
     return {
         "categories": [
             {"id": "plumbing", "name_fr": "Plomberie", "name_ar": "سباكة", "icon": "🔧"},
@@ -70,16 +123,16 @@ def get_service_categories():
     }
 
 # Cities endpoint (Morocco)
+CITIES = [
+    "Casablanca", "Rabat", "Fès", "Marrakech", "Tanger",
+    "Meknès", "Agadir", "Oujda", "Kénitra", "Tétouan",
+    "Salé", "Temara", "Safi", "El Jadida", "Mohammedia",
+    "Béni Mellal", "Nador", "Taza", "Settat", "Khouribga"
+]
+
 @app.get("/api/cities")
-def get_cities():
-    return {
-        "cities": [
-            "Casablanca", "Rabat", "Fès", "Marrakech", "Tanger",
-            "Meknès", "Agadir", "Oujda", "Kénitra", "Tétouan",
-            "Salé", "Temara", "Safi", "El Jadida", "Mohammedia",
-            "Béni Mellal", "Nador", "Taza", "Settat", "Khouribga"
-        ]
-    }
+async def get_cities():
+    return {"cities": CITIES}
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,5 +1,7 @@
 from app.models.user import User
-from app.models.artisan import Artisan, ArtisanService, ArtisanPortfolio
+from app.models.artisan import Artisan, ArtisanService, ArtisanPortfolio, ArtisanFacetCount
 from app.models.booking import Booking
-from app.models.review import Review
+from app.models.review import Review, ArtisanReviewStats
 from app.models.chat import Conversation, Message
+from app.models.search import ArtisanSearchDocument
+from app.models.token import RefreshToken, RevokedToken
@@ -1,10 +1,20 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, Index, DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
+from app.core.geo import encode_geohash
 
 class Artisan(Base):
     __tablename__ = "artisans"
+    __table_args__ = (
+        # Listing order / keyset pagination
+        Index("ix_artisans_rating_id", "rating", "id"),
+        # City filter: ILIKE '%city%' needs a trigram index to avoid a scan
+        Index(
+            "ix_artisans_city_trgm", "city",
+            postgresql_using="gin", postgresql_ops={"city": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True)
@@ -19,13 +29,15 @@ class Artisan(Base):
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
     service_radius_km = Column(Integer, default=20)  # Service area
+    geohash = Column(String(12), nullable=True, index=True)  # Derived from latitude/longitude
 
     # Availability
     is_available = Column(Boolean, default=True)
     working_hours = Column(JSON, nullable=True)  # {"monday": {"start": "08:00", "end": "18:00"}, ...}
 
     # Stats
-    rating = Column(Float, default=0.0)
+    rating = Column(Float, default=0.0)  # rating_sum / total_reviews, stored for sorting
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default="0")
     total_reviews = Column(Integer, default=0)
     completed_jobs = Column(Integer, default=0)
 
@@ -44,8 +56,30 @@ class Artisan(Base):
     reviews = relationship("Review", back_populates="artisan")
 
 
+@event.listens_for(Artisan, "before_insert")
+@event.listens_for(Artisan, "before_update")
+def _sync_geohash(mapper, connection, target):
+    if target.latitude is not None and target.longitude is not None:
+        target.geohash = encode_geohash(target.latitude, target.longitude)
+    else:
+        target.geohash = None
+
+
+# ix_artisans_city_trgm needs the pg_trgm operator classes
+event.listen(
+    Artisan.__table__, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+
 class ArtisanService(Base):
     __tablename__ = "artisan_services"
+    __table_args__ = (
+        # Batched service loads and the category EXISTS probe of the listing
+        Index("ix_artisan_services_artisan_category", "artisan_id", "category"),
+        # Category filter driven from the services side (semi-join)
+        Index("ix_artisan_services_category_artisan", "category", "artisan_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     artisan_id = Column(Integer, ForeignKey("artisans.id"))
@@ -78,3 +112,22 @@ class ArtisanPortfolio(Base):
 
     # Relationships
     artisan = relationship("Artisan", back_populates="portfolio")
+
+
+class ArtisanFacetCount(Base):
+    """Artisans per (category, city, availability, rating bucket).
+
+    An artisan counts once under each category it offers and once under the
+    empty category, which stands for all of them. Maintained by
+    app.core.facets in the transactions that change an artisan's services,
+    city, availability or rating; rebuilt by `python -m app.cli
+    rebuild-facet-counts`.
+    """
+    __tablename__ = "artisan_facet_counts"
+
+    category = Column(String, primary_key=True)  # "" for every category
+    city = Column(String, primary_key=True)
+    is_available = Column(Boolean, primary_key=True)
+    rating_bucket = Column(Integer, primary_key=True)  # floor(rating * 2): half stars, 0-10
+
+    artisan_count = Column(Integer, nullable=False, default=0, server_default="0")
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Enum, Index, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
 from app.database import Base
+from app.core.schedule import booking_interval
 
 class BookingStatus(str, enum.Enum):
     PENDING = "pending"
@@ -19,6 +20,12 @@ class PaymentStatus(str, enum.Enum):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        Index("ix_bookings_customer_created_id", "customer_id", "created_at", "id"),
+        Index("ix_bookings_artisan_created_id", "artisan_id", "created_at", "id"),
+        # Slot engine: an artisan's bookings over a time range
+        Index("ix_bookings_artisan_starts_at", "artisan_id", "starts_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("users.id"))
@@ -32,6 +39,8 @@ class Booking(Base):
     scheduled_date = Column(DateTime, nullable=False)
     scheduled_time = Column(String, nullable=False)
     estimated_duration = Column(Integer, nullable=True)  # in minutes
+    starts_at = Column(DateTime, nullable=True)  # Derived from the three above
+    ends_at = Column(DateTime, nullable=True)
 
     # Location
     address = Column(String, nullable=False)
@@ -61,3 +70,12 @@ class Booking(Base):
     customer = relationship("User", back_populates="bookings_as_customer")
     artisan = relationship("Artisan", back_populates="bookings")
     review = relationship("Review", back_populates="booking", uselist=False)
+
+
+@event.listens_for(Booking, "before_insert")
+@event.listens_for(Booking, "before_update")
+def _sync_interval(mapper, connection, target):
+    if target.scheduled_date is not None:
+        target.starts_at, target.ends_at = booking_interval(
+            target.scheduled_date, target.scheduled_time, target.estimated_duration
+        )
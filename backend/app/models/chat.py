@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Inbox of either participant, keyset-paginated by activity
+        Index("ix_conversations_customer_activity", "customer_id", "last_message_at", "id"),
+        Index("ix_conversations_artisan_activity", "artisan_id", "last_message_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     customer_id = Column(Integer, ForeignKey("users.id"))
@@ -12,14 +17,24 @@ class Conversation(Base):
     booking_id = Column(Integer, ForeignKey("bookings.id"), nullable=True)
 
     last_message_at = Column(DateTime, default=datetime.utcnow)
+    last_message_preview = Column(String(200), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Unread messages per side, maintained by app.core.chat.MessageWriter
+    customer_unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+    artisan_unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+
     # Relationships
-    messages = relationship("Message", back_populates="conversation")
+    # write_only: history is read in pages (see the chat router), never whole
+    messages = relationship("Message", back_populates="conversation", lazy="write_only")
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset-paginated history of a conversation
+        Index("ix_messages_conversation_created_id", "conversation_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"))
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
 
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        Index("ix_reviews_artisan_created_id", "artisan_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.id"), unique=True)
@@ -30,3 +33,36 @@ class Review(Base):
     booking = relationship("Booking", back_populates="review")
     customer = relationship("User", back_populates="reviews")
     artisan = relationship("Artisan", back_populates="reviews")
+
+
+# Sub-ratings aggregated in ArtisanReviewStats
+SUB_RATINGS = ("quality", "punctuality", "communication")
+
+
+class ArtisanReviewStats(Base):
+    """Per-artisan review histogram and sub-rating totals, one row per artisan.
+
+    Maintained incrementally by app.core.stats.record_review_stats in the
+    transaction that creates a review; rebuilt by `python -m app.cli
+    rebuild-review-stats`.
+    """
+    __tablename__ = "artisan_review_stats"
+
+    artisan_id = Column(Integer, ForeignKey("artisans.id", ondelete="CASCADE"), primary_key=True)
+
+    # Review counts by floor(rating)
+    star_1 = Column(Integer, nullable=False, default=0, server_default="0")
+    star_2 = Column(Integer, nullable=False, default=0, server_default="0")
+    star_3 = Column(Integer, nullable=False, default=0, server_default="0")
+    star_4 = Column(Integer, nullable=False, default=0, server_default="0")
+    star_5 = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Sub-ratings are optional, so each has its own count
+    quality_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    quality_count = Column(Integer, nullable=False, default=0, server_default="0")
+    punctuality_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    punctuality_count = Column(Integer, nullable=False, default=0, server_default="0")
+    communication_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    communication_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
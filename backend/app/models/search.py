@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Text, Index, func, literal_column
+from datetime import datetime
+from app.database import Base
+
+def search_vector(name_text, services_text, bio_text):
+    """Weighted tsvector over the document columns (PostgreSQL only).
+
+    The 'simple' configuration is used because the text is already normalized
+    for both French and Arabic; the same expression backs the GIN index.
+    """
+    def weighted(column, weight):
+        return func.setweight(
+            func.to_tsvector(literal_column("'simple'"), column),
+            literal_column(f"'{weight}'")
+        )
+
+    return weighted(name_text, "A").op("||")(
+        weighted(services_text, "B")
+    ).op("||")(
+        weighted(bio_text, "C")
+    )
+
+
+class ArtisanSearchDocument(Base):
+    """Normalized searchable text of an artisan, one row per artisan.
+
+    Maintained by app.core.search.refresh_artisan_document whenever the name,
+    bio or services of an artisan change.
+    """
+    __tablename__ = "artisan_search_documents"
+
+    artisan_id = Column(Integer, ForeignKey("artisans.id", ondelete="CASCADE"), primary_key=True)
+
+    # Normalized (lowercased, diacritics folded) text, by ranking weight
+    name_text = Column(Text, nullable=False, default="")
+    services_text = Column(Text, nullable=False, default="")
+    bio_text = Column(Text, nullable=False, default="")
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index(
+            "ix_artisan_search_documents_vector",
+            search_vector(name_text, services_text, bio_text),
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlalchemy import or_, and_, select
 from typing import List, Optional
+from datetime import date, datetime, time, timedelta
 from app.database import get_db
 from app.models.user import User
 from app.models.artisan import Artisan, ArtisanService, ArtisanPortfolio
@@ -9,14 +11,33 @@ from app.schemas.artisan import (
     ArtisanResponse,
     ArtisanUpdate,
     ArtisanListResponse,
+    ArtisanNearbyResponse,
+    ArtisanSearchResponse,
     ServiceCreate,
     ServiceResponse,
     PortfolioCreate,
     PortfolioResponse
 )
-from app.core.security import get_current_user
+from app.core.security import get_current_artisan, get_current_artisan_id, get_read_db
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.listing import LIST_COLUMNS, artisan_filters, list_artisans, load_services
+from app.core.search import matching_artisans, ranked_matches, refresh_artisan_document
+from app.core.facets import (
+    compute_facet_counts,
+    load_facet_counts,
+    load_facet_keys,
+    refresh_artisan_facets,
+    summarize_facets
+)
+from app.core.http_cache import invalidate_artisan
+from app.core.schedule import DEFAULT_DURATION_MINUTES, open_slots
+from app.core.slots import MAX_SLOT_RANGE_DAYS, cached_busy_index
+from app.schemas.booking import SlotResponse
+from app.core.uploads import parse_upload, store_image
+from app.core.geo import haversine_km, bounding_box, covering_cells, prefix_upper_bound
+from app.core.metrics import TimedRoute
 
-router = APIRouter(prefix="/artisans", tags=["Artisans"])
+router = APIRouter(prefix="/artisans", tags=["Artisans"], route_class=TimedRoute)
 
 # Service categories
 SERVICE_CATEGORIES = [
@@ -34,82 +55,145 @@ SERVICE_CATEGORIES = [
     "other"          # أخرى
 ]
 
+async def _load_profile(db: AsyncSession, artisan_id: int) -> Optional[Artisan]:
+    # selectinload: joining both collections would return services x portfolio rows
+    return await db.scalar(
+        select(Artisan)
+        .options(selectinload(Artisan.services), selectinload(Artisan.portfolio))
+        .where(Artisan.id == artisan_id)
+        .execution_options(populate_existing=True)
+    )
+
 @router.get("/categories")
-def get_categories():
+async def get_categories():
     return SERVICE_CATEGORIES
 
 @router.get("/", response_model=List[ArtisanListResponse])
-def get_artisans(
+async def get_artisans(
+    response: Response,
     city: Optional[str] = None,
     category: Optional[str] = None,
     min_rating: Optional[float] = Query(None, ge=0, le=5),
     is_available: Optional[bool] = None,
     search: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 20,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    query = db.query(Artisan).options(
-        joinedload(Artisan.user),
-        joinedload(Artisan.services)
+    filters = artisan_filters(
+        city=city,
+        category=category,
+        min_rating=min_rating,
+        is_available=is_available
     )
 
-    # Filter by city
-    if city:
-        query = query.filter(Artisan.city.ilike(f"%{city}%"))
+    # Text search: rank by relevance instead of rating; the ranking applies the filters
+    ranking = None
+    if search:
+        ranking = await ranked_matches(db, search, filters, cursor, limit, skip)
+        if ranking is None:
+            return []
+        filters = []
 
-    # Filter by category
-    if category:
-        query = query.join(ArtisanService).filter(
-            ArtisanService.category == category
-        )
+    artisans, next_cursor = await list_artisans(db, filters, cursor, limit, skip, ranking)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
 
-    # Filter by rating
-    if min_rating is not None:
-        query = query.filter(Artisan.rating >= min_rating)
+    return artisans
 
-    # Filter by availability
-    if is_available is not None:
-        query = query.filter(Artisan.is_available == is_available)
+@router.get("/search", response_model=ArtisanSearchResponse)
+async def search_artisans(
+    response: Response,
+    city: Optional[str] = None,
+    category: Optional[str] = None,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    is_available: Optional[bool] = None,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """A listing page with the category, city, availability and rating facets of its filters."""
+    filters = dict(city=city, category=category, min_rating=min_rating, is_available=is_available)
+    clauses = artisan_filters(**filters)
 
-    # Search by name or bio
+    ranking = None
     if search:
-        query = query.join(User).filter(
-            (User.full_name.ilike(f"%{search}%")) |
-            (Artisan.bio.ilike(f"%{search}%"))
-        )
-
-    # Order by rating
-    query = query.order_by(Artisan.rating.desc())
-
-    artisans = query.offset(skip).limit(limit).all()
-
-    # Transform to response format
+        matches = await matching_artisans(db, search)
+        if matches is None:
+            return ArtisanSearchResponse(artisans=[], facets=summarize_facets({}, **filters))
+        counts = await compute_facet_counts(db, matches)
+        ranking = await ranked_matches(db, search, clauses, cursor, limit)
+        if ranking is None:
+            return ArtisanSearchResponse(artisans=[], facets=summarize_facets(counts, **filters))
+        clauses = []
+    else:
+        counts = await load_facet_counts(db)
+
+    artisans, next_cursor = await list_artisans(db, clauses, cursor, limit, ranking=ranking)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return ArtisanSearchResponse(artisans=artisans, facets=summarize_facets(counts, **filters))
+
+@router.get("/nearby", response_model=List[ArtisanNearbyResponse])
+async def get_nearby_artisans(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(20, gt=0, le=100),
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
+):
+    bbox = bounding_box(lat, lng, radius_km)
+    min_lat, max_lat, min_lng, max_lng = bbox
+
+    # Prefilter: geohash range scans over the cells covering the bounding box
+    cells = covering_cells(bbox)
+    filters = artisan_filters(category=category) + [
+        or_(*[
+            and_(Artisan.geohash >= cell, Artisan.geohash < prefix_upper_bound(cell))
+            for cell in cells
+        ]),
+        Artisan.latitude.between(min_lat, max_lat),
+        Artisan.longitude.between(min_lng, max_lng)
+    ]
+    candidates = (await db.execute(
+        select(*LIST_COLUMNS, Artisan.latitude, Artisan.longitude, Artisan.service_radius_km)
+        .join(User, User.id == Artisan.user_id)
+        .where(*filters)
+    )).all()
+
+    # Exact check: within the search radius and the artisan's own service radius
+    matches = []
+    for row in candidates:
+        distance = haversine_km(lat, lng, row.latitude, row.longitude)
+        if distance <= radius_km and distance <= (row.service_radius_km or 0):
+            matches.append((distance, row))
+
+    matches.sort(key=lambda match: (match[0], match[1].id))
+    matches = matches[:limit]
+
+    services = await load_services(db, [row.id for _, row in matches])
     result = []
-    for artisan in artisans:
-        result.append(ArtisanListResponse(
-            id=artisan.id,
-            user_id=artisan.user_id,
-            full_name=artisan.user.full_name,
-            avatar=artisan.user.avatar,
-            bio=artisan.bio,
-            city=artisan.city,
-            rating=artisan.rating,
-            total_reviews=artisan.total_reviews,
-            is_available=artisan.is_available,
-            is_verified=artisan.is_verified,
-            services=[ServiceResponse.model_validate(s) for s in artisan.services]
+    for distance, row in matches:
+        data = row._asdict()
+        for column in ("latitude", "longitude", "service_radius_km"):
+            data.pop(column)
+        result.append(ArtisanNearbyResponse(
+            **data,
+            services=services.get(row.id, []),
+            distance_km=round(distance, 2)
         ))
 
     return result
 
 @router.get("/{artisan_id}", response_model=ArtisanResponse)
-def get_artisan(artisan_id: int, db: Session = Depends(get_db)):
-    artisan = db.query(Artisan).options(
-        joinedload(Artisan.user),
-        joinedload(Artisan.services),
-        joinedload(Artisan.portfolio)
-    ).filter(Artisan.id == artisan_id).first()
+async def get_artisan(artisan_id: int, db: AsyncSession = Depends(get_db)):
+    # Primary, not a replica: the response cache is refilled right after
+    # invalidate_artisan, and a lagging replica would cache the old profile
+    artisan = await _load_profile(db, artisan_id)
 
     if not artisan:
         raise HTTPException(
@@ -119,70 +203,87 @@ def get_artisan(artisan_id: int, db: Session = Depends(get_db)):
 
     return artisan
 
-@router.put("/me", response_model=ArtisanResponse)
-def update_my_profile(
-    update_data: ArtisanUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+@router.get("/{artisan_id}/slots", response_model=List[SlotResponse])
+async def get_artisan_slots(
+    artisan_id: int,
+    from_date: date = Query(..., alias="from"),
+    to_date: date = Query(..., alias="to"),
+    duration: int = Query(DEFAULT_DURATION_MINUTES, gt=0, le=24 * 60),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
+    if to_date < from_date or (to_date - from_date).days >= MAX_SLOT_RANGE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range must be between 1 and {MAX_SLOT_RANGE_DAYS} days"
+        )
+
+    artisan = (await db.execute(
+        select(Artisan.working_hours, Artisan.is_available).where(Artisan.id == artisan_id)
+    )).first()
 
     if not artisan:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Artisan profile not found"
+            detail="Artisan not found"
         )
 
+    if not artisan.is_available:
+        return []
+
+    start = datetime.combine(from_date, time.min)
+    end = datetime.combine(to_date + timedelta(days=1), time.min)
+    busy = await cached_busy_index(db, artisan_id, start, end)
+
+    slots = open_slots(artisan.working_hours, busy, from_date, to_date, duration, not_before=datetime.now())
+    return [SlotResponse(start=slot_start, end=slot_end) for slot_start, slot_end in slots]
+
+@router.put("/me", response_model=ArtisanResponse)
+async def update_my_profile(
+    update_data: ArtisanUpdate,
+    artisan: Artisan = Depends(get_current_artisan),
+    db: AsyncSession = Depends(get_db)
+):
+    facets = await load_facet_keys(db, artisan.id)
     for field, value in update_data.model_dump(exclude_unset=True).items():
         setattr(artisan, field, value)
 
-    db.commit()
-    db.refresh(artisan)
+    await refresh_artisan_document(db, artisan.id)
+    await refresh_artisan_facets(db, artisan.id, facets)
+    await db.commit()
+    await invalidate_artisan(artisan.id)
 
-    return artisan
+    return await _load_profile(db, artisan.id)
 
 @router.post("/me/services", response_model=ServiceResponse)
-def add_service(
+async def add_service(
     service_data: ServiceCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    artisan_id: int = Depends(get_current_artisan_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-
-    if not artisan:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Artisan profile not found"
-        )
-
+    facets = await load_facet_keys(db, artisan_id)
     service = ArtisanService(
-        artisan_id=artisan.id,
+        artisan_id=artisan_id,
         **service_data.model_dump()
     )
     db.add(service)
-    db.commit()
-    db.refresh(service)
+    await refresh_artisan_document(db, artisan_id)
+    await refresh_artisan_facets(db, artisan_id, facets)
+    await db.commit()
+    await invalidate_artisan(artisan_id)
+    await db.refresh(service)
 
     return service
 
 @router.delete("/me/services/{service_id}")
-def delete_service(
+async def delete_service(
     service_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    artisan_id: int = Depends(get_current_artisan_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-
-    if not artisan:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Artisan profile not found"
-        )
-
-    service = db.query(ArtisanService).filter(
+    service = await db.scalar(select(ArtisanService).where(
         ArtisanService.id == service_id,
-        ArtisanService.artisan_id == artisan.id
-    ).first()
+        ArtisanService.artisan_id == artisan_id
+    ))
 
     if not service:
         raise HTTPException(
@@ -190,53 +291,88 @@ def delete_service(
             detail="Service not found"
         )
 
-    db.delete(service)
-    db.commit()
+    facets = await load_facet_keys(db, artisan_id)
+    await db.delete(service)
+    await refresh_artisan_document(db, artisan_id)
+    await refresh_artisan_facets(db, artisan_id, facets)
+    await db.commit()
+    await invalidate_artisan(artisan_id)
 
     return {"message": "Service deleted"}
 
 @router.post("/me/portfolio", response_model=PortfolioResponse)
-def add_portfolio_item(
+async def add_portfolio_item(
     portfolio_data: PortfolioCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    artisan_id: int = Depends(get_current_artisan_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
+    portfolio = ArtisanPortfolio(
+        artisan_id=artisan_id,
+        **portfolio_data.model_dump()
+    )
+    db.add(portfolio)
+    await db.commit()
+    await invalidate_artisan(artisan_id)
+    await db.refresh(portfolio)
 
-    if not artisan:
+    return portfolio
+
+@router.post(
+    "/me/portfolio/upload",
+    response_model=PortfolioResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["image"],
+        "properties": {
+            "image": {"type": "string", "format": "binary"},
+            "before_image": {"type": "string", "format": "binary"},
+            "title": {"type": "string"},
+            "description": {"type": "string"},
+        },
+    }}}}}
+)
+async def upload_portfolio_item(
+    request: Request,
+    artisan_id: int = Depends(get_current_artisan_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """Portfolio item from uploaded images (streamed, with WebP thumbnails)."""
+    form = await parse_upload(request, ("image", "before_image"))
+    try:
+        image_url = await store_image(form, "image")
+        before_image = await store_image(form, "before_image")
+    finally:
+        await form.discard()
+    if image_url is None:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Artisan profile not found"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="An image file is required"
         )
 
     portfolio = ArtisanPortfolio(
-        artisan_id=artisan.id,
-        **portfolio_data.model_dump()
+        artisan_id=artisan_id,
+        title=form.fields.get("title") or None,
+        description=form.fields.get("description") or None,
+        image_url=image_url,
+        before_image=before_image
     )
     db.add(portfolio)
-    db.commit()
-    db.refresh(portfolio)
+    await db.commit()
+    await invalidate_artisan(artisan_id)
+    await db.refresh(portfolio)
 
     return portfolio
 
 @router.delete("/me/portfolio/{portfolio_id}")
-def delete_portfolio_item(
+async def delete_portfolio_item(
     portfolio_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    artisan_id: int = Depends(get_current_artisan_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-
-    if not artisan:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Artisan profile not found"
-        )
-
-    portfolio = db.query(ArtisanPortfolio).filter(
+    portfolio = await db.scalar(select(ArtisanPortfolio).where(
         ArtisanPortfolio.id == portfolio_id,
-        ArtisanPortfolio.artisan_id == artisan.id
-    ).first()
+        ArtisanPortfolio.artisan_id == artisan_id
+    ))
 
     if not portfolio:
         raise HTTPException(
@@ -244,7 +380,8 @@ def delete_portfolio_item(
             detail="Portfolio item not found"
         )
 
-    db.delete(portfolio)
-    db.commit()
+    await db.delete(portfolio)
+    await db.commit()
+    await invalidate_artisan(artisan_id)
 
     return {"message": "Portfolio item deleted"}
@@ -1,39 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
-from app.models.user import User, UserRole
-from app.models.artisan import Artisan, ArtisanService
+from app.models.user import User
+from app.models.artisan import Artisan
 from app.schemas.user import UserCreate, UserLogin, UserResponse, Token
 from app.schemas.artisan import ArtisanCreate
+from app.core.onboarding import create_artisans
+from app.core.http_cache import invalidate_artisan
+from app.core.uploads import parse_upload, store_image
+from app.core.tokens import RefreshReused, issue_tokens, revoke_family, rotate_refresh_token
+from app.core.metrics import TimedRoute
 from app.core.security import (
-    get_password_hash,
-    verify_password,
-    create_access_token,
-    create_refresh_token,
+    get_password_hash_async,
+    verify_and_update_async,
     decode_token,
+    token_user_id,
     get_current_user
 )
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=TimedRoute)
 
 @router.post("/register", response_model=UserResponse)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     # Check if email exists
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User.id).where(User.email == user_data.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
     # Check if phone exists
-    if user_data.phone and db.query(User).filter(User.phone == user_data.phone).first():
+    if user_data.phone and await db.scalar(select(User.id).where(User.phone == user_data.phone)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Phone number already registered"
         )
 
     # Create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash_async(user_data.password)
     user = User(
         email=user_data.email,
         phone=user_data.phone,
@@ -43,79 +48,44 @@ def register(user_data: UserCreate, db: Session = Depends(get_db)):
         preferred_language=user_data.preferred_language
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
 
     return user
 
 @router.post("/register/artisan", response_model=UserResponse)
-def register_artisan(
+async def register_artisan(
     user_data: UserCreate,
     artisan_data: ArtisanCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    # Set role to artisan
-    user_data.role = UserRole.ARTISAN
-
+    """User, profile, services and search document in one transaction."""
     # Check if email exists
-    if db.query(User).filter(User.email == user_data.email).first():
+    if await db.scalar(select(User.id).where(User.email == user_data.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
-    # Create user
-    hashed_password = get_password_hash(user_data.password)
-    user = User(
-        email=user_data.email,
-        phone=user_data.phone,
-        hashed_password=hashed_password,
-        full_name=user_data.full_name,
-        role=UserRole.ARTISAN,
-        preferred_language=user_data.preferred_language
-    )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-
-    # Create artisan profile
-    artisan = Artisan(
-        user_id=user.id,
-        bio=artisan_data.bio,
-        experience_years=artisan_data.experience_years,
-        city=artisan_data.city,
-        address=artisan_data.address,
-        latitude=artisan_data.latitude,
-        longitude=artisan_data.longitude,
-        service_radius_km=artisan_data.service_radius_km,
-        working_hours=artisan_data.working_hours
-    )
-    db.add(artisan)
-    db.commit()
-    db.refresh(artisan)
-
-    # Add services
-    for service_data in artisan_data.services:
-        service = ArtisanService(
-            artisan_id=artisan.id,
-            category=service_data.category,
-            name=service_data.name,
-            description=service_data.description,
-            price_min=service_data.price_min,
-            price_max=service_data.price_max,
-            price_type=service_data.price_type
+    # Check if phone exists
+    if user_data.phone and await db.scalar(select(User.id).where(User.phone == user_data.phone)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Phone number already registered"
         )
-        db.add(service)
 
-    db.commit()
+    hashed_password = await get_password_hash_async(user_data.password)
+    user, = await create_artisans(db, [(user_data, artisan_data, hashed_password)])
+    await db.commit()
 
     return user
 
 @router.post("/login", response_model=Token)
-def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == user_data.email).first()
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(User).where(User.email == user_data.email))
 
-    if not user or not verify_password(user_data.password, user.hashed_password):
+    valid, new_hash = await verify_and_update_async(user_data.password, user.hashed_password) if user else (False, None)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -127,13 +97,16 @@ def login(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="Account is inactive"
         )
 
-    access_token = create_access_token(data={"sub": user.id})
-    refresh_token = create_refresh_token(data={"sub": user.id})
+    # Stored with another bcrypt cost: upgrade while the password is at hand
+    if new_hash:
+        user.hashed_password = new_hash
+
+    access_token, refresh_token = await issue_tokens(db, user.id)
+    await db.commit()
 
     return Token(access_token=access_token, refresh_token=refresh_token)
 
-@router.post("/refresh", response_model=Token)
-def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
+def _refresh_claims(refresh_token: str) -> dict:
     payload = decode_token(refresh_token)
 
     if payload.get("type") != "refresh":
@@ -141,21 +114,88 @@ def refresh_token(refresh_token: str, db: Session = Depends(get_db)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token type"
         )
+    return payload
+
+@router.post("/refresh", response_model=Token)
+async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    """New token pair; the refresh token presented can be used only once.
 
-    user_id = payload.get("sub")
-    user = db.query(User).filter(User.id == user_id).first()
+    Reusing a rotated refresh token revokes every token of its login.
+    """
+    payload = _refresh_claims(refresh_token)
 
-    if not user:
+    user_id = token_user_id(payload)
+    is_active = await db.scalar(select(User.is_active).where(User.id == user_id)) if user_id is not None else None
+
+    if is_active is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
 
-    access_token = create_access_token(data={"sub": user.id})
-    new_refresh_token = create_refresh_token(data={"sub": user.id})
+    if not is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Account is inactive"
+        )
+
+    try:
+        access_token, new_refresh_token = await rotate_refresh_token(db, payload)
+    except RefreshReused:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token already used; session revoked"
+        )
+    except LookupError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
 
     return Token(access_token=access_token, refresh_token=new_refresh_token)
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    """Revoke the refresh token's login: its refresh and access tokens."""
+    payload = _refresh_claims(refresh_token)
+    if payload.get("fam"):
+        await revoke_family(db, payload["fam"])
+
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: User = Depends(get_current_user)):
+    return current_user
+
+@router.post(
+    "/me/avatar",
+    response_model=UserResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["avatar"],
+        "properties": {"avatar": {"type": "string", "format": "binary"}},
+    }}}}}
+)
+async def upload_avatar(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    form = await parse_upload(request, ("avatar",))
+    try:
+        avatar = await store_image(form, "avatar")
+    finally:
+        await form.discard()
+    if avatar is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="An image file is required"
+        )
+
+    current_user.avatar = avatar
+    await db.commit()
+
+    # Artisan pages show the avatar
+    artisan_id = await db.scalar(select(Artisan.id).where(Artisan.user_id == current_user.id))
+    if artisan_id is not None:
+        await invalidate_artisan(artisan_id)
+
     return current_user
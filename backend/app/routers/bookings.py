@@ -1,23 +1,43 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 from app.database import get_db
-from app.models.user import User, UserRole
-from app.models.artisan import Artisan
 from app.models.booking import Booking, BookingStatus
 from app.schemas.booking import BookingCreate, BookingResponse, BookingUpdate
-from app.core.security import get_current_user
-
-router = APIRouter(prefix="/bookings", tags=["Bookings"])
+from app.core.security import Principal, get_current_artisan_id, get_current_principal
+from app.core.http_cache import invalidate_artisan
+from app.core.stats import record_completed_job
+from app.core.pagination import keyset_page, finalize_page
+from app.core.schedule import DEFAULT_DURATION_MINUTES, booking_interval, within_working_hours
+from app.core.slots import (
+    BLOCKING_STATUSES,
+    HELD_STATUSES,
+    claim_slot,
+    ensure_slot_free,
+    invalidate_slots,
+    lock_artisan
+)
+from app.core.metrics import TimedRoute
+
+router = APIRouter(prefix="/bookings", tags=["Bookings"], route_class=TimedRoute)
 
 @router.post("/", response_model=BookingResponse)
-def create_booking(
+async def create_booking(
     booking_data: BookingCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    # Check if artisan exists
-    artisan = db.query(Artisan).filter(Artisan.id == booking_data.artisan_id).first()
+    """Request a booking; it stays pending until the artisan accepts or rejects it.
+
+    Fails with 409 when the time overlaps another pending, accepted or in
+    progress booking of the artisan, and with 400 when the artisan has set
+    working hours and the time falls outside them. Artisans without working
+    hours can be booked at any time.
+    """
+    # Check if artisan exists; the lock serializes bookings of this artisan
+    artisan = await lock_artisan(db, booking_data.artisan_id)
     if not artisan:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -31,6 +51,16 @@ def create_booking(
             detail="Artisan is not available"
         )
 
+    # Check the requested time against working hours and existing bookings
+    duration = booking_data.estimated_duration or DEFAULT_DURATION_MINUTES
+    start, end = booking_interval(booking_data.scheduled_date, booking_data.scheduled_time, duration)
+    if artisan.working_hours and not within_working_hours(artisan.working_hours, start, end):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Requested time is outside the artisan's working hours"
+        )
+    await ensure_slot_free(db, artisan.id, start, end, statuses=HELD_STATUSES)
+
     # Create booking
     booking = Booking(
         customer_id=current_user.id,
@@ -39,6 +69,7 @@ def create_booking(
         service_description=booking_data.service_description,
         scheduled_date=booking_data.scheduled_date,
         scheduled_time=booking_data.scheduled_time,
+        estimated_duration=duration,
         address=booking_data.address,
         city=booking_data.city,
         latitude=booking_data.latitude,
@@ -47,52 +78,55 @@ def create_booking(
         customer_notes=booking_data.customer_notes
     )
     db.add(booking)
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    invalidate_slots(booking.artisan_id)
+    await db.refresh(booking)
 
     return booking
 
 @router.get("/my-bookings", response_model=List[BookingResponse])
-def get_my_bookings(
+async def get_my_bookings(
+    response: Response,
     status_filter: BookingStatus = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Booking).filter(Booking.customer_id == current_user.id)
+    query = select(Booking).where(Booking.customer_id == current_user.id)
 
     if status_filter:
-        query = query.filter(Booking.status == status_filter)
+        query = query.where(Booking.status == status_filter)
 
-    return query.order_by(Booking.created_at.desc()).all()
+    query = keyset_page(query, (Booking.created_at, Booking.id), cursor, (datetime, int), limit)
+
+    return finalize_page((await db.scalars(query)).all(), limit, response, lambda b: (b.created_at, b.id))
 
 @router.get("/artisan-bookings", response_model=List[BookingResponse])
-def get_artisan_bookings(
+async def get_artisan_bookings(
+    response: Response,
     status_filter: BookingStatus = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    artisan_id: int = Depends(get_current_artisan_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-
-    if not artisan:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Artisan profile not found"
-        )
-
-    query = db.query(Booking).filter(Booking.artisan_id == artisan.id)
+    query = select(Booking).where(Booking.artisan_id == artisan_id)
 
     if status_filter:
-        query = query.filter(Booking.status == status_filter)
+        query = query.where(Booking.status == status_filter)
 
-    return query.order_by(Booking.created_at.desc()).all()
+    query = keyset_page(query, (Booking.created_at, Booking.id), cursor, (datetime, int), limit)
+
+    return finalize_page((await db.scalars(query)).all(), limit, response, lambda b: (b.created_at, b.id))
 
 @router.get("/{booking_id}", response_model=BookingResponse)
-def get_booking(
+async def get_booking(
     booking_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.get(Booking, booking_id)
 
     if not booking:
         raise HTTPException(
@@ -101,8 +135,7 @@ def get_booking(
         )
 
     # Check permission
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-    artisan_id = artisan.id if artisan else None
+    artisan_id = current_user.artisan_id
 
     if booking.customer_id != current_user.id and booking.artisan_id != artisan_id:
         raise HTTPException(
@@ -113,13 +146,13 @@ def get_booking(
     return booking
 
 @router.put("/{booking_id}", response_model=BookingResponse)
-def update_booking(
+async def update_booking(
     booking_id: int,
     update_data: BookingUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.get(Booking, booking_id)
 
     if not booking:
         raise HTTPException(
@@ -127,9 +160,8 @@ def update_booking(
             detail="Booking not found"
         )
 
-    # Get artisan profile if exists
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-    artisan_id = artisan.id if artisan else None
+    # Artisan profile id if exists
+    artisan_id = current_user.artisan_id
 
     # Check permission
     if booking.customer_id != current_user.id and booking.artisan_id != artisan_id:
@@ -138,26 +170,33 @@ def update_booking(
             detail="Not authorized to update this booking"
         )
 
+    # Moving into a blocking status claims the time slot
+    if update_data.status in BLOCKING_STATUSES and booking.status not in BLOCKING_STATUSES:
+        await claim_slot(db, booking)
+
     # Update fields
     for field, value in update_data.model_dump(exclude_unset=True).items():
         setattr(booking, field, value)
 
     # Update artisan stats if completed
-    if update_data.status == BookingStatus.COMPLETED and artisan:
-        artisan.completed_jobs += 1
+    if update_data.status == BookingStatus.COMPLETED and artisan_id:
+        await record_completed_job(db, artisan_id)
 
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    invalidate_slots(booking.artisan_id)
+    if update_data.status == BookingStatus.COMPLETED and artisan_id:
+        await invalidate_artisan(artisan_id)
+    await db.refresh(booking)
 
     return booking
 
 @router.post("/{booking_id}/accept", response_model=BookingResponse)
-def accept_booking(
+async def accept_booking(
     booking_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.get(Booking, booking_id)
 
     if not booking:
         raise HTTPException(
@@ -165,9 +204,7 @@ def accept_booking(
             detail="Booking not found"
         )
 
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-
-    if not artisan or booking.artisan_id != artisan.id:
+    if current_user.artisan_id is None or booking.artisan_id != current_user.artisan_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized"
@@ -179,19 +216,22 @@ def accept_booking(
             detail="Booking is not pending"
         )
 
+    await claim_slot(db, booking)
+
     booking.status = BookingStatus.ACCEPTED
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    invalidate_slots(booking.artisan_id)
+    await db.refresh(booking)
 
     return booking
 
 @router.post("/{booking_id}/reject", response_model=BookingResponse)
-def reject_booking(
+async def reject_booking(
     booking_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.get(Booking, booking_id)
 
     if not booking:
         raise HTTPException(
@@ -199,9 +239,7 @@ def reject_booking(
             detail="Booking not found"
         )
 
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-
-    if not artisan or booking.artisan_id != artisan.id:
+    if current_user.artisan_id is None or booking.artisan_id != current_user.artisan_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized"
@@ -214,19 +252,20 @@ def reject_booking(
         )
 
     booking.status = BookingStatus.REJECTED
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    invalidate_slots(booking.artisan_id)
+    await db.refresh(booking)
 
     return booking
 
 @router.post("/{booking_id}/complete", response_model=BookingResponse)
-def complete_booking(
+async def complete_booking(
     booking_id: int,
     final_price: float = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.get(Booking, booking_id)
 
     if not booking:
         raise HTTPException(
@@ -234,9 +273,7 @@ def complete_booking(
             detail="Booking not found"
         )
 
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-
-    if not artisan or booking.artisan_id != artisan.id:
+    if current_user.artisan_id is None or booking.artisan_id != current_user.artisan_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized"
@@ -252,20 +289,22 @@ def complete_booking(
     if final_price:
         booking.final_price = final_price
 
-    artisan.completed_jobs += 1
+    await record_completed_job(db, booking.artisan_id)
 
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    invalidate_slots(booking.artisan_id)
+    await invalidate_artisan(booking.artisan_id)
+    await db.refresh(booking)
 
     return booking
 
 @router.post("/{booking_id}/cancel", response_model=BookingResponse)
-def cancel_booking(
+async def cancel_booking(
     booking_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    booking = db.query(Booking).filter(Booking.id == booking_id).first()
+    booking = await db.get(Booking, booking_id)
 
     if not booking:
         raise HTTPException(
@@ -287,7 +326,8 @@ def cancel_booking(
         )
 
     booking.status = BookingStatus.CANCELLED
-    db.commit()
-    db.refresh(booking)
+    await db.commit()
+    invalidate_slots(booking.artisan_id)
+    await db.refresh(booking)
 
     return booking
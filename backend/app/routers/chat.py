@@ -0,0 +1,206 @@
+import asyncio
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, WebSocket, WebSocketDisconnect
+from sqlalchemy import case, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.config import settings
+from app.database import SessionLocal, get_db
+from app.models.artisan import Artisan
+from app.models.chat import Conversation, Message
+from app.schemas.chat import ConversationCreate, ConversationResponse, MessageResponse
+from app.core.security import Principal, access_token_user_id, get_current_principal, load_principal
+from app.core.chat import MAX_MESSAGE_ID, OVERFLOW, Subscriber, get_hub, message_writer
+from app.core.pagination import keyset_page, finalize_page
+from app.core.metrics import TimedRoute
+
+router = APIRouter(prefix="/chat", tags=["Chat"], route_class=TimedRoute)
+
+# WebSocket close codes
+POLICY_VIOLATION = 1008
+TRY_AGAIN_LATER = 1013
+
+def _is_participant(conversation: Conversation, principal: Principal) -> bool:
+    return conversation.customer_id == principal.id or (
+        principal.artisan_id is not None and conversation.artisan_id == principal.artisan_id
+    )
+
+@router.post("/conversations", response_model=ConversationResponse)
+async def start_conversation(
+    conversation_data: ConversationCreate,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    artisan_id = await db.scalar(select(Artisan.id).where(Artisan.id == conversation_data.artisan_id))
+    if artisan_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Artisan not found"
+        )
+
+    if artisan_id == current_user.artisan_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot start a conversation with yourself"
+        )
+
+    # One conversation per customer, artisan and booking
+    conversation = await db.scalar(select(Conversation).where(
+        Conversation.customer_id == current_user.id,
+        Conversation.artisan_id == artisan_id,
+        Conversation.booking_id == conversation_data.booking_id
+        if conversation_data.booking_id is not None else Conversation.booking_id.is_(None)
+    ))
+    if conversation:
+        return conversation
+
+    conversation = Conversation(
+        customer_id=current_user.id,
+        artisan_id=artisan_id,
+        booking_id=conversation_data.booking_id
+    )
+    db.add(conversation)
+    await db.commit()
+    await db.refresh(conversation)
+
+    return conversation
+
+@router.get("/conversations", response_model=List[ConversationResponse])
+async def get_my_conversations(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(30, ge=1, le=100),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Inbox, most recent activity first: one query, counters and previews included."""
+    participant = Conversation.customer_id == current_user.id
+    if current_user.artisan_id is not None:
+        participant = or_(participant, Conversation.artisan_id == current_user.artisan_id)
+    unread_count = case(
+        (Conversation.customer_id == current_user.id, Conversation.customer_unread_count),
+        else_=Conversation.artisan_unread_count
+    ).label("unread_count")
+
+    query = select(Conversation, unread_count).where(participant)
+    query = keyset_page(query, (Conversation.last_message_at, Conversation.id), cursor, (datetime, int), limit)
+    rows = finalize_page((await db.execute(query)).all(), limit, response,
+                         lambda row: (row.Conversation.last_message_at, row.Conversation.id))
+
+    conversations = []
+    for row in rows:
+        conversation = ConversationResponse.model_validate(row.Conversation)
+        conversation.unread_count = row.unread_count
+        conversations.append(conversation)
+    return conversations
+
+@router.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
+async def get_messages(
+    conversation_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=100),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Message history, newest first, paged with the X-Next-Cursor header."""
+    conversation = await db.get(Conversation, conversation_id)
+
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation not found"
+        )
+
+    if not _is_participant(conversation, current_user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized"
+        )
+
+    query = select(Message).where(Message.conversation_id == conversation_id)
+    query = keyset_page(query, (Message.created_at, Message.id), cursor, (datetime, int), limit)
+
+    return finalize_page((await db.scalars(query)).all(), limit, response, lambda m: (m.created_at, m.id))
+
+async def _authorize(conversation_id: int, token: Optional[str]) -> Optional[Principal]:
+    # A short-lived session: the socket must not hold a pooled connection
+    user_id = access_token_user_id(token) if token else None
+    if user_id is None:
+        return None
+    async with SessionLocal() as db:
+        principal = await load_principal(db, user_id)
+        if principal is None or not principal.is_active:
+            return None
+        conversation = await db.get(Conversation, conversation_id)
+    if conversation is None or not _is_participant(conversation, principal):
+        return None
+    return principal
+
+async def _pump(websocket: WebSocket, subscriber: Subscriber):
+    """Forward hub events to the client until it falls behind."""
+    while True:
+        event = await subscriber.queue.get()
+        if event is OVERFLOW:
+            await websocket.close(code=TRY_AGAIN_LATER, reason="Too slow, reconnect")
+            return
+        await websocket.send_json(event)
+
+@router.websocket("/ws/{conversation_id}")
+async def chat_socket(websocket: WebSocket, conversation_id: int, token: Optional[str] = None):
+    """Live conversation.
+
+    Browsers cannot set headers on WebSocket requests, so the access token
+    comes in the `token` query parameter. Clients send
+    {"type": "message", "content": "..."} and {"type": "read", "up_to": <id>};
+    they receive the same types, with messages as stored.
+    """
+    principal = await _authorize(conversation_id, token)
+    if principal is None:
+        await websocket.close(code=POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    hub = get_hub()
+    subscriber = hub.subscribe(conversation_id)
+    # Only the pump writes to the socket; replies go through the same queue
+    pump = asyncio.create_task(_pump(websocket, subscriber))
+    try:
+        while not pump.done():
+            try:
+                data = json.loads(await websocket.receive_text())
+            except ValueError:
+                data = None
+            kind = data.get("type") if isinstance(data, dict) else None
+
+            if kind == "message":
+                content = str(data.get("content") or "").strip()
+                if not content or len(content) > settings.CHAT_MAX_MESSAGE_LENGTH:
+                    subscriber.offer({"type": "error", "detail": "Invalid message"})
+                    continue
+                # Waits for the batch holding this message to be stored
+                try:
+                    message = await message_writer.send(conversation_id, principal.id, content)
+                except Exception:
+                    # The writer logged it; the client may retry
+                    subscriber.offer({"type": "error", "detail": "Message could not be sent"})
+                    continue
+                await hub.publish(conversation_id, {"type": "message", "message": message.model_dump(mode="json")})
+
+            elif kind == "read":
+                up_to = data.get("up_to")
+                # bool is an int too
+                if type(up_to) is not int or not 0 < up_to <= MAX_MESSAGE_ID:
+                    subscriber.offer({"type": "error", "detail": "Invalid read receipt"})
+                    continue
+                message_writer.mark_read(conversation_id, principal.id, up_to)
+                await hub.publish(conversation_id, {"type": "read", "user_id": principal.id, "up_to": up_to})
+
+            else:
+                subscriber.offer({"type": "error", "detail": "Unknown event"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(subscriber)
+        pump.cancel()
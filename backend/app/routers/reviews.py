@@ -1,25 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 from app.database import get_db
-from app.models.user import User
 from app.models.artisan import Artisan
 from app.models.booking import Booking, BookingStatus
-from app.models.review import Review
+from app.models.review import Review, ArtisanReviewStats
 from app.schemas.review import ReviewCreate, ReviewResponse, ArtisanResponseToReview
-from app.core.security import get_current_user
+from app.core.security import Principal, get_current_principal, get_read_db
+from app.core.http_cache import invalidate_artisan
+from app.core.stats import record_review, record_review_stats
+from app.core.pagination import keyset_page, finalize_page
+from app.core.metrics import TimedRoute
 
-router = APIRouter(prefix="/reviews", tags=["Reviews"])
+router = APIRouter(prefix="/reviews", tags=["Reviews"], route_class=TimedRoute)
 
 @router.post("/", response_model=ReviewResponse)
-def create_review(
+async def create_review(
     review_data: ReviewCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     # Check if booking exists and is completed
-    booking = db.query(Booking).filter(Booking.id == review_data.booking_id).first()
+    booking = await db.get(Booking, review_data.booking_id)
 
     if not booking:
         raise HTTPException(
@@ -40,7 +44,7 @@ def create_review(
         )
 
     # Check if review already exists
-    existing_review = db.query(Review).filter(Review.booking_id == booking.id).first()
+    existing_review = await db.scalar(select(Review.id).where(Review.booking_id == booking.id))
     if existing_review:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -60,40 +64,40 @@ def create_review(
     )
     db.add(review)
 
-    # Update artisan rating
-    artisan = db.query(Artisan).filter(Artisan.id == booking.artisan_id).first()
-    if artisan:
-        # Calculate new average rating
-        total_rating = (artisan.rating * artisan.total_reviews) + review_data.rating
-        artisan.total_reviews += 1
-        artisan.rating = round(total_rating / artisan.total_reviews, 2)
+    # Update artisan rating and review statistics
+    await record_review(db, booking.artisan_id, review_data.rating)
+    await record_review_stats(db, review)
 
-    db.commit()
-    db.refresh(review)
+    await db.commit()
+    await invalidate_artisan(booking.artisan_id)
+    await db.refresh(review)
 
     return review
 
 @router.get("/artisan/{artisan_id}", response_model=List[ReviewResponse])
-def get_artisan_reviews(
+async def get_artisan_reviews(
     artisan_id: int,
-    skip: int = 0,
-    limit: int = 20,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    reviews = db.query(Review).filter(
-        Review.artisan_id == artisan_id
-    ).order_by(Review.created_at.desc()).offset(skip).limit(limit).all()
+    query = select(Review).where(Review.artisan_id == artisan_id)
+    query = keyset_page(query, (Review.created_at, Review.id), cursor, (datetime, int), limit)
+    if skip and not cursor:
+        query = query.offset(skip)
 
-    return reviews
+    return finalize_page((await db.scalars(query)).all(), limit, response, lambda r: (r.created_at, r.id))
 
 @router.post("/{review_id}/respond", response_model=ReviewResponse)
-def respond_to_review(
+async def respond_to_review(
     review_id: int,
     response_data: ArtisanResponseToReview,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
-    review = db.query(Review).filter(Review.id == review_id).first()
+    review = await db.get(Review, review_id)
 
     if not review:
         raise HTTPException(
@@ -102,9 +106,7 @@ def respond_to_review(
         )
 
     # Check if current user is the artisan
-    artisan = db.query(Artisan).filter(Artisan.user_id == current_user.id).first()
-
-    if not artisan or review.artisan_id != artisan.id:
+    if current_user.artisan_id is None or review.artisan_id != current_user.artisan_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to respond to this review"
@@ -117,45 +119,39 @@ def respond_to_review(
         )
 
     review.artisan_response = response_data.artisan_response
-    db.commit()
-    db.refresh(review)
+    await db.commit()
+    await db.refresh(review)
 
     return review
 
 @router.get("/stats/{artisan_id}")
-def get_review_stats(artisan_id: int, db: Session = Depends(get_db)):
-    artisan = db.query(Artisan).filter(Artisan.id == artisan_id).first()
-
-    if not artisan:
+async def get_review_stats(artisan_id: int, db: AsyncSession = Depends(get_db)):
+    # Primary, for the same reason as get_artisan: this response is cached
+    # One primary-key lookup: totals on the artisan, histogram and sub-ratings
+    # in artisan_review_stats (no row until the first review)
+    row = (await db.execute(
+        select(Artisan.total_reviews, Artisan.rating, ArtisanReviewStats)
+        .outerjoin(ArtisanReviewStats, ArtisanReviewStats.artisan_id == Artisan.id)
+        .where(Artisan.id == artisan_id)
+    )).first()
+
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Artisan not found"
         )
 
-    # Get rating distribution
-    rating_counts = db.query(
-        func.floor(Review.rating).label("rating"),
-        func.count(Review.id).label("count")
-    ).filter(Review.artisan_id == artisan_id).group_by(
-        func.floor(Review.rating)
-    ).all()
-
-    distribution = {i: 0 for i in range(1, 6)}
-    for rating, count in rating_counts:
-        distribution[int(rating)] = count
-
-    # Get average sub-ratings
-    avg_ratings = db.query(
-        func.avg(Review.quality_rating).label("quality"),
-        func.avg(Review.punctuality_rating).label("punctuality"),
-        func.avg(Review.communication_rating).label("communication")
-    ).filter(Review.artisan_id == artisan_id).first()
+    stats = row.ArtisanReviewStats
+
+    def average(name: str) -> float:
+        count = getattr(stats, f"{name}_count", 0)
+        return round(getattr(stats, f"{name}_sum") / count, 2) if count else 0
 
     return {
-        "total_reviews": artisan.total_reviews,
-        "average_rating": artisan.rating,
-        "distribution": distribution,
-        "quality_rating": round(avg_ratings.quality or 0, 2),
-        "punctuality_rating": round(avg_ratings.punctuality or 0, 2),
-        "communication_rating": round(avg_ratings.communication or 0, 2)
+        "total_reviews": row.total_reviews,
+        "average_rating": row.rating,
+        "distribution": {i: getattr(stats, f"star_{i}", 0) for i in range(1, 6)},
+        "quality_rating": average("quality"),
+        "punctuality_rating": average("punctuality"),
+        "communication_rating": average("communication")
     }
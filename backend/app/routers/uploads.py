@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Request
+from app.core.storage import get_storage
+from app.core.metrics import TimedRoute
+
+router = APIRouter(prefix="/uploads", tags=["Uploads"], route_class=TimedRoute)
+
+@router.api_route("/{key:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_upload(key: str, request: Request):
+    """Stored files: ETag, conditional and Range requests."""
+    return await get_storage().serve(request, key)
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
 from typing import Optional, List, Dict
 from datetime import datetime
+from app.core.images import AVATAR_THUMBNAIL, PORTFOLIO_THUMBNAIL, thumbnail_url
 
 class ServiceCreate(BaseModel):
     category: str
@@ -36,6 +37,11 @@ class PortfolioResponse(BaseModel):
     before_image: Optional[str]
     created_at: datetime
 
+    @computed_field
+    @property
+    def thumbnail(self) -> Optional[str]:
+        return thumbnail_url(self.image_url, PORTFOLIO_THUMBNAIL)
+
     class Config:
         from_attributes = True
 
@@ -97,5 +103,24 @@ class ArtisanListResponse(BaseModel):
     is_verified: bool
     services: List[ServiceResponse] = []
 
+    @computed_field
+    @property
+    def avatar_thumbnail(self) -> Optional[str]:
+        return thumbnail_url(self.avatar, AVATAR_THUMBNAIL)
+
     class Config:
         from_attributes = True
+
+class ArtisanNearbyResponse(ArtisanListResponse):
+    distance_km: float
+
+class ArtisanFacets(BaseModel):
+    total: int
+    categories: Dict[str, int]
+    cities: Dict[str, int]
+    availability: Dict[str, int]  # available / unavailable
+    ratings: Dict[str, int]  # artisans rated at least the key
+
+class ArtisanSearchResponse(BaseModel):
+    artisans: List[ArtisanListResponse]
+    facets: ArtisanFacets
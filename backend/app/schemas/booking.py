@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 from app.models.booking import BookingStatus, PaymentStatus
@@ -9,6 +9,7 @@ class BookingCreate(BaseModel):
     service_description: str
     scheduled_date: datetime
     scheduled_time: str
+    estimated_duration: Optional[int] = Field(None, gt=0, le=24 * 60)  # minutes, default 60
     address: str
     city: str
     latitude: Optional[float] = None
@@ -45,3 +46,7 @@ class BookingResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class SlotResponse(BaseModel):
+    start: datetime
+    end: datetime
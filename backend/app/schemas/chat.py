@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class ConversationCreate(BaseModel):
+    artisan_id: int
+    booking_id: Optional[int] = None
+
+class ConversationResponse(BaseModel):
+    id: int
+    customer_id: int
+    artisan_id: int
+    booking_id: Optional[int]
+    last_message_at: datetime
+    last_message_preview: Optional[str] = None
+    unread_count: int = 0  # messages the caller has not read
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class MessageResponse(BaseModel):
+    id: int
+    conversation_id: int
+    sender_id: int
+    content: str
+    is_read: bool
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,225 @@
+"""Artisan listing benchmark: legacy ORM query vs. the projected listing engine.
+
+Seeds a throwaway SQLite database and reports, per scenario, the number of
+rows and values (rows x columns) the database sends back and the median
+latency of each implementation.
+
+    python -m benchmarks.bench_artisan_listing --sizes 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, insert  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import Session, joinedload  # noqa: E402
+
+from app.database import Base  # noqa: E402
+from app.models import User, Artisan, ArtisanService, ArtisanSearchDocument  # noqa: E402
+from app.models.user import UserRole  # noqa: E402
+from app.schemas.artisan import ArtisanListResponse, ServiceResponse  # noqa: E402
+from app.core.listing import artisan_filters, list_artisans  # noqa: E402
+from app.core.search import ranked_matches, reset_fallback_index, tokenize, warm_search_index  # noqa: E402
+
+CITIES = ["Casablanca", "Rabat", "Fès", "Marrakech", "Tanger", "Agadir"]
+CATEGORIES = ["plumbing", "electrical", "carpentry", "painting", "hvac", "cleaning"]
+
+SCENARIOS = {
+    "default": {},
+    "category": {"category": "plumbing"},
+    "city+category": {"city": "Rabat", "category": "electrical"},
+    "search": {"search": "ahmed"},
+}
+
+
+def seed(conn, size: int):
+    """Synchronous seeding, run through AsyncConnection.run_sync."""
+    rng = random.Random(42)
+    Base.metadata.create_all(conn)
+    names = {i: f"{rng.choice(['Ahmed', 'Youssef', 'Fatima', 'Khadija'])} {i}" for i in range(1, size + 1)}
+    conn.execute(insert(User), [
+        {
+            "id": i,
+            "email": f"artisan{i}@example.ma",
+            "hashed_password": "x",
+            "full_name": names[i],
+            "role": UserRole.ARTISAN,
+        }
+        for i in range(1, size + 1)
+    ])
+    conn.execute(insert(Artisan), [
+        {
+            "id": i,
+            "user_id": i,
+            "bio": "Artisan qualifié",
+            "city": rng.choice(CITIES),
+            "rating": round(rng.uniform(0, 5), 1),
+            "total_reviews": rng.randint(0, 200),
+            "is_available": rng.random() < 0.8,
+        }
+        for i in range(1, size + 1)
+    ])
+    services = {i: rng.sample(CATEGORIES, 3) for i in range(1, size + 1)}
+    conn.execute(insert(ArtisanService), [
+        {"artisan_id": i, "category": category, "name": f"Service {category}"}
+        for i in range(1, size + 1)
+        for category in services[i]
+    ])
+    conn.execute(insert(ArtisanSearchDocument), [
+        {
+            "artisan_id": i,
+            "name_text": " ".join(tokenize(names[i])),
+            "services_text": " ".join(f"service {category}" for category in services[i]),
+            "bio_text": " ".join(tokenize("Artisan qualifié")),
+        }
+        for i in range(1, size + 1)
+    ])
+
+
+async def legacy_listing(db: AsyncSession, **params):
+    return await db.run_sync(_legacy_listing, **params)
+
+
+def _legacy_listing(db: Session, city=None, category=None, search=None, skip=0, limit=20):
+    """The pre-rewrite query, kept here as the baseline."""
+    query = db.query(Artisan).options(joinedload(Artisan.user), joinedload(Artisan.services))
+    if city:
+        query = query.filter(Artisan.city.ilike(f"%{city}%"))
+    if category:
+        query = query.join(ArtisanService).filter(ArtisanService.category == category)
+    if search:
+        query = query.join(User).filter(
+            (User.full_name.ilike(f"%{search}%")) | (Artisan.bio.ilike(f"%{search}%"))
+        )
+    artisans = query.order_by(Artisan.rating.desc()).offset(skip).limit(limit).all()
+    return [
+        ArtisanListResponse(
+            id=a.id, user_id=a.user_id, full_name=a.user.full_name, avatar=a.user.avatar,
+            bio=a.bio, city=a.city, rating=a.rating, total_reviews=a.total_reviews,
+            is_available=a.is_available, is_verified=a.is_verified,
+            services=[ServiceResponse.model_validate(s) for s in a.services],
+        )
+        for a in artisans
+    ]
+
+
+async def engine_listing(db: AsyncSession, skip=0, limit=20, search=None, **filters):
+    clauses = artisan_filters(**filters)
+    if search:
+        ranking = await ranked_matches(db, search, clauses, limit=limit, skip=skip)
+        return (await list_artisans(db, [], None, limit, skip, ranking))[0] if ranking is not None else []
+    return (await list_artisans(db, clauses, None, limit, skip))[0]
+
+
+class StatementRecorder:
+    """Records executed statements so their result sizes can be replayed."""
+
+    def __init__(self, engine, path: str):
+        self.engine = engine.sync_engine
+        self.path = path
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+    def transferred(self):
+        """(rows, values) returned by the recorded SELECT statements."""
+        rows = values = 0
+        raw = sqlite3.connect(self.path)
+        try:
+            for statement, parameters in self.statements:
+                if statement.lstrip().upper().startswith("SELECT"):
+                    fetched = raw.execute(statement, parameters).fetchall()
+                    rows += len(fetched)
+                    values += sum(len(row) for row in fetched)
+        finally:
+            raw.close()
+        return rows, values
+
+    def stop(self):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+
+async def measure(engine, path, fn, params, repeat: int):
+    recorder = StatementRecorder(engine, path)
+    async with AsyncSession(engine) as db:
+        results = await fn(db, **params)
+    recorder.stop()
+    rows, values = recorder.transferred()
+
+    timings = []
+    for _ in range(repeat):
+        async with AsyncSession(engine) as db:
+            start = time.perf_counter()
+            await fn(db, **params)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "artisans": len(results),
+        "statements": len(recorder.statements),
+        "rows": rows,
+        "values": values,
+        "median_ms": round(statistics.median(timings), 2),
+    }
+
+
+async def run(sizes, repeat: int):
+    report = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f"{tmp}/bench.db"
+            engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+            async with engine.begin() as conn:
+                await conn.run_sync(seed, size)
+            reset_fallback_index()
+            async with AsyncSession(engine) as db:
+                # Loaded once at start-up by the app, not per search
+                await warm_search_index(db)
+            scenarios = dict(SCENARIOS)
+            scenarios["deep page"] = {"skip": size // 2}
+            for name, params in scenarios.items():
+                report.append({
+                    "size": size,
+                    "scenario": name,
+                    "legacy": await measure(engine, path, legacy_listing, params, repeat),
+                    "engine": await measure(engine, path, engine_listing, params, repeat),
+                })
+            await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.sizes, args.repeat))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    header = f"{'size':>7}  {'scenario':<14}"
+    for impl in ("legacy", "engine"):
+        header += f" {impl + ' n':>9} {'rows':>6} {'values':>7} {'ms':>8}"
+    print(header)
+    for entry in report:
+        line = f"{entry['size']:>7}  {entry['scenario']:<14}"
+        for impl in ("legacy", "engine"):
+            result = entry[impl]
+            line += f" {result['artisans']:>9} {result['rows']:>6} {result['values']:>7} {result['median_ms']:>8}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
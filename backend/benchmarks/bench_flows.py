@@ -0,0 +1,333 @@
+"""Marketplace flow benchmark: throughput and latency of the main user flows.
+
+Seeds synthetic data (benchmarks.seed), then runs each flow with concurrent
+clients for a fixed time and reports, per flow, iterations per second and
+latency percentiles (one iteration = every request of the flow):
+
+    search     listing search by text, city and category
+    profile    artisan page: profile, review statistics, first reviews
+    booking    create, accept, start and complete a booking
+    review     review a completed booking
+    login      password login (bcrypt)
+
+    python -m benchmarks.bench_flows --artisans 2000 --duration 20 --output run.json
+    python -m benchmarks.bench_flows --compare baseline.json
+
+Runs in-process against a throwaway SQLite database by default. With
+--database-url the target must be migrated and is seeded unless --no-seed;
+add --base-url to drive a running server that uses that database (and the
+same SECRET_KEY). The report is JSON; --compare prints the change against a
+previous report and exits with status 1 when a flow's p95 regressed by more
+than --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+SEARCH_TERMS = ["plomberie", "peinture", "electrique", "menage", "climatiseur", "serrure", "ahmed", "alaoui"]
+
+
+def percentile(values, q):
+    return round(statistics.quantiles(values, n=100, method="inclusive")[q - 1], 2) if len(values) > 1 else None
+
+
+class Context:
+    """Ids and tokens the flows draw from, loaded from the seeded database."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.artisan_ids = []
+        self.cities = []
+        self.categories = []
+        self.customers = []  # (user id, email)
+        self.available = []  # (artisan id, artisan user id) of available artisans
+        self.reviewable = []  # (booking id, customer id) of completed, unreviewed bookings
+        self.booked = 0
+
+    async def load(self):
+        from sqlalchemy import select
+        from app.database import SessionLocal
+        from app.models import Artisan, ArtisanService, Booking, Review, User
+        from app.models.booking import BookingStatus
+        from app.models.user import UserRole
+
+        async with SessionLocal() as db:
+            self.artisan_ids = (await db.scalars(select(Artisan.id))).all()
+            self.cities = (await db.scalars(select(Artisan.city).distinct())).all()
+            self.categories = (await db.scalars(select(ArtisanService.category).distinct())).all()
+            self.customers = (await db.execute(
+                select(User.id, User.email).where(User.role == UserRole.CUSTOMER).limit(1000)
+            )).all()
+            self.available = (await db.execute(
+                select(Artisan.id, Artisan.user_id).where(Artisan.is_available.is_(True))
+            )).all()
+            self.reviewable = (await db.execute(
+                select(Booking.id, Booking.customer_id)
+                .outerjoin(Review, Review.booking_id == Booking.id)
+                .where(Booking.status == BookingStatus.COMPLETED, Review.id.is_(None))
+            )).all()
+        self.rng.shuffle(self.reviewable)
+
+    def headers(self, user_id: int) -> dict:
+        from app.core.tokens import create_access_token
+        return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+    def next_slot(self):
+        """A free slot far past the seeded bookings: (artisan, artisan user, start)."""
+        artisan_id, artisan_user_id = self.available[self.booked % len(self.available)]
+        turn = self.booked // len(self.available)
+        self.booked += 1
+        day = datetime.utcnow().date() + timedelta(days=60 + turn // 10)
+        while day.weekday() == 6:
+            day += timedelta(days=1)
+        return artisan_id, artisan_user_id, datetime.combine(day, datetime.min.time()), f"{8 + turn % 10:02d}:00"
+
+
+class FlowError(Exception):
+    pass
+
+
+def _check(response, expected=200):
+    if response.status_code != expected:
+        raise FlowError(f"{response.request.method} {response.request.url.path}: {response.status_code}")
+    return response
+
+
+async def flow_search(client, ctx: Context):
+    # Equal parts free text, free text in a city, and category in a city
+    kind = ctx.rng.randrange(3)
+    params = {"city": ctx.rng.choice(ctx.cities)} if kind else {}
+    if kind < 2:
+        params["search"] = ctx.rng.choice(SEARCH_TERMS)
+    else:
+        params["category"] = ctx.rng.choice(ctx.categories)
+    _check(await client.get("/api/artisans/", params=params))
+
+
+async def flow_profile(client, ctx: Context):
+    artisan_id = ctx.rng.choice(ctx.artisan_ids)
+    _check(await client.get(f"/api/artisans/{artisan_id}"))
+    _check(await client.get(f"/api/reviews/stats/{artisan_id}"))
+    _check(await client.get(f"/api/reviews/artisan/{artisan_id}", params={"limit": 10}))
+
+
+async def flow_booking(client, ctx: Context):
+    artisan_id, artisan_user_id, scheduled_date, scheduled_time = ctx.next_slot()
+    customer_id, _ = ctx.rng.choice(ctx.customers)
+    artisan = ctx.headers(artisan_user_id)
+    booking = _check(await client.post("/api/bookings/", headers=ctx.headers(customer_id), json={
+        "artisan_id": artisan_id,
+        "service_category": ctx.rng.choice(ctx.categories),
+        "service_description": "Benchmark booking",
+        "scheduled_date": scheduled_date.isoformat(),
+        "scheduled_time": scheduled_time,
+        "estimated_duration": 60,
+        "address": "1 Rue Ibn Sina",
+        "city": "Casablanca",
+        "estimated_price": 300,
+    })).json()
+    _check(await client.post(f"/api/bookings/{booking['id']}/accept", headers=artisan))
+    _check(await client.put(f"/api/bookings/{booking['id']}", headers=artisan, json={"status": "in_progress"}))
+    _check(await client.post(f"/api/bookings/{booking['id']}/complete", headers=artisan,
+                             params={"final_price": 320}))
+
+
+async def flow_review(client, ctx: Context):
+    if not ctx.reviewable:
+        raise FlowError("no completed bookings left to review")
+    booking_id, customer_id = ctx.reviewable.pop()
+    _check(await client.post("/api/reviews/", headers=ctx.headers(customer_id), json={
+        "booking_id": booking_id,
+        "rating": ctx.rng.choice((3, 4, 5, 5)),
+        "quality_rating": 5,
+        "comment": "Benchmark review",
+    }))
+
+
+async def flow_login(client, ctx: Context):
+    from benchmarks.seed import SEED_PASSWORD
+    _, email = ctx.rng.choice(ctx.customers)
+    _check(await client.post("/api/auth/login", json={"email": email, "password": SEED_PASSWORD}))
+
+
+FLOWS = {
+    "search": flow_search,
+    "profile": flow_profile,
+    "booking": flow_booking,
+    "review": flow_review,
+    "login": flow_login,
+}
+
+
+async def run_flow(client, ctx: Context, name: str, concurrency: int, duration: float) -> dict:
+    flow = FLOWS[name]
+    latencies, errors = [], {}
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                await flow(client, ctx)
+            except FlowError as exc:
+                errors[str(exc)] = errors.get(str(exc), 0) + 1
+                if not ctx.reviewable and name == "review":
+                    return
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "flow": name,
+        "concurrency": concurrency,
+        "iterations": len(latencies),
+        "errors": sum(errors.values()),
+        "error_kinds": errors,
+        "throughput_per_s": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 2) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 2) if latencies else None,
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    import httpx
+    from app.config import settings
+    from app.database import Base, engine
+    from benchmarks.seed import seed
+
+    if not args.database_url:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    seeded = None
+    if not args.no_seed:
+        seeded = await seed(args.artisans, args.customers or 5 * args.artisans, random_seed=args.seed)
+
+    ctx = Context(random.Random(args.seed))
+    await ctx.load()
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+
+    results = []
+    async with client:
+        for name in args.flows:
+            # One untimed pass so lazy caches and pools do not count against the first flow
+            await run_flow(client, ctx, name, 1, min(1.0, args.duration))
+            results.append(await run_flow(client, ctx, name, args.concurrency, args.duration))
+
+    if not args.base_url:
+        from app.core.passwords import shutdown_hash_pool
+        shutdown_hash_pool()
+    await engine.dispose()
+    return {
+        "meta": {
+            "started_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "commit": _git_commit(),
+            "database": engine.dialect.name,
+            "target": args.base_url or "in-process",
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "bcrypt_rounds": settings.BCRYPT_ROUNDS,
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "seeded_rows": seeded,
+        },
+        "flows": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> bool:
+    """Print the change per flow; False when a p95 regressed beyond `tolerance`."""
+    previous = {flow["flow"]: flow for flow in baseline["flows"]}
+    ok = True
+    print(f"{'flow':<9} {'it/s':>9} {'Δ':>7} {'p95 ms':>9} {'Δ':>7}")
+    for flow in report["flows"]:
+        old = previous.get(flow["flow"])
+        if old is None:
+            continue
+
+        def change(new, before):
+            return (new - before) / before if new is not None and before else 0.0
+
+        throughput = change(flow["throughput_per_s"], old["throughput_per_s"])
+        p95 = change(flow["latency_ms"]["p95"], old["latency_ms"]["p95"])
+        regressed = p95 > tolerance
+        ok = ok and not regressed
+        print(f"{flow['flow']:<9} {flow['throughput_per_s']:>9} {throughput:>+7.0%} "
+              f"{flow['latency_ms']['p95']!s:>9} {p95:>+7.0%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--flows", nargs="+", choices=list(FLOWS), default=list(FLOWS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per flow")
+    parser.add_argument("--artisans", type=int, default=1000, help="seeding scale")
+    parser.add_argument("--customers", type=int, help="default: 5 per artisan")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="migrated database to seed and read (default: throwaway SQLite)")
+    parser.add_argument("--no-seed", action="store_true", help="use the data already in --database-url")
+    parser.add_argument("--base-url", help="drive a running server instead of the app in-process")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="previous report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95 increase, as a fraction")
+    args = parser.parse_args()
+    if args.base_url and not args.database_url:
+        parser.error("--base-url needs --database-url, the server's database")
+    if args.no_seed and not args.database_url:
+        parser.error("--no-seed needs --database-url")
+
+    # Settings are read at import: point the app at the database before importing it
+    workdir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{workdir.name}/bench.db"
+    os.environ.setdefault("UPLOAD_DIR", f"{workdir.name}/uploads")
+    os.environ.setdefault("SERVER_TIMING_ENABLED", "false")
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    elif not args.compare:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if not compare(report, baseline, args.tolerance):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
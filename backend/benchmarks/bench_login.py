@@ -0,0 +1,159 @@
+"""Login throughput benchmark: where bcrypt runs.
+
+Drives POST /api/auth/login in-process with concurrent clients while a probe
+polls a cheap endpoint, and reports logins per second and the probe's
+latency (what every other endpoint feels during a login burst) for:
+
+    inline      bcrypt called on the event loop
+    threadpool  bcrypt in the shared anyio threadpool (the previous code)
+    process     bcrypt in the dedicated hashing pool (app.core.passwords)
+
+    python -m benchmarks.bench_login --concurrency 8 32 --duration 10
+
+Uses a throwaway SQLite database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/bench.db"
+os.environ.setdefault("UPLOAD_DIR", f"{_tmp.name}/uploads")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from fastapi import Request  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from app.database import Base, engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import User  # noqa: E402
+from app.core import passwords  # noqa: E402
+
+USERS = 50
+PASSWORD = "correct horse battery staple"
+PROBE_PATH = "/_bench/probe"
+
+
+@app.get(PROBE_PATH, include_in_schema=False)
+def probe(request: Request):
+    # A sync endpoint: it needs a threadpool worker, like many dependencies do
+    return {"ok": True}
+
+
+async def _inline(fn, *args):
+    return fn(*args)
+
+
+_pool_run = passwords._run
+
+# mode -> (how hashing calls run, hashing processes)
+MODES = {
+    "inline": (_inline, 0),
+    "threadpool": (_pool_run, 0),
+    "process": (_pool_run, settings.PASSWORD_HASH_WORKERS),
+}
+
+
+async def seed():
+    hashed = passwords.get_password_hash(PASSWORD)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"email": f"user{i}@example.ma", "hashed_password": hashed, "full_name": f"User {i}"}
+            for i in range(USERS)
+        ])
+
+
+async def run_mode(client: httpx.AsyncClient, mode: str, concurrency: int, duration: float) -> dict:
+    passwords._run, settings.PASSWORD_HASH_WORKERS = MODES[mode]
+    if settings.PASSWORD_HASH_WORKERS:
+        # Start the workers outside the measured window
+        await asyncio.gather(*(passwords.verify_password_async("x", passwords.get_password_hash("x"))
+                               for _ in range(settings.PASSWORD_HASH_WORKERS)))
+    deadline = time.perf_counter() + duration
+    logins, rejected, login_latencies, probe_latencies = 0, 0, [], []
+
+    async def login_client(n: int):
+        nonlocal logins, rejected
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.post("/api/auth/login", json={
+                "email": f"user{n % USERS}@example.ma", "password": PASSWORD
+            })
+            if response.status_code == 200:
+                logins += 1
+                login_latencies.append((time.perf_counter() - start) * 1000)
+            else:
+                rejected += 1
+
+    async def probe_client():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await client.get(PROBE_PATH)
+            probe_latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    await asyncio.gather(probe_client(), *(login_client(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    passwords._run = _pool_run
+
+    def percentile(values, q):
+        return round(statistics.quantiles(values, n=100)[q - 1], 1) if len(values) > 1 else None
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "logins_per_s": round(logins / elapsed, 1),
+        "rejected": rejected,
+        "login_p50_ms": percentile(login_latencies, 50),
+        "probe_p50_ms": percentile(probe_latencies, 50),
+        "probe_p99_ms": percentile(probe_latencies, 99),
+        "probes": len(probe_latencies),
+    }
+
+
+async def run(modes, concurrencies, duration: float):
+    await seed()
+    report = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for concurrency in concurrencies:
+            for mode in modes:
+                report.append(await run_mode(client, mode, concurrency, duration))
+    passwords.shutdown_hash_pool()
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--json", action="store_true", help="print the raw report as JSON")
+    args = parser.parse_args()
+
+    print(f"bcrypt cost {settings.BCRYPT_ROUNDS}, {settings.PASSWORD_HASH_WORKERS} hashing processes, "
+          f"{os.cpu_count()} CPUs", file=sys.stderr)
+    report = asyncio.run(run(args.modes, args.concurrency, args.duration))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'mode':<11} {'clients':>7} {'logins/s':>9} {'503':>5} {'login p50':>10} "
+          f"{'probe p50':>10} {'probe p99':>10}")
+    for entry in report:
+        print(f"{entry['mode']:<11} {entry['concurrency']:>7} {entry['logins_per_s']:>9} {entry['rejected']:>5} "
+              f"{entry['login_p50_ms']!s:>10} {entry['probe_p50_ms']!s:>10} {entry['probe_p99_ms']!s:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+"""Synthetic marketplace data for benchmarks and local development.
+
+Fills users, artisans, artisan_services, bookings, reviews, conversations
+and messages at a configurable scale, then rebuilds the derived tables
+(search documents, review statistics, facet counts). Artisans and
+customers are spread over the 20 cities of /api/cities by population, with
+coordinates around each city centre; services follow a demand-weighted mix of the 12
+categories with Moroccan prices in MAD; bookings are long-tailed (a few
+popular artisans get most of them), past ones mostly completed and often
+reviewed, future ones pending or accepted on non-overlapping slots.
+
+    python -m benchmarks.seed --artisans 2000 --customers 10000
+
+Writes to DATABASE_URL, which must be migrated (`alembic upgrade head`);
+ids continue after the existing rows, so running it twice adds a second
+batch. Every seeded user's password is SEED_PASSWORD.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncConnection  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.main import CITIES  # noqa: E402
+from app.models import (  # noqa: E402
+    Artisan, ArtisanService, Booking, Conversation, Message, Review, User
+)
+from app.models.booking import BookingStatus, PaymentStatus  # noqa: E402
+from app.models.user import UserRole  # noqa: E402
+from app.routers.artisans import SERVICE_CATEGORIES  # noqa: E402
+from app.core.chat import PREVIEW_LENGTH  # noqa: E402
+from app.core.facets import rebuild_facet_counts  # noqa: E402
+from app.core.geo import encode_geohash  # noqa: E402
+from app.core.passwords import get_password_hash  # noqa: E402
+from app.core.schedule import booking_interval  # noqa: E402
+from app.core.search import rebuild_search_documents  # noqa: E402
+from app.core.stats import average_rating, rebuild_review_stats  # noqa: E402
+
+SEED_PASSWORD = "seed-password"
+EMAIL_DOMAIN = "seed.fikhidmatik.ma"
+BATCH_SIZE = 2000
+
+# City -> (population in thousands, latitude, longitude of the centre)
+CITY_PROFILES = {
+    "Casablanca": (3360, 33.5731, -7.5898),
+    "Rabat": (580, 34.0209, -6.8416),
+    "Fès": (1110, 34.0181, -5.0078),
+    "Marrakech": (930, 31.6295, -7.9811),
+    "Tanger": (950, 35.7595, -5.8340),
+    "Meknès": (630, 33.8935, -5.5473),
+    "Agadir": (420, 30.4278, -9.5981),
+    "Oujda": (490, 34.6814, -1.9086),
+    "Kénitra": (430, 34.2610, -6.5802),
+    "Tétouan": (380, 35.5889, -5.3626),
+    "Salé": (980, 34.0531, -6.7985),
+    "Temara": (310, 33.9287, -6.9063),
+    "Safi": (310, 32.2994, -9.2372),
+    "El Jadida": (190, 33.2316, -8.5007),
+    "Mohammedia": (210, 33.6861, -7.3829),
+    "Béni Mellal": (190, 32.3373, -6.3498),
+    "Nador": (160, 35.1681, -2.9335),
+    "Taza": (140, 34.2100, -4.0100),
+    "Settat": (140, 33.0010, -7.6166),
+    "Khouribga": (200, 32.8811, -6.9063),
+}
+assert set(CITY_PROFILES) == set(CITIES), "CITY_PROFILES must cover /api/cities"
+
+# Category -> (share of artisans offering it, price range in MAD, service names)
+CATEGORY_PROFILES = {
+    "plumbing": (16, (150, 600), ["Réparation de fuite", "Installation sanitaire", "Débouchage canalisation"]),
+    "electrical": (15, (150, 700), ["Dépannage électrique", "Installation tableau", "Pose de luminaires"]),
+    "carpentry": (8, (300, 2000), ["Pose de portes", "Meubles sur mesure", "Réparation menuiserie"]),
+    "painting": (10, (500, 4000), ["Peinture intérieure", "Peinture façade", "Enduit et finitions"]),
+    "hvac": (7, (300, 1500), ["Installation climatiseur", "Entretien climatisation", "Recharge gaz"]),
+    "cleaning": (14, (100, 400), ["Ménage complet", "Nettoyage après travaux", "Nettoyage de tapis"]),
+    "gardening": (5, (150, 600), ["Entretien jardin", "Taille de haies", "Arrosage automatique"]),
+    "masonry": (6, (500, 5000), ["Travaux de maçonnerie", "Carrelage", "Zellige traditionnel"]),
+    "locksmith": (4, (100, 400), ["Ouverture de porte", "Changement de serrure", "Blindage de porte"]),
+    "appliance": (7, (150, 800), ["Réparation machine à laver", "Réparation réfrigérateur", "Réparation four"]),
+    "moving": (5, (400, 3000), ["Déménagement local", "Transport de meubles", "Montage de meubles"]),
+    "other": (3, (100, 1000), ["Petits travaux", "Bricolage", "Installation parabole"]),
+}
+assert set(CATEGORY_PROFILES) == set(SERVICE_CATEGORIES), "CATEGORY_PROFILES must cover SERVICE_CATEGORIES"
+
+FIRST_NAMES = [
+    "Mohamed", "Ahmed", "Youssef", "Omar", "Hamza", "Karim", "Rachid", "Said", "Hassan", "Mustapha",
+    "Abdellah", "Khalid", "Mehdi", "Yassine", "Anas", "Fatima", "Khadija", "Aicha", "Meryem", "Salma",
+    "Nadia", "Zineb", "Imane", "Hajar", "Samira", "Latifa", "Souad", "Naima", "Ghizlane", "Houda",
+]
+LAST_NAMES = [
+    "Alaoui", "Benali", "El Idrissi", "Bennani", "Tazi", "Chraibi", "Berrada", "El Fassi", "Amrani",
+    "Ouazzani", "Lahlou", "Benjelloun", "Kettani", "Sqalli", "Ziani", "Haddad", "Naciri", "Rami",
+    "Bouzid", "El Amrani", "Belkadi", "Cherkaoui", "Filali", "Hajji", "Mansouri", "Ouali", "Saidi",
+]
+STREETS = [
+    "Rue Ibn Sina", "Avenue Hassan II", "Boulevard Mohammed V", "Rue Al Massira", "Avenue des FAR",
+    "Rue Oued Sebou", "Boulevard Zerktouni", "Rue Allal Ben Abdellah", "Avenue Moulay Youssef",
+    "Derb Sidi Bouloukat", "Rue Annasr", "Quartier Hay Riad", "Lotissement Al Amal",
+]
+BIOS = [
+    "Artisan sérieux et ponctuel, {years} ans d'expérience à {city}.",
+    "Travail soigné, devis gratuit. Intervention rapide sur {city} et environs.",
+    "حرفي محترف بخبرة {years} سنوات في {city}. عمل متقن وأسعار مناسبة.",
+    "Spécialiste depuis {years} ans, matériel professionnel, garantie sur les travaux.",
+]
+COMMENTS = {
+    5: ["Travail impeccable, je recommande vivement.", "Très professionnel et ponctuel.", "خدمة ممتازة، شكرا جزيلا"],
+    4: ["Bon travail, un peu de retard.", "Sérieux et efficace.", "عمل جيد"],
+    3: ["Correct sans plus.", "Travail fait mais finitions moyennes."],
+    2: ["Retard important et travail à reprendre."],
+    1: ["Très déçu, je ne recommande pas."],
+}
+MESSAGES = [
+    "Bonjour, êtes-vous disponible cette semaine ?", "Oui, je peux passer demain matin.",
+    "Quel est le prix approximatif ?", "Ça dépend de l'état, je vous donne un devis sur place.",
+    "D'accord, à demain.", "Je suis en bas de l'immeuble.", "Merci pour votre travail !",
+    "السلام عليكم، واش ممكن تجي اليوم؟", "إن شاء الله غدا الصباح", "شكرا بزاف",
+]
+
+# Past bookings: status shares; future bookings are pending or accepted
+PAST_STATUSES = ((BookingStatus.COMPLETED, 80), (BookingStatus.CANCELLED, 12), (BookingStatus.REJECTED, 8))
+FUTURE_STATUSES = ((BookingStatus.PENDING, 45), (BookingStatus.ACCEPTED, 55))
+STAR_WEIGHTS = ((5, 50), (4, 30), (3, 10), (2, 5), (1, 5))
+REVIEW_SHARE = 0.65  # completed bookings that get a review
+CONVERSATION_SHARE = 0.4  # bookings with a chat conversation
+
+
+def _weighted(rng: random.Random, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _near(rng: random.Random, latitude: float, longitude: float, km: float):
+    # ~111 km per degree; good enough for a few kilometres
+    return (round(latitude + rng.uniform(-km, km) / 111, 6), round(longitude + rng.uniform(-km, km) / 111, 6))
+
+
+class Generator:
+    """Rows for one seeding run; ids start after `first_ids`."""
+
+    def __init__(self, rng: random.Random, first_ids: Dict[str, int], artisans: int, customers: int,
+                 bookings_per_artisan: float, now: datetime):
+        self.rng = rng
+        self.ids = dict(first_ids)
+        self.now = now
+        self.artisan_count = artisans
+        self.customer_count = customers
+        self.bookings_per_artisan = bookings_per_artisan
+        self.cities = list(CITY_PROFILES)
+        self.city_weights = [CITY_PROFILES[city][0] for city in self.cities]
+        self.rows: Dict[str, List[dict]] = {name: [] for name in (
+            "users", "artisans", "artisan_services", "bookings", "reviews", "conversations", "messages"
+        )}
+
+    def _next_id(self, table: str) -> int:
+        self.ids[table] += 1
+        return self.ids[table]
+
+    def _user(self, role: UserRole, hashed_password: str) -> dict:
+        user_id = self._next_id("users")
+        first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+        created_at = self.now - timedelta(days=self.rng.uniform(30, 720))
+        row = {
+            "id": user_id,
+            "email": f"{role.value}{user_id}@{EMAIL_DOMAIN}",
+            "phone": f"+2126{user_id:08d}",
+            "hashed_password": hashed_password,
+            "full_name": f"{first} {last}",
+            "role": role,
+            "is_active": True,
+            "is_verified": self.rng.random() < 0.7,
+            "preferred_language": "ar" if self.rng.random() < 0.3 else "fr",
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        self.rows["users"].append(row)
+        return row
+
+    def generate(self, hashed_password: str):
+        customers = [self._user(UserRole.CUSTOMER, hashed_password) for _ in range(self.customer_count)]
+        categories = list(CATEGORY_PROFILES)
+        category_weights = [CATEGORY_PROFILES[category][0] for category in categories]
+
+        for _ in range(self.artisan_count):
+            user = self._user(UserRole.ARTISAN, hashed_password)
+            artisan_id = self._next_id("artisans")
+            city = self.rng.choices(self.cities, weights=self.city_weights)[0]
+            _, city_latitude, city_longitude = CITY_PROFILES[city]
+            latitude, longitude = _near(self.rng, city_latitude, city_longitude, 8)
+            years = self.rng.randint(1, 30)
+            artisan = {
+                "id": artisan_id,
+                "user_id": user["id"],
+                "bio": self.rng.choice(BIOS).format(years=years, city=city),
+                "experience_years": years,
+                "city": city,
+                "address": f"{self.rng.randint(1, 250)} {self.rng.choice(STREETS)}, {city}",
+                "latitude": latitude,
+                "longitude": longitude,
+                "geohash": encode_geohash(latitude, longitude),
+                "service_radius_km": self.rng.choice((5, 10, 15, 20, 30)),
+                "is_available": self.rng.random() < 0.85,
+                "working_hours": None,  # DEFAULT_WORKING_HOURS: Monday to Saturday, 08:00-18:00
+                "rating": 0.0,
+                "rating_sum": 0.0,
+                "total_reviews": 0,
+                "completed_jobs": 0,
+                "is_verified": self.rng.random() < 0.4,
+                "created_at": user["created_at"],
+                "updated_at": user["created_at"],
+            }
+            self.rows["artisans"].append(artisan)
+
+            offered = set()
+            while len(offered) < self.rng.choice((1, 1, 2, 2, 3)):
+                offered.add(self.rng.choices(categories, weights=category_weights)[0])
+            for category in offered:
+                _, (low, high), names = CATEGORY_PROFILES[category]
+                price_min = round(self.rng.uniform(low, (low + high) / 2), -1)
+                self.rows["artisan_services"].append({
+                    "id": self._next_id("artisan_services"),
+                    "artisan_id": artisan_id,
+                    "category": category,
+                    "name": self.rng.choice(names),
+                    "description": f"{self.rng.choice(names)} à {city}",
+                    "price_min": price_min,
+                    "price_max": round(self.rng.uniform(price_min, high), -1),
+                    "price_type": self.rng.choice(("fixed", "fixed", "hourly", "negotiable")),
+                    "created_at": artisan["created_at"],
+                })
+            self._bookings(artisan, sorted(offered), customers)
+
+    def _bookings(self, artisan: dict, categories: List[str], customers: List[dict]):
+        # Pareto-distributed popularity: most artisans get a few bookings, some get many
+        count = min(int(self.rng.paretovariate(2.0) * self.bookings_per_artisan / 2), 40 * self.bookings_per_artisan)
+        taken = set()
+        for _ in range(int(count)):
+            day = (self.now + timedelta(days=self.rng.randint(-180, 30))).date()
+            if day.weekday() == 6:
+                continue  # no work on Sundays
+            duration = self.rng.choice((60, 60, 90, 120))
+            hour = self.rng.randint(8, 18 - duration // 60 - (1 if duration % 60 else 0))
+            hours = {(day, h) for h in range(hour, hour + (duration + 59) // 60)}
+            if hours & taken:
+                continue  # keep an artisan's bookings from overlapping
+            taken |= hours
+
+            scheduled_date = datetime.combine(day, datetime.min.time())
+            scheduled_time = f"{hour:02d}:00"
+            starts_at, ends_at = booking_interval(scheduled_date, scheduled_time, duration)
+            past = ends_at < self.now
+            status = _weighted(self.rng, PAST_STATUSES if past else FUTURE_STATUSES)
+            created_at = min(starts_at - timedelta(hours=self.rng.uniform(2, 14 * 24)), self.now)
+            category = self.rng.choice(categories)
+            _, (low, high), names = CATEGORY_PROFILES[category]
+            estimated_price = round(self.rng.uniform(low, high), -1)
+            customer = self.rng.choice(customers)
+            latitude, longitude = _near(self.rng, artisan["latitude"], artisan["longitude"],
+                                        artisan["service_radius_km"] / 2)
+            booking = {
+                "id": self._next_id("bookings"),
+                "customer_id": customer["id"],
+                "artisan_id": artisan["id"],
+                "service_category": category,
+                "service_description": self.rng.choice(names),
+                "scheduled_date": scheduled_date,
+                "scheduled_time": scheduled_time,
+                "estimated_duration": duration,
+                "starts_at": starts_at,
+                "ends_at": ends_at,
+                "address": f"{self.rng.randint(1, 250)} {self.rng.choice(STREETS)}, {artisan['city']}",
+                "city": artisan["city"],
+                "latitude": latitude,
+                "longitude": longitude,
+                "estimated_price": estimated_price,
+                "final_price": round(estimated_price * self.rng.uniform(0.8, 1.3), -1)
+                if status == BookingStatus.COMPLETED else None,
+                "status": status,
+                "payment_status": PaymentStatus.PAID if status == BookingStatus.COMPLETED else PaymentStatus.PENDING,
+                "created_at": created_at,
+                "updated_at": min(ends_at, self.now) if past else created_at,
+            }
+            self.rows["bookings"].append(booking)
+
+            if status == BookingStatus.COMPLETED:
+                artisan["completed_jobs"] += 1
+                if self.rng.random() < REVIEW_SHARE:
+                    self._review(artisan, booking)
+            if self.rng.random() < CONVERSATION_SHARE:
+                self._conversation(artisan, booking)
+
+        artisan["rating"] = average_rating(artisan["rating_sum"], artisan["total_reviews"])
+
+    def _review(self, artisan: dict, booking: dict):
+        stars = _weighted(self.rng, STAR_WEIGHTS)
+
+        def sub_rating():
+            if self.rng.random() < 0.3:
+                return None
+            return float(min(5, max(1, stars + self.rng.choice((-1, 0, 0, 0, 1)))))
+
+        created_at = min(booking["ends_at"] + timedelta(hours=self.rng.uniform(1, 72)), self.now)
+        self.rows["reviews"].append({
+            "id": self._next_id("reviews"),
+            "booking_id": booking["id"],
+            "customer_id": booking["customer_id"],
+            "artisan_id": artisan["id"],
+            "rating": float(stars),
+            "quality_rating": sub_rating(),
+            "punctuality_rating": sub_rating(),
+            "communication_rating": sub_rating(),
+            "comment": self.rng.choice(COMMENTS[stars]) if self.rng.random() < 0.8 else None,
+            "artisan_response": "Merci pour votre confiance !" if self.rng.random() < 0.2 else None,
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        artisan["rating_sum"] += stars
+        artisan["total_reviews"] += 1
+
+    def _conversation(self, artisan: dict, booking: dict):
+        conversation_id = self._next_id("conversations")
+        sent_at = booking["created_at"]
+        content = ""
+        for turn in range(self.rng.randint(2, 12)):
+            sent_at = min(sent_at + timedelta(minutes=self.rng.uniform(1, 600)), self.now)
+            content = self.rng.choice(MESSAGES)
+            self.rows["messages"].append({
+                "id": self._next_id("messages"),
+                "conversation_id": conversation_id,
+                "sender_id": booking["customer_id"] if turn % 2 == 0 else artisan["user_id"],
+                "content": content,
+                "is_read": True,
+                "created_at": sent_at,
+            })
+        self.rows["conversations"].append({
+            "id": conversation_id,
+            "customer_id": booking["customer_id"],
+            "artisan_id": artisan["id"],
+            "booking_id": booking["id"],
+            "last_message_at": sent_at,
+            "last_message_preview": content[:PREVIEW_LENGTH],
+            "created_at": booking["created_at"],
+            "customer_unread_count": 0,
+            "artisan_unread_count": 0,
+        })
+
+
+MODELS = {
+    "users": User,
+    "artisans": Artisan,
+    "artisan_services": ArtisanService,
+    "bookings": Booking,
+    "reviews": Review,
+    "conversations": Conversation,
+    "messages": Message,
+}
+
+
+async def _first_ids(conn: AsyncConnection) -> Dict[str, int]:
+    return {
+        table: await conn.scalar(select(func.coalesce(func.max(model.id), 0)))
+        for table, model in MODELS.items()
+    }
+
+
+async def seed(artisans: int, customers: int, bookings_per_artisan: float = 8.0, random_seed: int = 42) -> Dict[str, int]:
+    """Insert one batch of synthetic data; returns the rows written per table."""
+    rng = random.Random(random_seed)
+    hashed_password = get_password_hash(SEED_PASSWORD)
+    async with engine.begin() as conn:
+        generator = Generator(rng, await _first_ids(conn), artisans, customers, bookings_per_artisan, datetime.utcnow())
+        generator.generate(hashed_password)
+        # Dependency order: every row's foreign keys are inserted before it
+        for table, model in MODELS.items():
+            rows = generator.rows[table]
+            for start in range(0, len(rows), BATCH_SIZE):
+                await conn.execute(insert(model), rows[start:start + BATCH_SIZE])
+            if conn.dialect.name == "postgresql":
+                # Rows were inserted with explicit ids: move the sequence past them
+                await conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                ))
+
+    async with SessionLocal() as db:
+        await rebuild_search_documents(db)
+        await rebuild_review_stats(db)
+        await rebuild_facet_counts(db)
+    return {table: len(rows) for table, rows in generator.rows.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--artisans", type=int, default=1000)
+    parser.add_argument("--customers", type=int, help="default: 5 per artisan")
+    parser.add_argument("--bookings-per-artisan", type=float, default=8.0, help="mean of a long-tailed distribution")
+    parser.add_argument("--seed", type=int, default=42, help="random seed; the same seed gives the same data")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = asyncio.run(seed(args.artisans, args.customers or 5 * args.artisans,
+                              args.bookings_per_artisan, args.seed))
+    print(json.dumps({"rows": counts, "seconds": round(time.perf_counter() - started, 1)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Columns and tables added for the performance work
+
+Derived columns (geohash, booking intervals, rating sums) and derived tables
+(search documents, review statistics) are backfilled here.
+
+Revision ID: 0002_performance_schema
+Revises: 0001_baseline
+Create Date: 2026-10-18
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002_performance_schema"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+# Helpers below are frozen copies of app code as of this revision
+# (app.core.geo, app.core.schedule, app.core.search, app.core.stats,
+# app.models.search), so that the migration keeps doing the same thing when
+# the app changes.
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 6
+DEFAULT_DURATION_MINUTES = 60
+_TIME_RE = re.compile(r"^\s*(\d{1,2})\s*[:hH]\s*(\d{2})?\s*$")
+
+STOPWORDS = {
+    # French
+    "a", "au", "aux", "de", "des", "du", "en", "et", "la", "le", "les",
+    "l", "d", "un", "une", "pour", "par", "sur", "avec",
+    # Arabic
+    "في", "من", "على", "الى", "عن", "و",
+}
+_ARABIC_FOLDING = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي",
+    "ة": "ه",
+    "ـ": None,  # tatweel
+})
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+SUB_RATINGS = ("quality", "punctuality", "communication")
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', name_text), 'A')"
+    " || setweight(to_tsvector('simple', services_text), 'B')"
+    " || setweight(to_tsvector('simple', bio_text), 'C')"
+)
+
+
+def _encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def _parse_time(value):
+    match = _TIME_RE.match(value) if value else None
+    if not match:
+        return None
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    if hour > 23 or minute > 59:
+        return None
+    return time(hour, minute)
+
+
+def _booking_interval(scheduled_date, scheduled_time, duration):
+    start = scheduled_date.replace(tzinfo=None)
+    clock = _parse_time(scheduled_time)
+    if clock is not None:
+        start = datetime.combine(start.date(), clock)
+    return start, start + timedelta(minutes=duration or DEFAULT_DURATION_MINUTES)
+
+
+def _tokenize(text):
+    if not text:
+        return []
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    normalized = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).translate(_ARABIC_FOLDING)
+    return [token for token in _TOKEN_RE.findall(normalized) if token not in STOPWORDS]
+
+
+def _document_fields(full_name, bio, services):
+    return {
+        "name_text": " ".join(_tokenize(full_name)),
+        "services_text": " ".join(
+            token for name, description in services
+            for token in _tokenize(name) + _tokenize(description)
+        ),
+        "bio_text": " ".join(_tokenize(bio)),
+    }
+
+
+def _star_bucket(rating):
+    return min(5, max(1, math.floor(rating)))
+
+
+def upgrade():
+    op.create_table('revoked_tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token_id', sa.String(length=32), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token_id')
+    )
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_tokens_expires_at'), ['expires_at'], unique=False)
+
+    op.create_table('refresh_tokens',
+    sa.Column('jti', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('family_id', sa.String(length=32), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('used_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('jti')
+    )
+    with op.batch_alter_table('refresh_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_refresh_tokens_family_id'), ['family_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_refresh_tokens_user_id'), ['user_id'], unique=False)
+
+    op.create_table('artisan_review_stats',
+    sa.Column('artisan_id', sa.Integer(), nullable=False),
+    sa.Column('star_1', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('star_2', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('star_3', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('star_4', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('star_5', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('quality_sum', sa.Float(), server_default='0', nullable=False),
+    sa.Column('quality_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('punctuality_sum', sa.Float(), server_default='0', nullable=False),
+    sa.Column('punctuality_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('communication_sum', sa.Float(), server_default='0', nullable=False),
+    sa.Column('communication_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['artisan_id'], ['artisans.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artisan_id')
+    )
+    op.create_table('artisan_search_documents',
+    sa.Column('artisan_id', sa.Integer(), nullable=False),
+    sa.Column('name_text', sa.Text(), nullable=False),
+    sa.Column('services_text', sa.Text(), nullable=False),
+    sa.Column('bio_text', sa.Text(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['artisan_id'], ['artisans.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('artisan_id')
+    )
+    with op.batch_alter_table('artisan_services', schema=None) as batch_op:
+        batch_op.create_index('ix_artisan_services_artisan_category', ['artisan_id', 'category'], unique=False)
+
+    with op.batch_alter_table('artisans', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        batch_op.add_column(sa.Column('rating_sum', sa.Float(), server_default='0', nullable=False))
+        batch_op.create_index(batch_op.f('ix_artisans_geohash'), ['geohash'], unique=False)
+        batch_op.create_index('ix_artisans_rating_id', ['rating', 'id'], unique=False)
+
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('starts_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('ends_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_bookings_artisan_created_id', ['artisan_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_bookings_artisan_starts_at', ['artisan_id', 'starts_at'], unique=False)
+        batch_op.create_index('ix_bookings_customer_created_id', ['customer_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_message_preview', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('customer_unread_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('artisan_unread_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.create_index('ix_messages_conversation_created_id', ['conversation_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix_reviews_artisan_created_id', ['artisan_id', 'created_at', 'id'], unique=False)
+
+    if op.get_bind().dialect.name == "postgresql":
+        op.create_index(
+            "ix_artisan_search_documents_vector", "artisan_search_documents",
+            [sa.text(f"({SEARCH_VECTOR})")],
+            postgresql_using="gin"
+        )
+
+    _backfill()
+
+
+def _backfill():
+    bind = op.get_bind()
+    artisans = sa.table(
+        "artisans", sa.column("id", sa.Integer), sa.column("latitude", sa.Float), sa.column("longitude", sa.Float),
+        sa.column("geohash", sa.String), sa.column("rating", sa.Float), sa.column("rating_sum", sa.Float),
+        sa.column("total_reviews", sa.Integer)
+    )
+    bookings = sa.table(
+        "bookings", sa.column("id", sa.Integer), sa.column("scheduled_date", sa.DateTime),
+        sa.column("scheduled_time", sa.String), sa.column("estimated_duration", sa.Integer),
+        sa.column("starts_at", sa.DateTime), sa.column("ends_at", sa.DateTime)
+    )
+
+    bind.execute(artisans.update().values(
+        rating_sum=sa.func.coalesce(artisans.c.rating, 0) * sa.func.coalesce(artisans.c.total_reviews, 0)
+    ))
+
+    located = bind.execute(
+        sa.select(artisans.c.id, artisans.c.latitude, artisans.c.longitude)
+        .where(artisans.c.latitude.is_not(None), artisans.c.longitude.is_not(None))
+    ).all()
+    if located:
+        bind.execute(
+            artisans.update().where(artisans.c.id == sa.bindparam("b_id")).values(geohash=sa.bindparam("b_geohash")),
+            [{"b_id": row.id, "b_geohash": _encode_geohash(row.latitude, row.longitude)} for row in located]
+        )
+
+    scheduled = bind.execute(
+        sa.select(bookings.c.id, bookings.c.scheduled_date, bookings.c.scheduled_time, bookings.c.estimated_duration)
+    ).all()
+    intervals = []
+    for row in scheduled:
+        starts_at, ends_at = _booking_interval(row.scheduled_date, row.scheduled_time, row.estimated_duration)
+        intervals.append({"b_id": row.id, "b_starts_at": starts_at, "b_ends_at": ends_at})
+    if intervals:
+        bind.execute(
+            bookings.update().where(bookings.c.id == sa.bindparam("b_id"))
+            .values(starts_at=sa.bindparam("b_starts_at"), ends_at=sa.bindparam("b_ends_at")),
+            intervals
+        )
+
+    now = datetime.utcnow()
+    _backfill_search_documents(bind, now)
+    _backfill_review_stats(bind, now)
+
+
+def _backfill_search_documents(bind, now):
+    users = sa.table("users", sa.column("id", sa.Integer), sa.column("full_name", sa.String))
+    artisans = sa.table("artisans", sa.column("id", sa.Integer), sa.column("user_id", sa.Integer),
+                        sa.column("bio", sa.Text))
+    services = sa.table("artisan_services", sa.column("artisan_id", sa.Integer), sa.column("name", sa.String),
+                        sa.column("description", sa.Text))
+    documents = sa.table(
+        "artisan_search_documents", sa.column("artisan_id", sa.Integer), sa.column("name_text", sa.Text),
+        sa.column("services_text", sa.Text), sa.column("bio_text", sa.Text), sa.column("updated_at", sa.DateTime)
+    )
+
+    artisan_services = defaultdict(list)
+    for row in bind.execute(sa.select(services.c.artisan_id, services.c.name, services.c.description)).all():
+        artisan_services[row.artisan_id].append((row.name, row.description))
+
+    rows = [
+        {"artisan_id": row.id, "updated_at": now,
+         **_document_fields(row.full_name, row.bio, artisan_services.get(row.id, ()))}
+        for row in bind.execute(
+            sa.select(artisans.c.id, artisans.c.bio, users.c.full_name)
+            .select_from(artisans.join(users, users.c.id == artisans.c.user_id))
+        ).all()
+    ]
+    if rows:
+        bind.execute(documents.insert(), rows)
+
+
+def _backfill_review_stats(bind, now):
+    reviews = sa.table(
+        "reviews", sa.column("artisan_id", sa.Integer), sa.column("rating", sa.Float),
+        *(sa.column(f"{name}_rating", sa.Float) for name in SUB_RATINGS)
+    )
+    columns = [f"star_{star}" for star in range(1, 6)] + [
+        f"{name}_{part}" for name in SUB_RATINGS for part in ("sum", "count")
+    ]
+    review_stats = sa.table(
+        "artisan_review_stats", sa.column("artisan_id", sa.Integer), sa.column("updated_at", sa.DateTime),
+        *(sa.column(column) for column in columns)
+    )
+
+    stats = defaultdict(lambda: dict.fromkeys(columns, 0))
+    for row in bind.execute(sa.select(reviews).where(reviews.c.artisan_id.is_not(None))).all():
+        artisan_stats = stats[row.artisan_id]
+        artisan_stats[f"star_{_star_bucket(row.rating)}"] += 1
+        for name in SUB_RATINGS:
+            value = getattr(row, f"{name}_rating")
+            if value is not None:
+                artisan_stats[f"{name}_sum"] += value
+                artisan_stats[f"{name}_count"] += 1
+    if stats:
+        bind.execute(review_stats.insert(), [
+            {"artisan_id": artisan_id, "updated_at": now, **values} for artisan_id, values in stats.items()
+        ])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_artisan_search_documents_vector", table_name="artisan_search_documents")
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_artisan_created_id')
+
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_messages_conversation_created_id')
+
+    with op.batch_alter_table('conversations', schema=None) as batch_op:
+        batch_op.drop_column('artisan_unread_count')
+        batch_op.drop_column('customer_unread_count')
+        batch_op.drop_column('last_message_preview')
+
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_index('ix_bookings_customer_created_id')
+        batch_op.drop_index('ix_bookings_artisan_starts_at')
+        batch_op.drop_index('ix_bookings_artisan_created_id')
+        batch_op.drop_column('ends_at')
+        batch_op.drop_column('starts_at')
+
+    with op.batch_alter_table('artisans', schema=None) as batch_op:
+        batch_op.drop_index('ix_artisans_rating_id')
+        batch_op.drop_index(batch_op.f('ix_artisans_geohash'))
+        batch_op.drop_column('rating_sum')
+        batch_op.drop_column('geohash')
+
+    with op.batch_alter_table('artisan_services', schema=None) as batch_op:
+        batch_op.drop_index('ix_artisan_services_artisan_category')
+
+    op.drop_table('artisan_search_documents')
+    op.drop_table('artisan_review_stats')
+    with op.batch_alter_table('refresh_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_refresh_tokens_user_id'))
+        batch_op.drop_index(batch_op.f('ix_refresh_tokens_family_id'))
+
+    op.drop_table('refresh_tokens')
+    with op.batch_alter_table('revoked_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_tokens_expires_at'))
+
+    op.drop_table('revoked_tokens')
@@ -0,0 +1,37 @@
+"""Indexes for the city and category filters and the inbox
+
+Revision ID: 0003_hot_path_indexes
+Revises: 0002_performance_schema
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0003_hot_path_indexes"
+down_revision = "0002_performance_schema"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_artisan_services_category_artisan", "artisan_services", ["category", "artisan_id"])
+    op.create_index(
+        "ix_conversations_customer_activity", "conversations", ["customer_id", "last_message_at", "id"]
+    )
+    op.create_index(
+        "ix_conversations_artisan_activity", "conversations", ["artisan_id", "last_message_at", "id"]
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            "ix_artisans_city_trgm", "artisans", ["city"],
+            postgresql_using="gin", postgresql_ops={"city": "gin_trgm_ops"}
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index("ix_artisans_city_trgm", table_name="artisans")
+    op.drop_index("ix_conversations_artisan_activity", table_name="conversations")
+    op.drop_index("ix_conversations_customer_activity", table_name="conversations")
+    op.drop_index("ix_artisan_services_category_artisan", table_name="artisan_services")
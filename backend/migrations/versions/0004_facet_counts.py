@@ -0,0 +1,68 @@
+"""Artisan counts by category, city, availability and rating for listing facets
+
+Revision ID: 0004_facet_counts
+Revises: 0003_hot_path_indexes
+Create Date: 2026-10-18
+"""
+from collections import Counter, defaultdict
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_facet_counts"
+down_revision = "0003_hot_path_indexes"
+branch_labels = None
+depends_on = None
+
+# Frozen copies of app.core.facets as of this revision, so that the backfill
+# does not change when the app does
+
+ALL_CATEGORIES = ""
+
+KEY_COLUMNS = ("category", "city", "is_available", "rating_bucket")
+
+
+def _facet_keys(city, is_available, rating, categories):
+    bucket = min(10, max(0, int((rating or 0.0) * 2)))
+    return {(category, city, bool(is_available), bucket) for category in {ALL_CATEGORIES, *categories}}
+
+
+def upgrade():
+    op.create_table(
+        "artisan_facet_counts",
+        sa.Column("category", sa.String(), nullable=False),
+        sa.Column("city", sa.String(), nullable=False),
+        sa.Column("is_available", sa.Boolean(), nullable=False),
+        sa.Column("rating_bucket", sa.Integer(), nullable=False),
+        sa.Column("artisan_count", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("category", "city", "is_available", "rating_bucket"),
+    )
+    _backfill()
+
+
+def _backfill():
+    bind = op.get_bind()
+    artisans = sa.table(
+        "artisans", sa.column("id", sa.Integer), sa.column("city", sa.String),
+        sa.column("is_available", sa.Boolean), sa.column("rating", sa.Float)
+    )
+    services = sa.table("artisan_services", sa.column("artisan_id", sa.Integer), sa.column("category", sa.String))
+    facet_counts = sa.table(
+        "artisan_facet_counts", *(sa.column(column) for column in KEY_COLUMNS), sa.column("artisan_count")
+    )
+
+    categories = defaultdict(list)
+    for row in bind.execute(sa.select(services.c.artisan_id, services.c.category).distinct()).all():
+        categories[row.artisan_id].append(row.category)
+
+    counts = Counter()
+    for row in bind.execute(sa.select(artisans.c.id, artisans.c.city, artisans.c.is_available, artisans.c.rating)):
+        counts.update(_facet_keys(row.city, row.is_available, row.rating, categories.get(row.id, ())))
+    if counts:
+        bind.execute(facet_counts.insert(), [
+            {**dict(zip(KEY_COLUMNS, key)), "artisan_count": count} for key, count in counts.items()
+        ])
+
+
+def downgrade():
+    op.drop_table("artisan_facet_counts")
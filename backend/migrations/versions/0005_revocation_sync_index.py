@@ -0,0 +1,21 @@
+"""Index revoked_tokens.revoked_at for incremental revocation syncs
+
+Revision ID: 0005_revocation_sync_index
+Revises: 0004_facet_counts
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0005_revocation_sync_index"
+down_revision = "0004_facet_counts"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_revoked_tokens_revoked_at", "revoked_tokens", ["revoked_at"])
+
+
+def downgrade():
+    op.drop_index("ix_revoked_tokens_revoked_at", table_name="revoked_tokens")
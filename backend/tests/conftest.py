@@ -0,0 +1,66 @@
+"""Test session: a throwaway SQLite database migrated with Alembic.
+
+Settings are read when the app is imported, so the environment is set
+before anything from `app` is. Tests that use the `db` or `client`
+fixtures start from empty tables, empty per-process caches and no uploads.
+
+    pip install -r requirements-dev.txt
+    python -m pytest
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp.name}/test.db"
+os.environ["UPLOAD_DIR"] = f"{_tmp.name}/uploads"
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["DATABASE_REPLICA_URLS"] = "[]"
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=BACKEND, check=True, capture_output=True)
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from app.main import app  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.core import http_cache, search, security, slots  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database():
+    yield
+    async with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            await conn.execute(table.delete())
+    await http_cache.get_cache_backend().clear()
+    http_cache._invalidations.clear()
+    search.reset_fallback_index()
+    slots._busy_cache.clear()
+    security._principal_cache.clear()
+    shutil.rmtree(settings.UPLOAD_DIR, ignore_errors=True)
+    # Connections belong to this test's event loop
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db(database):
+    async with SessionLocal() as session:
+        yield session
+
+
+@pytest.fixture
+async def client(database):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as test_client:
+        yield test_client
@@ -0,0 +1,101 @@
+"""Rows for tests, written the way the app writes them."""
+import io
+import itertools
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User, UserRole
+from app.models.artisan import Artisan
+from app.models.booking import Booking, BookingStatus
+from app.schemas.user import UserCreate
+from app.schemas.artisan import ArtisanCreate, ServiceCreate
+from app.core.onboarding import create_artisans
+from app.core.passwords import get_password_hash
+from app.core.tokens import create_access_token
+
+PASSWORD = "test-password"
+
+_sequence = itertools.count(1)
+
+
+@lru_cache()
+def password_hash() -> str:
+    return get_password_hash(PASSWORD)
+
+
+def auth(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token({'sub': user_id})}"}
+
+
+async def create_customer(db: AsyncSession, full_name: str = "Test Customer") -> User:
+    n = next(_sequence)
+    user = User(
+        email=f"customer{n}@tests.fikhidmatik.ma",
+        hashed_password=password_hash(),
+        full_name=full_name,
+        role=UserRole.CUSTOMER,
+    )
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+async def create_artisan(
+    db: AsyncSession,
+    full_name: str = "Test Artisan",
+    city: str = "Casablanca",
+    services: Sequence[Tuple[str, str]] = (("plumbing", "Plomberie"),),
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    working_hours: Optional[dict] = None,
+    bio: Optional[str] = None,
+) -> Tuple[User, int]:
+    """(user, artisan id) of a new artisan, through the registration path."""
+    n = next(_sequence)
+    user, = await create_artisans(db, [(
+        UserCreate(email=f"artisan{n}@tests.fikhidmatik.ma", password=PASSWORD, full_name=full_name),
+        ArtisanCreate(
+            city=city, bio=bio, latitude=latitude, longitude=longitude, working_hours=working_hours,
+            services=[ServiceCreate(category=category, name=name) for category, name in services],
+        ),
+        password_hash(),
+    )])
+    await db.commit()
+    artisan_id = await db.scalar(select(Artisan.id).where(Artisan.user_id == user.id))
+    return user, artisan_id
+
+
+async def create_booking(
+    db: AsyncSession,
+    customer_id: int,
+    artisan_id: int,
+    status: BookingStatus = BookingStatus.COMPLETED,
+    **fields,
+) -> Booking:
+    booking = Booking(**{
+        "customer_id": customer_id,
+        "artisan_id": artisan_id,
+        "service_category": "plumbing",
+        "service_description": "Leaking tap",
+        "scheduled_date": datetime(2026, 1, 5),
+        "scheduled_time": "10:00",
+        "address": "1 Rue Test",
+        "city": "Casablanca",
+        "status": status,
+        **fields,
+    })
+    db.add(booking)
+    await db.commit()
+    await db.refresh(booking)
+    return booking
+
+
+def png(width: int = 64, height: int = 48, color=(200, 30, 30)) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
@@ -0,0 +1,207 @@
+import asyncio
+from datetime import date, datetime, timedelta
+import pytest
+from app.models.booking import Booking, BookingStatus
+from app.core.schedule import IntervalIndex, booking_interval, open_slots, within_working_hours
+from tests.factories import auth, create_artisan, create_customer
+
+WEEKDAY_HOURS = {day: {"start": "09:00", "end": "12:00"} for day in ("monday", "tuesday", "wednesday")}
+
+
+def next_weekday(weekday: int) -> date:
+    """A date with the given weekday (0 is Monday) at least a week ahead."""
+    day = date.today() + timedelta(days=7)
+    return day + timedelta(days=(weekday - day.weekday()) % 7)
+
+
+MONDAY = next_weekday(0)
+SUNDAY = next_weekday(6)
+
+
+def at(day: date, hour: int, minute: int = 0) -> datetime:
+    return datetime(day.year, day.month, day.day, hour, minute)
+
+
+def booking_payload(artisan_id: int, day: date, clock: str, duration: int = 60) -> dict:
+    return {
+        "artisan_id": artisan_id,
+        "service_category": "plumbing",
+        "service_description": "Leaking tap",
+        "scheduled_date": f"{day.isoformat()}T00:00:00",
+        "scheduled_time": clock,
+        "estimated_duration": duration,
+        "address": "1 Rue Test",
+        "city": "Casablanca",
+    }
+
+
+def test_booking_interval_parses_free_form_times():
+    day = datetime(2026, 3, 2, 7, 15)
+    assert booking_interval(day, "14h30", 90) == (datetime(2026, 3, 2, 14, 30), datetime(2026, 3, 2, 16, 0))
+    assert booking_interval(day, "9h", None) == (datetime(2026, 3, 2, 9, 0), datetime(2026, 3, 2, 10, 0))
+    # Unparseable: the time part of the date is used
+    assert booking_interval(day, "morning", 30) == (datetime(2026, 3, 2, 7, 15), datetime(2026, 3, 2, 7, 45))
+
+
+def test_interval_index_overlaps_are_half_open():
+    index = IntervalIndex([(at(MONDAY, 10), at(MONDAY, 11)), (at(MONDAY, 9), at(MONDAY, 15))])
+    assert index.overlaps(at(MONDAY, 14), at(MONDAY, 16))
+    assert not index.overlaps(at(MONDAY, 15), at(MONDAY, 16))
+    assert not index.overlaps(at(MONDAY, 8), at(MONDAY, 9))
+    assert not IntervalIndex().overlaps(at(MONDAY, 8), at(MONDAY, 9))
+
+
+def test_interval_index_free_skips_nested_intervals():
+    index = IntervalIndex([
+        (at(MONDAY, 9), at(MONDAY, 13)),
+        (at(MONDAY, 10), at(MONDAY, 11)),
+        (at(MONDAY, 14), at(MONDAY, 15)),
+    ])
+    assert index.free(at(MONDAY, 8), at(MONDAY, 18)) == [
+        (at(MONDAY, 8), at(MONDAY, 9)),
+        (at(MONDAY, 13), at(MONDAY, 14)),
+        (at(MONDAY, 15), at(MONDAY, 18)),
+    ]
+    # A window starting inside a busy interval
+    assert index.free(at(MONDAY, 12), at(MONDAY, 16)) == [
+        (at(MONDAY, 13), at(MONDAY, 14)), (at(MONDAY, 15), at(MONDAY, 16))
+    ]
+
+
+def test_open_slots_fit_between_busy_intervals():
+    busy = IntervalIndex([(at(MONDAY, 10, 15), at(MONDAY, 11))])
+    slots = open_slots(WEEKDAY_HOURS, busy, MONDAY, MONDAY, duration=60, step=30)
+    assert slots == [
+        (at(MONDAY, 9), at(MONDAY, 10)),
+        (at(MONDAY, 11), at(MONDAY, 12)),
+    ]
+    # Sunday is not a working day of WEEKDAY_HOURS
+    assert open_slots(WEEKDAY_HOURS, IntervalIndex(), SUNDAY, SUNDAY) == []
+
+
+def test_within_working_hours_supports_shifts_and_closed_days():
+    hours = {"monday": [{"start": "08:00", "end": "12:00"}, {"start": "14:00", "end": "18:00"}],
+             "tuesday": {"closed": True}}
+    assert within_working_hours(hours, at(MONDAY, 14), at(MONDAY, 15))
+    assert not within_working_hours(hours, at(MONDAY, 11), at(MONDAY, 15))
+    assert not within_working_hours(hours, at(MONDAY + timedelta(days=1), 9), at(MONDAY + timedelta(days=1), 10))
+
+
+@pytest.mark.anyio
+async def test_booking_overlapping_a_pending_request_is_refused(client, db):
+    customer = await create_customer(db)
+    other = await create_customer(db)
+    _, artisan_id = await create_artisan(db)
+
+    response = await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "10:00"),
+                                 headers=auth(customer.id))
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+
+    response = await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "10:30"),
+                                 headers=auth(other.id))
+    assert response.status_code == 409
+
+    # Back to back is fine
+    response = await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "11:00"),
+                                 headers=auth(other.id))
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_rejected_request_frees_its_slot(client, db):
+    customer = await create_customer(db)
+    artisan_user, artisan_id = await create_artisan(db)
+
+    first = (await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "10:00"),
+                               headers=auth(customer.id))).json()
+    response = await client.post(f"/api/bookings/{first['id']}/reject", headers=auth(artisan_user.id))
+    assert response.status_code == 200
+
+    response = await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "10:00"),
+                                 headers=auth(customer.id))
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_slot_listing_hides_pending_requests(client, db):
+    customer = await create_customer(db)
+    _, artisan_id = await create_artisan(db, working_hours=WEEKDAY_HOURS)
+    params = {"from": MONDAY.isoformat(), "to": MONDAY.isoformat(), "duration": 60}
+
+    before = (await client.get(f"/api/artisans/{artisan_id}/slots", params=params)).json()
+    assert f"{MONDAY.isoformat()}T10:00:00" in [slot["start"] for slot in before]
+
+    await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "10:00"), headers=auth(customer.id))
+
+    after = (await client.get(f"/api/artisans/{artisan_id}/slots", params=params)).json()
+    assert [slot["start"] for slot in after] == [f"{MONDAY.isoformat()}T09:00:00", f"{MONDAY.isoformat()}T11:00:00"]
+
+
+@pytest.mark.anyio
+async def test_concurrent_requests_for_one_slot(client, db):
+    customers = [await create_customer(db) for _ in range(4)]
+    _, artisan_id = await create_artisan(db)
+
+    responses = await asyncio.gather(*(
+        client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "10:00"), headers=auth(customer.id))
+        for customer in customers
+    ))
+    assert sorted(response.status_code for response in responses) == [200, 409, 409, 409]
+
+
+@pytest.mark.anyio
+async def test_only_one_of_two_overlapping_requests_can_be_accepted(client, db):
+    customer = await create_customer(db)
+    artisan_user, artisan_id = await create_artisan(db)
+    # Overlapping pending requests, as left by bookings created before they were checked
+    pending = [
+        Booking(
+            customer_id=customer.id, artisan_id=artisan_id, service_category="plumbing",
+            service_description="Leaking tap", scheduled_date=at(MONDAY, 0), scheduled_time=clock,
+            estimated_duration=60, address="1 Rue Test", city="Casablanca",
+        )
+        for clock in ("10:00", "10:30")
+    ]
+    db.add_all(pending)
+    await db.commit()
+
+    responses = await asyncio.gather(*(
+        client.post(f"/api/bookings/{booking.id}/accept", headers=auth(artisan_user.id)) for booking in pending
+    ))
+    assert sorted(response.status_code for response in responses) == [200, 409]
+
+    await db.close()
+    statuses = sorted([(await db.get(Booking, booking.id)).status for booking in pending])
+    assert statuses == sorted([BookingStatus.ACCEPTED, BookingStatus.PENDING])
+
+
+@pytest.mark.anyio
+async def test_working_hours_apply_when_the_artisan_set_them(client, db):
+    customer = await create_customer(db)
+    _, artisan_id = await create_artisan(db, working_hours=WEEKDAY_HOURS)
+
+    response = await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "14:00"),
+                                 headers=auth(customer.id))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Requested time is outside the artisan's working hours"
+
+    # Ending after closing time
+    response = await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "11:30"),
+                                 headers=auth(customer.id))
+    assert response.status_code == 400
+
+    response = await client.post("/api/bookings/", json=booking_payload(artisan_id, MONDAY, "09:30"),
+                                 headers=auth(customer.id))
+    assert response.status_code == 200
+
+
+@pytest.mark.anyio
+async def test_artisans_without_working_hours_can_be_booked_any_time(client, db):
+    customer = await create_customer(db)
+    _, artisan_id = await create_artisan(db)
+
+    for day, clock in ((SUNDAY, "10:00"), (MONDAY, "20:00"), (MONDAY, "06:30")):
+        response = await client.post("/api/bookings/", json=booking_payload(artisan_id, day, clock),
+                                     headers=auth(customer.id))
+        assert response.status_code == 200, (day, clock)
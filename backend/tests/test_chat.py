@@ -0,0 +1,155 @@
+import anyio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from app.main import app
+from app.database import SessionLocal, engine
+from app.models.chat import Conversation, Message
+from app.core.chat import MAX_MESSAGE_ID, MessageWriter, message_writer
+from app.routers import chat as chat_router
+from app.core.tokens import create_access_token
+from tests.factories import create_artisan, create_customer
+
+
+class FlakySessions:
+    """SessionLocal that fails while `failing` is set, as an unreachable database would."""
+
+    def __init__(self):
+        self.failing = False
+
+    def __call__(self):
+        if self.failing:
+            raise OperationalError("connect", {}, ConnectionRefusedError("database unavailable"))
+        return SessionLocal()
+
+
+async def create_conversation(db):
+    customer = await create_customer(db)
+    artisan_user, artisan_id = await create_artisan(db)
+    conversation = Conversation(customer_id=customer.id, artisan_id=artisan_id)
+    db.add(conversation)
+    await db.commit()
+    return customer, artisan_user, conversation
+
+
+@pytest.mark.anyio
+async def test_writer_persists_messages_and_unread_counts(db):
+    customer, artisan_user, conversation = await create_conversation(db)
+    writer = MessageWriter()
+
+    first = await writer.send(conversation.id, customer.id, "Bonjour")
+    second = await writer.send(conversation.id, customer.id, "Vous êtes disponible ?")
+    assert second.id > first.id
+    writer.mark_read(conversation.id, artisan_user.id, first.id)
+    await writer.close()
+
+    await db.refresh(conversation)
+    assert conversation.last_message_preview == "Vous êtes disponible ?"
+    assert conversation.artisan_unread_count == 1
+    assert conversation.customer_unread_count == 0
+    assert (await db.get(Message, first.id)).is_read
+    assert not (await db.get(Message, second.id)).is_read
+
+
+@pytest.mark.anyio
+async def test_failed_flush_fails_senders_and_keeps_read_receipts(db):
+    customer, artisan_user, conversation = await create_conversation(db)
+    sessions = FlakySessions()
+    writer = MessageWriter(sessionmaker=sessions)
+    message = await writer.send(conversation.id, customer.id, "Bonjour")
+
+    sessions.failing = True
+    writer.mark_read(conversation.id, artisan_user.id, message.id)
+    with pytest.raises(OperationalError):
+        await writer.send(conversation.id, customer.id, "Lost")
+
+    sessions.failing = False
+    await writer.close()
+    await db.refresh(conversation)
+    assert (await db.get(Message, message.id)).is_read
+    assert conversation.artisan_unread_count == 0
+
+
+@pytest.mark.anyio
+async def test_receipts_the_database_rejects_are_dropped(db, caplog):
+    customer, artisan_user, conversation = await create_conversation(db)
+    other_customer, _, other_conversation = await create_conversation(db)
+    writer = MessageWriter()
+    first = await writer.send(conversation.id, customer.id, "Bonjour")
+    other = await writer.send(other_conversation.id, other_customer.id, "Salam")
+
+    with pytest.raises(ValueError):
+        writer.mark_read(conversation.id, artisan_user.id, 10**30)
+    # Past mark_read's check: too large for the database driver
+    writer._reads[(conversation.id, artisan_user.id)] = 10**30
+    writer.mark_read(other_conversation.id, other_conversation.artisan_id, other.id)
+    second = await writer.send(conversation.id, customer.id, "Toujours là ?")
+    third = await writer.send(conversation.id, customer.id, "Merci")
+    await writer.close()
+
+    # The bad receipt was dropped, not kept for the next flush; the other
+    # receipt and the messages were stored
+    assert writer._reads == {}
+    assert "Dropped 1 chat read receipts" in caplog.text
+    assert (second.id, third.id) == (first.id + 2, first.id + 3)
+    await db.refresh(conversation)
+    assert conversation.artisan_unread_count == 3
+    assert not (await db.get(Message, first.id)).is_read
+    assert (await db.get(Message, other.id)).is_read
+
+
+@pytest.mark.anyio
+async def test_socket_reports_a_failed_send_and_stays_open(db, monkeypatch):
+    customer, _, conversation = await create_conversation(db)
+    await db.close()
+
+    async def failing_send(*args):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(message_writer, "send", failing_send)
+    token = create_access_token({"sub": customer.id})
+
+    def chat():
+        with TestClient(app) as client:
+            with client.websocket_connect(f"/api/chat/ws/{conversation.id}?token={token}") as socket:
+                socket.send_json({"type": "message", "content": "Bonjour"})
+                error = socket.receive_json()
+                socket.send_text("garbage")
+                return error, socket.receive_json()
+
+    # The test client runs the app on its own event loop
+    await engine.dispose()
+    error, reply = await anyio.to_thread.run_sync(chat)
+    assert error == {"type": "error", "detail": "Message could not be sent"}
+    assert reply == {"type": "error", "detail": "Unknown event"}
+
+
+@pytest.mark.anyio
+async def test_socket_rejects_bad_read_receipts(db, monkeypatch):
+    customer, _, conversation = await create_conversation(db)
+    await db.close()
+    writer = MessageWriter()
+    monkeypatch.setattr(chat_router, "message_writer", writer)
+    token = create_access_token({"sub": customer.id})
+
+    def chat():
+        with TestClient(app) as client:
+            with client.websocket_connect(f"/api/chat/ws/{conversation.id}?token={token}") as socket:
+                replies = []
+                for up_to in (10**30, MAX_MESSAGE_ID + 1, 0, -1, True, 1.5, "1"):
+                    socket.send_json({"type": "read", "up_to": up_to})
+                    replies.append(socket.receive_json())
+                socket.send_json({"type": "message", "content": "Bonjour"})
+                replies.append(socket.receive_json())
+            client.portal.call(writer.close)
+        return replies
+
+    await engine.dispose()
+    *errors, reply = await anyio.to_thread.run_sync(chat)
+    assert errors == [{"type": "error", "detail": "Invalid read receipt"}] * 7
+    assert reply["type"] == "message"
+    assert reply["message"]["content"] == "Bonjour"
+
+    async with SessionLocal() as session:
+        assert (await session.scalars(select(Message.content))).all() == ["Bonjour"]
@@ -0,0 +1,176 @@
+import pytest
+from sqlalchemy import delete, update
+from app.models.artisan import Artisan, ArtisanFacetCount
+from app.core.facets import (
+    ALL_CATEGORIES,
+    check_facet_counts,
+    facet_keys,
+    rating_bucket,
+    rebuild_facet_counts,
+    summarize_facets,
+)
+from tests.factories import auth, create_artisan, create_booking, create_customer
+
+FILTERS = [
+    {},
+    {"category": "plumbing"},
+    {"city": "casa", "category": "plumbing"},
+    {"min_rating": 4, "is_available": True},
+    {"city": "Rabat", "is_available": False},
+    {"category": "painting", "min_rating": 1},
+]
+
+
+async def create_artisans(db) -> dict:
+    """Four artisans in two cities, rated and available as named."""
+    artisans = {}
+    for name, city, services, rating, is_available in (
+        ("casa-top", "Casablanca", (("plumbing", "Plomberie"), ("electrical", "Électricité")), 4.5, True),
+        ("casa-busy", "Casablanca", (("plumbing", "Plomberie sanitaire"),), 3.0, False),
+        ("rabat-top", "Rabat", (("electrical", "Électricité"),), 5.0, True),
+        ("rabat-new", "Rabat", (("painting", "Peinture"),), 0.0, True),
+    ):
+        _, artisan_id = await create_artisan(db, full_name=name, city=city, services=services)
+        await db.execute(update(Artisan).where(Artisan.id == artisan_id).values(
+            rating=rating, is_available=is_available
+        ))
+        artisans[name] = artisan_id
+    await db.commit()
+    # Ratings and availability were written behind the counts' back
+    await rebuild_facet_counts(db)
+    return artisans
+
+
+async def search(client, **params) -> dict:
+    response = await client.get("/api/artisans/search", params={"limit": 100, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_rating_buckets_and_keys():
+    assert [rating_bucket(rating) for rating in (None, 0, 0.49, 0.5, 4.49, 4.5, 5, 7)] == [0, 0, 0, 1, 8, 9, 10, 10]
+    assert facet_keys("Fès", None, 4.2, ["tiling", "tiling"]) == {
+        (ALL_CATEGORIES, "Fès", False, 8), ("tiling", "Fès", False, 8)
+    }
+
+
+def test_summarize_facets():
+    counts = {
+        (ALL_CATEGORIES, "Casablanca", True, 8): 3,
+        ("plumbing", "Casablanca", True, 8): 2,
+        (ALL_CATEGORIES, "Rabat", False, 2): 1,
+        ("painting", "Rabat", False, 2): 1,
+    }
+    assert summarize_facets(counts, city="CASA") == {
+        "total": 3,
+        "categories": {"plumbing": 2},
+        "cities": {"Casablanca": 3, "Rabat": 1},
+        "availability": {"available": 3},
+        "ratings": {"4.5": 0, "4": 3, "3": 3, "2": 3, "1": 3},
+    }
+    # min_rating counts at half-star precision: 4.2 counts everything from 4.0
+    assert summarize_facets(counts, category="plumbing", min_rating=4.2)["total"] == 2
+    assert summarize_facets(counts, min_rating=4.5)["total"] == 0
+    assert summarize_facets({})["total"] == 0
+
+
+@pytest.mark.anyio
+async def test_search_facets(client, db):
+    await create_artisans(db)
+
+    assert (await search(client))["facets"] == {
+        "total": 4,
+        "categories": {"plumbing": 2, "electrical": 2, "painting": 1},
+        "cities": {"Casablanca": 2, "Rabat": 2},
+        "availability": {"available": 3, "unavailable": 1},
+        "ratings": {"4.5": 2, "4": 2, "3": 3, "2": 3, "1": 3},
+    }
+    # Each facet applies every filter but its own
+    assert (await search(client, city="casa", category="plumbing"))["facets"] == {
+        "total": 2,
+        "categories": {"plumbing": 2, "electrical": 1},
+        "cities": {"Casablanca": 2},
+        "availability": {"available": 1, "unavailable": 1},
+        "ratings": {"4.5": 1, "4": 1, "3": 2, "2": 2, "1": 2},
+    }
+    assert (await search(client, min_rating=4, is_available=True))["facets"] == {
+        "total": 2,
+        "categories": {"electrical": 2, "plumbing": 1},
+        "cities": {"Casablanca": 1, "Rabat": 1},
+        "availability": {"available": 2},
+        "ratings": {"4.5": 2, "4": 2, "3": 2, "2": 2, "1": 2},
+    }
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("filters", FILTERS)
+async def test_facet_totals_match_the_listing(client, db, filters):
+    await create_artisans(db)
+    result = await search(client, **filters)
+    assert result["facets"]["total"] == len(result["artisans"])
+
+
+@pytest.mark.anyio
+async def test_text_search_facets_count_the_matches(client, db):
+    artisans = await create_artisans(db)
+
+    result = await search(client, search="plomberie")
+    assert sorted(artisan["id"] for artisan in result["artisans"]) == [artisans["casa-top"], artisans["casa-busy"]]
+    assert result["facets"]["categories"] == {"plumbing": 2, "electrical": 1}
+    assert result["facets"]["total"] == 2
+
+    result = await search(client, search="plomberie", is_available=False)
+    assert [artisan["id"] for artisan in result["artisans"]] == [artisans["casa-busy"]]
+    assert result["facets"]["availability"] == {"available": 1, "unavailable": 1}
+
+    for text in ("introuvable", "de la"):
+        assert (await search(client, search=text))["facets"]["total"] == 0
+
+
+@pytest.mark.anyio
+async def test_writes_keep_the_counts_current(client, db):
+    user, artisan_id = await create_artisan(db, city="Tanger")
+    headers = auth(user.id)
+    assert await check_facet_counts(db) == {}
+
+    response = await client.put("/api/artisans/me", json={"city": "Tétouan", "is_available": False}, headers=headers)
+    assert response.status_code == 200
+    assert await check_facet_counts(db) == {}
+
+    response = await client.post("/api/artisans/me/services", json={"category": "carpentry", "name": "Menuiserie"},
+                                 headers=headers)
+    assert response.status_code == 200
+    assert await check_facet_counts(db) == {}
+    assert (await search(client, category="carpentry"))["facets"]["cities"] == {"Tétouan": 1}
+
+    response = await client.delete(f"/api/artisans/me/services/{response.json()['id']}", headers=headers)
+    assert response.status_code == 200
+    assert await check_facet_counts(db) == {}
+    assert (await search(client, category="carpentry"))["facets"]["total"] == 0
+
+    # Ratings 5, 4.5 and 4.67: two bucket changes, then none
+    customer = await create_customer(db)
+    for rating in (5, 4, 5):
+        booking = await create_booking(db, customer.id, artisan_id)
+        response = await client.post("/api/reviews/", json={"booking_id": booking.id, "rating": rating},
+                                     headers=auth(customer.id))
+        assert response.status_code == 200
+        assert await check_facet_counts(db) == {}
+    assert (await search(client))["facets"]["ratings"] == {"4.5": 1, "4": 1, "3": 1, "2": 1, "1": 1}
+
+
+@pytest.mark.anyio
+async def test_rebuild_repairs_drifted_counts(db):
+    await create_artisans(db)
+    assert await check_facet_counts(db) == {}
+
+    await db.execute(delete(ArtisanFacetCount).where(ArtisanFacetCount.city == "Rabat"))
+    await db.execute(update(ArtisanFacetCount).values(artisan_count=ArtisanFacetCount.artisan_count + 1))
+    await db.commit()
+    drifted = await check_facet_counts(db)
+    assert drifted
+    assert all(stored != expected for stored, expected in drifted.values())
+
+    # Every key was off: one row per key the artisans count under
+    assert await rebuild_facet_counts(db) == sum(1 for _, expected in drifted.values() if expected)
+    assert await check_facet_counts(db) == {}
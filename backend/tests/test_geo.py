@@ -0,0 +1,80 @@
+import random
+import pytest
+from sqlalchemy import update
+from app.models.artisan import Artisan
+from app.core.geo import (
+    GEOHASH_PRECISION,
+    MAX_SEARCH_CELLS,
+    bounding_box,
+    covering_cells,
+    encode_geohash,
+    haversine_km,
+    prefix_upper_bound,
+)
+from tests.factories import create_artisan
+
+CASABLANCA = (33.5731, -7.5898)
+RABAT = (34.0209, -6.8416)
+
+
+def test_haversine_known_distance():
+    # Paris - London
+    assert haversine_km(48.8566, 2.3522, 51.5074, -0.1278) == pytest.approx(343.5, abs=0.5)
+    assert haversine_km(*CASABLANCA, *CASABLANCA) == 0
+
+
+def test_encode_geohash_reference_values():
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert encode_geohash(*CASABLANCA) == encode_geohash(*CASABLANCA, GEOHASH_PRECISION)
+    assert len(encode_geohash(*CASABLANCA)) == GEOHASH_PRECISION
+
+
+def test_bounding_box_encloses_the_circle():
+    min_lat, max_lat, min_lng, max_lng = bounding_box(*CASABLANCA, 20)
+    for lat, lng in ((min_lat, CASABLANCA[1]), (max_lat, CASABLANCA[1]),
+                     (CASABLANCA[0], min_lng), (CASABLANCA[0], max_lng)):
+        assert haversine_km(*CASABLANCA, lat, lng) == pytest.approx(20, rel=0.01)
+
+
+@pytest.mark.parametrize("radius_km", [0.5, 5, 20, 100])
+def test_covering_cells_cover_every_point_in_the_box(radius_km):
+    bbox = bounding_box(*CASABLANCA, radius_km)
+    cells = covering_cells(bbox)
+    assert 0 < len(cells) <= MAX_SEARCH_CELLS
+
+    rng = random.Random(radius_km)
+    min_lat, max_lat, min_lng, max_lng = bbox
+    for _ in range(500):
+        point = encode_geohash(rng.uniform(min_lat, max_lat), rng.uniform(min_lng, max_lng))
+        assert any(cell <= point < prefix_upper_bound(cell) for cell in cells)
+
+
+def test_prefix_upper_bound_orders_after_every_extension():
+    assert "u4pr" < "u4pruydz" < prefix_upper_bound("u4pr") < "u4ps"
+
+
+@pytest.mark.anyio
+async def test_nearby_filters_by_radius_and_sorts_by_distance(client, db):
+    _, near = await create_artisan(db, latitude=33.58, longitude=-7.59)
+    _, farther = await create_artisan(db, latitude=33.65, longitude=-7.50)
+    _, rabat = await create_artisan(db, city="Rabat", latitude=RABAT[0], longitude=RABAT[1])
+    await create_artisan(db)  # no coordinates
+
+    response = await client.get("/api/artisans/nearby", params={"lat": CASABLANCA[0], "lng": CASABLANCA[1],
+                                                                 "radius_km": 30})
+    assert response.status_code == 200
+    results = response.json()
+    assert [artisan["id"] for artisan in results] == [near, farther]
+    assert results[0]["distance_km"] < results[1]["distance_km"]
+    assert rabat not in [artisan["id"] for artisan in results]
+
+
+@pytest.mark.anyio
+async def test_nearby_respects_the_artisan_service_radius(client, db):
+    _, artisan_id = await create_artisan(db, latitude=33.65, longitude=-7.50)  # ~12 km away
+    await db.execute(update(Artisan).where(Artisan.id == artisan_id).values(service_radius_km=5))
+    await db.commit()
+
+    response = await client.get("/api/artisans/nearby", params={"lat": CASABLANCA[0], "lng": CASABLANCA[1],
+                                                                 "radius_km": 30})
+    assert response.json() == []
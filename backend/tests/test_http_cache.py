@@ -0,0 +1,72 @@
+import pytest
+from app.core import http_cache
+from app.core.http_cache import MAX_VARIANTS, REVALIDATE, STATIC
+from tests.factories import auth, create_artisan
+
+ORIGIN = "http://localhost:3000"
+
+
+@pytest.mark.anyio
+async def test_cached_responses_keep_cors_headers(client, db):
+    _, artisan_id = await create_artisan(db)
+    for url in ("/api/categories", f"/api/artisans/{artisan_id}", f"/api/reviews/stats/{artisan_id}"):
+        miss = await client.get(url, headers={"Origin": ORIGIN})
+        hit = await client.get(url, headers={"Origin": ORIGIN})
+        revalidated = await client.get(url, headers={"Origin": ORIGIN, "If-None-Match": hit.headers["etag"]})
+
+        assert [response.status_code for response in (miss, hit, revalidated)] == [200, 200, 304], url
+        for response in (miss, hit, revalidated):
+            assert response.headers["access-control-allow-origin"] == ORIGIN, url
+            assert "ETag" in response.headers["access-control-expose-headers"]
+        assert hit.content == miss.content
+        assert hit.headers["content-type"] == miss.headers["content-type"] == "application/json"
+        assert revalidated.headers["etag"] == miss.headers["etag"]
+
+        # Other origins are not allowed, cached or not
+        other = await client.get(url, headers={"Origin": "http://evil.test"})
+        assert "access-control-allow-origin" not in other.headers
+
+
+@pytest.mark.anyio
+async def test_cache_headers_and_invalidation(client, db):
+    user, artisan_id = await create_artisan(db, bio="Avant")
+    url = f"/api/artisans/{artisan_id}"
+
+    first = await client.get(url)
+    assert first.headers["cache-control"] == REVALIDATE
+    assert (await client.get("/api/cities")).headers["cache-control"] == STATIC
+
+    response = await client.put("/api/artisans/me", json={"bio": "Après"}, headers=auth(user.id))
+    assert response.status_code == 200
+    second = await client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.json()["bio"] == "Après"
+    assert second.headers["etag"] != first.headers["etag"]
+
+
+@pytest.mark.anyio
+async def test_query_strings_are_cached_apart(client, db):
+    _, artisan_id = await create_artisan(db)
+    url = f"/api/artisans/{artisan_id}"
+
+    for n in range(MAX_VARIANTS + 2):
+        assert (await client.get(url, params={"v": n})).status_code == 200
+    variants = await http_cache.get_cache_backend().get(url)
+    assert len(variants) == MAX_VARIANTS
+    assert "v=0" in variants and "" not in variants
+
+    # Invalidating the path drops every variant
+    await http_cache.invalidate_artisan(artisan_id)
+    assert await http_cache.get_cache_backend().get(url) is None
+
+
+@pytest.mark.anyio
+async def test_head_requests_get_no_body(client, db):
+    get = await client.get("/api/categories")
+    await http_cache.get_cache_backend().clear()
+    for _ in range(2):  # miss, then hit
+        head = await client.head("/api/categories")
+        assert head.status_code == 200
+        assert head.content == b""
+        assert head.headers["content-length"] == str(len(get.content))
+        assert head.headers["etag"] == get.headers["etag"]
@@ -0,0 +1,90 @@
+"""Migrations run against a database of their own, seeded at the baseline."""
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+import pytest
+from app.core.geo import encode_geohash
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASABLANCA = (33.5731, -7.5898)
+
+
+def alembic(url: str, *args: str):
+    subprocess.run(
+        [sys.executable, "-m", "alembic", *args],
+        cwd=BACKEND, env={**os.environ, "DATABASE_URL": url}, check=True, capture_output=True
+    )
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """(url, connection) of a database at 0001_baseline with one artisan, booking and review."""
+    path = tmp_path / "migrations.db"
+    url = f"sqlite:///{path}"
+    alembic(url, "upgrade", "0001_baseline")
+    connection = sqlite3.connect(path)
+    connection.executescript(f"""
+        INSERT INTO users (id, email, hashed_password, full_name) VALUES
+            (1, 'artisan@tests.fikhidmatik.ma', 'x', 'Ahmed'),
+            (2, 'customer@tests.fikhidmatik.ma', 'x', 'Salma');
+        INSERT INTO artisans (id, user_id, city, latitude, longitude, is_available, rating, total_reviews)
+            VALUES (1, 1, 'Casablanca', {CASABLANCA[0]}, {CASABLANCA[1]}, 1, 4.5, 2);
+        INSERT INTO artisan_services (id, artisan_id, category, name) VALUES
+            (1, 1, 'plumbing', 'Plomberie'),
+            (2, 1, 'electrical', 'Électricité');
+        INSERT INTO bookings (id, customer_id, artisan_id, service_category, service_description,
+                              scheduled_date, scheduled_time, estimated_duration, address, city)
+            VALUES (1, 2, 1, 'plumbing', 'Fuite', '2030-01-07 00:00:00.000000', '14h30', 90, 'x', 'Casablanca');
+        INSERT INTO reviews (id, booking_id, customer_id, artisan_id, rating, quality_rating) VALUES
+            (1, 1, 2, 1, 4.5, 4.0);
+    """)
+    connection.commit()
+    yield url, connection
+    connection.close()
+
+
+def test_upgrade_backfills_derived_columns(baseline):
+    url, connection = baseline
+    alembic(url, "upgrade", "head")
+
+    geohash, rating_sum = connection.execute("SELECT geohash, rating_sum FROM artisans").fetchone()
+    assert geohash == encode_geohash(*CASABLANCA)
+    assert rating_sum == 9.0
+
+    starts_at, ends_at = connection.execute("SELECT starts_at, ends_at FROM bookings").fetchone()
+    assert datetime.fromisoformat(starts_at) == datetime(2030, 1, 7, 14, 30)
+    assert datetime.fromisoformat(ends_at) == datetime(2030, 1, 7, 16, 0)
+
+    document = connection.execute(
+        "SELECT artisan_id, name_text, services_text, bio_text FROM artisan_search_documents"
+    ).fetchall()
+    assert document == [(1, "ahmed", "plomberie electricite", "")]
+
+    review_stats = connection.execute(
+        "SELECT artisan_id, star_4, star_5, quality_sum, quality_count, punctuality_count FROM artisan_review_stats"
+    ).fetchall()
+    assert review_stats == [(1, 1, 0, 4.0, 1, 0)]
+
+    facet_counts = connection.execute(
+        "SELECT category, city, is_available, rating_bucket, artisan_count FROM artisan_facet_counts"
+    ).fetchall()
+    assert sorted(facet_counts) == [
+        ("", "Casablanca", 1, 9, 1),
+        ("electrical", "Casablanca", 1, 9, 1),
+        ("plumbing", "Casablanca", 1, 9, 1),
+    ]
+
+
+def test_downgrade_to_baseline(baseline):
+    url, connection = baseline
+    alembic(url, "upgrade", "head")
+    alembic(url, "downgrade", "0001_baseline")
+
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(artisans)")}
+    assert "geohash" not in columns and "rating_sum" not in columns
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "revoked_tokens" not in tables and "artisan_search_documents" not in tables
+    assert connection.execute("SELECT count(*) FROM bookings").fetchone() == (1,)
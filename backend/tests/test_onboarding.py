@@ -0,0 +1,148 @@
+import json
+import pytest
+from sqlalchemy import func, select
+from app.models.user import User, UserRole
+from app.models.artisan import Artisan, ArtisanService
+from app.models.search import ArtisanSearchDocument
+from app.schemas.user import UserCreate
+from app.schemas.artisan import ArtisanCreate, ServiceCreate
+from app.core.geo import encode_geohash
+from app.core.passwords import verify_password
+from app.core.facets import check_facet_counts
+from app.core.onboarding import create_artisans, import_artisans, read_records
+from tests.factories import PASSWORD, create_artisan, password_hash
+
+
+def record(n: int, **fields) -> dict:
+    return {
+        "email": f"import{n}@tests.fikhidmatik.ma",
+        "password": PASSWORD,
+        "full_name": f"Artisan {n}",
+        "city": "Marrakech",
+        "services": [{"category": "painting", "name": "Peinture"}],
+        **fields,
+    }
+
+
+async def count(db, model) -> int:
+    return await db.scalar(select(func.count()).select_from(model))
+
+
+@pytest.mark.anyio
+async def test_register_artisan(client, db):
+    payload = {
+        "user_data": {"email": "hassan@tests.fikhidmatik.ma", "phone": "0600000001",
+                      "password": PASSWORD, "full_name": "Hassan Idrissi"},
+        "artisan_data": {"city": "Fès", "latitude": 34.03, "longitude": -5.0, "bio": "Zellige",
+                         "services": [{"category": "tiling", "name": "Zellige"},
+                                      {"category": "masonry", "name": "Maçonnerie"}]},
+    }
+    response = await client.post("/api/auth/register/artisan", json=payload)
+    assert response.status_code == 200, response.text
+    assert response.json()["role"] == UserRole.ARTISAN.value
+
+    artisan = await db.scalar(select(Artisan).where(Artisan.user_id == response.json()["id"]))
+    assert artisan.geohash == encode_geohash(34.03, -5.0)
+    assert await count(db, ArtisanService) == 2
+    assert (await db.get(ArtisanSearchDocument, artisan.id)).name_text == "hassan idrissi"
+    assert await check_facet_counts(db) == {}
+
+    login = await client.post("/api/auth/login", json={"email": "hassan@tests.fikhidmatik.ma", "password": PASSWORD})
+    assert login.status_code == 200
+
+    for user_data, detail in (
+        ({"email": "hassan@tests.fikhidmatik.ma"}, "Email already registered"),
+        ({"email": "other@tests.fikhidmatik.ma", "phone": "0600000001"}, "Phone number already registered"),
+    ):
+        response = await client.post("/api/auth/register/artisan", json={
+            **payload, "user_data": {**payload["user_data"], **user_data}
+        })
+        assert (response.status_code, response.json()["detail"]) == (400, detail)
+    assert await count(db, Artisan) == 1
+
+
+@pytest.mark.anyio
+async def test_create_artisans_in_one_batch(db):
+    registrations = [
+        (
+            UserCreate(email=f"batch{n}@tests.fikhidmatik.ma", password=PASSWORD, full_name=f"Batch {n}"),
+            ArtisanCreate(city="Agadir", latitude=30.4 if n % 2 else None, longitude=-9.6 if n % 2 else None,
+                          services=[ServiceCreate(category="plumbing", name="Plomberie")] * (n % 3)),
+            password_hash(),
+        )
+        for n in range(5)
+    ]
+    users = await create_artisans(db, registrations)
+    await db.commit()
+
+    # Returned in the order given
+    assert [user.email for user in users] == [user.email for user, _, _ in registrations]
+    artisans = (await db.scalars(select(Artisan).order_by(Artisan.id))).all()
+    assert [artisan.user_id for artisan in artisans] == [user.id for user in users]
+    assert [artisan.geohash for artisan in artisans] == [
+        encode_geohash(30.4, -9.6) if n % 2 else None for n in range(5)
+    ]
+    assert await count(db, ArtisanService) == sum(n % 3 for n in range(5))
+    assert await count(db, ArtisanSearchDocument) == 5
+    assert await check_facet_counts(db) == {}
+
+
+def test_read_records(tmp_path):
+    csv_path = tmp_path / "artisans.csv"
+    csv_path.write_text(
+        "email,full_name,city,phone,services\n"
+        'a@tests.fikhidmatik.ma,Amine,Rabat,,"[{""category"": ""plumbing"", ""name"": ""Plomberie""}]"\n'
+        "b@tests.fikhidmatik.ma,Badr,Salé,0611111111,not json\n",
+        encoding="utf-8",
+    )
+    assert list(read_records(str(csv_path))) == [
+        (2, {"email": "a@tests.fikhidmatik.ma", "full_name": "Amine", "city": "Rabat",
+             "services": [{"category": "plumbing", "name": "Plomberie"}]}),
+        # Left for validation to report
+        (3, {"email": "b@tests.fikhidmatik.ma", "full_name": "Badr", "city": "Salé", "phone": "0611111111",
+             "services": "not json"}),
+    ]
+
+    jsonl_path = tmp_path / "artisans.jsonl"
+    jsonl_path.write_text(json.dumps(record(1)) + "\n\n{broken\n[1, 2]\n", encoding="utf-8")
+    assert list(read_records(str(jsonl_path))) == [(1, record(1)), (3, None), (4, [1, 2])]
+
+
+@pytest.mark.anyio
+async def test_import_skips_and_reports_bad_records(db):
+    user, _ = await create_artisan(db)
+    records = [
+        (1, record(1, phone="0622222222")),
+        (2, record(2, email=user.email)),  # already registered
+        (3, record(3, phone="0622222222")),  # phone repeated in the file
+        (4, record(1)),  # email repeated in the file
+        (5, record(5, city=None)),
+        (6, None),
+        (7, [1, 2]),
+        (8, record(8, latitude=33.57, longitude=-7.59)),
+        (9, record(9, services=[])),
+    ]
+
+    report = await import_artisans(db, iter(records), batch_size=2, workers=1)
+
+    assert report.created == 3
+    assert [line for line, _ in report.skipped] == [2, 3, 4, 5, 6, 7]
+    reasons = dict(report.skipped)
+    assert reasons[2] == "email or phone already registered"
+    assert reasons[3] == reasons[4] == "duplicate email or phone in file"
+    assert reasons[5].startswith("invalid record")
+    assert reasons[6] == reasons[7] == "invalid record: not a JSON object"
+
+    imported = (await db.scalars(select(User.email).where(User.email.like("import%")).order_by(User.id))).all()
+    assert imported == [record(n)["email"] for n in (1, 8, 9)]
+    assert await db.scalar(select(Artisan.geohash).join(User).where(User.email == record(8)["email"])) \
+        == encode_geohash(33.57, -7.59)
+    assert await check_facet_counts(db) == {}
+
+    # Passwords were hashed in the worker processes
+    hashed = await db.scalar(select(User.hashed_password).where(User.email == record(1)["email"]))
+    assert verify_password(PASSWORD, hashed)
+
+    # Importing the same file again creates nothing
+    again = await import_artisans(db, iter([(1, record(1))]), workers=1)
+    assert (again.created, again.skipped) == (0, [(1, "email or phone already registered")])
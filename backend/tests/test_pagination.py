@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+from app.models.artisan import Artisan
+from app.models.review import Review
+from app.core.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from tests.factories import auth, create_artisan, create_booking, create_customer
+
+
+async def walk(client, url: str, limit: int, headers=None) -> list:
+    """Ids of every row, following the next-cursor header page by page."""
+    ids, cursor = [], None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = await client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        page = [row["id"] for row in response.json()]
+        assert len(page) <= limit
+        ids += page
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return ids
+        assert len(page) == limit
+
+
+def test_cursor_round_trip():
+    created = datetime(2026, 10, 18, 9, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created, 42), datetime, int) == (created, 42)
+    assert decode_cursor(encode_cursor(4.5, 7), float, int) == (4.5, 7)
+    # URL-safe and unpadded
+    assert "=" not in encode_cursor(created, 42)
+
+
+@pytest.mark.parametrize("cursor", ["garbage", encode_cursor(1), encode_cursor("x", 1), encode_cursor({}, 1), "e30"])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, float, int)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_artisan_listing_pages_cover_every_artisan_once(client, db):
+    ratings = [4.5, 3.0, 4.5, 0.0, 5.0, 4.5, 3.0]
+    ids = []
+    for rating in ratings:
+        _, artisan_id = await create_artisan(db)
+        await db.execute(update(Artisan).where(Artisan.id == artisan_id).values(rating=rating))
+        ids.append(artisan_id)
+    await db.commit()
+
+    expected = [artisan_id for _, artisan_id in sorted(zip(ratings, ids), reverse=True)]
+    for limit in (1, 2, 3, len(ids), 100):
+        assert await walk(client, "/api/artisans/", limit) == expected
+
+
+@pytest.mark.anyio
+async def test_invalid_cursor_is_a_bad_request(client, db):
+    response = await client.get("/api/artisans/", params={"cursor": "garbage"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.anyio
+async def test_review_pages_break_created_at_ties_by_id(client, db):
+    customer = await create_customer(db)
+    _, artisan_id = await create_artisan(db)
+    created = datetime(2026, 1, 1)
+    reviews = [
+        Review(booking_id=(await create_booking(db, customer.id, artisan_id)).id, customer_id=customer.id,
+               artisan_id=artisan_id, rating=5, created_at=created + timedelta(days=n // 3))
+        for n in range(8)
+    ]
+    db.add_all(reviews)
+    await db.commit()
+
+    expected = [review.id for review in sorted(reviews, key=lambda r: (r.created_at, r.id), reverse=True)]
+    for limit in (1, 3, 5):
+        assert await walk(client, f"/api/reviews/artisan/{artisan_id}", limit) == expected
+
+
+@pytest.mark.anyio
+async def test_booking_pages_for_customer_and_artisan(client, db):
+    customer = await create_customer(db)
+    artisan_user, artisan_id = await create_artisan(db)
+    _, other_artisan_id = await create_artisan(db)
+    created = datetime(2026, 1, 1)
+    bookings = [
+        await create_booking(db, customer.id, artisan_id if n % 4 else other_artisan_id,
+                             created_at=created + timedelta(hours=n // 2))
+        for n in range(9)
+    ]
+
+    newest_first = sorted(bookings, key=lambda b: (b.created_at, b.id), reverse=True)
+    assert await walk(client, "/api/bookings/my-bookings", 2, auth(customer.id)) == [b.id for b in newest_first]
+    assert await walk(client, "/api/bookings/artisan-bookings", 2, auth(artisan_user.id)) == [
+        b.id for b in newest_first if b.artisan_id == artisan_id
+    ]
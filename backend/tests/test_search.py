@@ -0,0 +1,89 @@
+import pytest
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.search import normalize, tokenize
+from tests.factories import auth, create_artisan
+
+
+async def search_ids(client, search: str, **params) -> list:
+    response = await client.get("/api/artisans/", params={"search": search, **params})
+    assert response.status_code == 200
+    return [artisan["id"] for artisan in response.json()]
+
+
+def test_normalize_folds_french_and_arabic():
+    assert normalize("Électricité À Fès") == "electricite a fes"
+    assert normalize("أَحْمَد") == "احمد"
+    assert normalize("مدرسة إلى") == "مدرسه الي"
+    assert normalize(None) == ""
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("Plombier à Casablanca, pour l'urgence!") == ["plombier", "casablanca", "urgence"]
+    assert tokenize("نجار في الرباط") == ["نجار", "الرباط"]
+
+
+@pytest.mark.anyio
+async def test_name_matches_rank_above_bio_matches(client, db):
+    _, in_bio = await create_artisan(db, full_name="Karim Alaoui", bio="Collègue de Youssef depuis 10 ans")
+    _, in_name = await create_artisan(db, full_name="Youssef Bennani")
+    await create_artisan(db, full_name="Omar Tazi")
+
+    assert await search_ids(client, "youssef") == [in_name, in_bio]
+
+
+@pytest.mark.anyio
+async def test_search_matches_prefixes_accents_and_arabic(client, db):
+    _, french = await create_artisan(db, full_name="Hicham", bio="Électricien spécialisé en dépannage")
+    _, arabic = await create_artisan(db, full_name="أحمد", bio="كهربائي محترف")
+
+    assert await search_ids(client, "electricien") == [french]
+    assert await search_ids(client, "ÉLECTRIC") == [french]
+    assert await search_ids(client, "احمد") == [arabic]
+    assert await search_ids(client, "كهرب") == [arabic]
+    # Every term must match
+    assert await search_ids(client, "electricien depannage") == [french]
+    assert await search_ids(client, "electricien كهربائي") == []
+    # Nothing searchable
+    assert await search_ids(client, "de la") == []
+
+
+@pytest.mark.anyio
+async def test_profile_changes_are_searchable(client, db):
+    user, artisan_id = await create_artisan(db, full_name="Rachid")
+    assert await search_ids(client, "menuisier") == []
+
+    response = await client.put("/api/artisans/me", json={"bio": "Menuisier aluminium"}, headers=auth(user.id))
+    assert response.status_code == 200
+    assert await search_ids(client, "menuisier") == [artisan_id]
+
+
+@pytest.mark.anyio
+async def test_filters_apply_before_the_results_are_cut_off(client, db):
+    # Better-ranked matches elsewhere must not crowd out the only one in Tanger
+    for _ in range(6):
+        await create_artisan(db, full_name="Mehdi Plombier", city="Rabat")
+    _, tanger = await create_artisan(db, full_name="Mehdi", city="Tanger", bio="Plombier")
+
+    assert await search_ids(client, "plombier", city="Tanger", limit=2) == [tanger]
+    assert len(await search_ids(client, "plombier", city="Rabat", limit=2)) == 2
+
+
+@pytest.mark.anyio
+async def test_search_pages_follow_the_cursor(client, db):
+    for n in range(7):
+        await create_artisan(db, full_name=f"Nabil {'Zellige ' * (n % 3)}", bio="zellige traditionnel")
+    expected = await search_ids(client, "zellige", limit=100)
+    assert len(expected) == 7
+
+    ids, cursor = [], None
+    while True:
+        params = {"search": "zellige", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/artisans/", params=params)
+        ids += [artisan["id"] for artisan in response.json()]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+    assert ids == expected
+
+    # The deprecated offset still works on the first page
+    assert await search_ids(client, "zellige", skip=2, limit=3) == expected[2:5]
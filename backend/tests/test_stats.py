@@ -0,0 +1,172 @@
+import asyncio
+import pytest
+from sqlalchemy import delete, select, update
+from app.models.artisan import Artisan
+from app.models.booking import BookingStatus
+from app.models.review import ArtisanReviewStats
+from app.core.stats import (
+    average_rating,
+    check_review_stats,
+    reconcile_artisan_stats,
+    rebuild_review_stats,
+    star_bucket,
+)
+from tests.factories import auth, create_artisan, create_booking, create_customer
+
+
+async def post_review(client, db, customer, artisan_id: int, rating: float, **sub_ratings):
+    booking = await create_booking(db, customer.id, artisan_id)
+    response = await client.post(
+        "/api/reviews/", json={"booking_id": booking.id, "rating": rating, **sub_ratings}, headers=auth(customer.id)
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def aggregates(db, artisan_id: int):
+    db.expire_all()
+    return (await db.execute(
+        select(Artisan.rating_sum, Artisan.total_reviews, Artisan.rating, Artisan.completed_jobs)
+        .where(Artisan.id == artisan_id)
+    )).one()
+
+
+def test_average_rating():
+    assert average_rating(0.0, 0) == 0.0
+    assert average_rating(14.0, 3) == 4.67
+    # Half up, like ROUND() in the database
+    assert average_rating(21.0, 8) == 2.63
+
+
+@pytest.mark.anyio
+async def test_reviews_update_the_artisan_aggregates(client, db):
+    customer = await create_customer(db)
+    _, artisan_id = await create_artisan(db)
+
+    for rating in (4, 5, 3, 5):
+        await post_review(client, db, customer, artisan_id, rating)
+
+    assert tuple(await aggregates(db, artisan_id)) == (17.0, 4, 4.25, 0)
+    profile = (await client.get(f"/api/artisans/{artisan_id}")).json()
+    assert (profile["rating"], profile["total_reviews"]) == (4.25, 4)
+
+
+@pytest.mark.anyio
+async def test_concurrent_reviews_are_all_counted(client, db):
+    customers = [await create_customer(db) for _ in range(8)]
+    _, artisan_id = await create_artisan(db)
+    bookings = [await create_booking(db, customer.id, artisan_id) for customer in customers]
+
+    responses = await asyncio.gather(*(
+        client.post("/api/reviews/", json={"booking_id": booking.id, "rating": 1 + n % 5},
+                    headers=auth(booking.customer_id))
+        for n, booking in enumerate(bookings)
+    ))
+    assert all(response.status_code == 200 for response in responses)
+
+    rating_sum, total_reviews, rating, _ = await aggregates(db, artisan_id)
+    assert (rating_sum, total_reviews) == (sum(1 + n % 5 for n in range(8)), 8)
+    assert rating == average_rating(rating_sum, total_reviews)
+
+
+@pytest.mark.anyio
+async def test_completing_a_booking_counts_the_job(client, db):
+    customer = await create_customer(db)
+    artisan_user, artisan_id = await create_artisan(db)
+    booking = await create_booking(db, customer.id, artisan_id, status=BookingStatus.IN_PROGRESS)
+
+    response = await client.post(f"/api/bookings/{booking.id}/complete", headers=auth(artisan_user.id))
+    assert response.status_code == 200
+    assert (await aggregates(db, artisan_id)).completed_jobs == 1
+
+
+@pytest.mark.anyio
+async def test_reconcile_corrects_drifted_aggregates(client, db):
+    customer = await create_customer(db)
+    _, artisan_id = await create_artisan(db)
+    _, untouched_id = await create_artisan(db)
+    for rating in (5, 4):
+        await post_review(client, db, customer, artisan_id, rating)
+    await create_booking(db, customer.id, artisan_id)
+
+    # Bookings written directly as completed: their jobs were never counted
+    assert await reconcile_artisan_stats(db, dry_run=True) == 1
+    await db.execute(update(Artisan).where(Artisan.id == artisan_id).values(rating=1.0, rating_sum=0, total_reviews=7))
+    await db.commit()
+
+    assert await reconcile_artisan_stats(db, dry_run=True) == 1
+    assert tuple(await aggregates(db, artisan_id)) == (0.0, 7, 1.0, 0)
+
+    assert await reconcile_artisan_stats(db) == 1
+    assert tuple(await aggregates(db, artisan_id)) == (9.0, 2, 4.5, 3)
+    assert tuple(await aggregates(db, untouched_id)) == (0.0, 0, 0.0, 0)
+    assert await reconcile_artisan_stats(db, dry_run=True) == 0
+
+
+def test_star_buckets():
+    assert [star_bucket(rating) for rating in (0.5, 1, 1.9, 2, 3.5, 4.99, 5)] == [1, 1, 1, 2, 3, 4, 5]
+
+
+@pytest.mark.anyio
+async def test_review_stats_endpoint(client, db):
+    customer = await create_customer(db)
+    _, artisan_id = await create_artisan(db)
+
+    empty = (await client.get(f"/api/reviews/stats/{artisan_id}")).json()
+    assert empty == {
+        "total_reviews": 0, "average_rating": 0.0,
+        "distribution": {str(star): 0 for star in range(1, 6)},
+        "quality_rating": 0, "punctuality_rating": 0, "communication_rating": 0,
+    }
+    assert (await client.get("/api/reviews/stats/999999")).status_code == 404
+
+    await post_review(client, db, customer, artisan_id, 5, quality_rating=5, punctuality_rating=4)
+    await post_review(client, db, customer, artisan_id, 4, quality_rating=4)
+    await post_review(client, db, customer, artisan_id, 2)
+
+    # Served fresh although the empty stats were cached
+    stats = (await client.get(f"/api/reviews/stats/{artisan_id}")).json()
+    assert stats == {
+        "total_reviews": 3, "average_rating": 3.67,
+        "distribution": {"1": 0, "2": 1, "3": 0, "4": 1, "5": 1},
+        "quality_rating": 4.5, "punctuality_rating": 4.0, "communication_rating": 0,
+    }
+
+
+@pytest.mark.anyio
+async def test_concurrent_first_reviews_share_one_stats_row(client, db):
+    customers = [await create_customer(db) for _ in range(6)]
+    _, artisan_id = await create_artisan(db)
+    bookings = [await create_booking(db, customer.id, artisan_id) for customer in customers]
+
+    responses = await asyncio.gather(*(
+        client.post("/api/reviews/", json={"booking_id": booking.id, "rating": 5, "quality_rating": 3},
+                    headers=auth(booking.customer_id))
+        for booking in bookings
+    ))
+    assert all(response.status_code == 200 for response in responses)
+
+    stats = await db.get(ArtisanReviewStats, artisan_id)
+    assert (stats.star_5, stats.quality_sum, stats.quality_count) == (6, 18.0, 6)
+    assert await check_review_stats(db) == []
+
+
+@pytest.mark.anyio
+async def test_rebuild_review_stats_repairs_drift(client, db):
+    customer = await create_customer(db)
+    _, artisan_id = await create_artisan(db)
+    _, other_id = await create_artisan(db)
+    await post_review(client, db, customer, artisan_id, 3, communication_rating=2)
+    await post_review(client, db, customer, other_id, 1)
+    assert await check_review_stats(db) == []
+
+    await db.execute(update(ArtisanReviewStats).where(ArtisanReviewStats.artisan_id == artisan_id).values(star_3=0))
+    await db.execute(delete(ArtisanReviewStats).where(ArtisanReviewStats.artisan_id == other_id))
+    await db.commit()
+    assert await check_review_stats(db) == sorted([artisan_id, other_id])
+
+    assert await rebuild_review_stats(db) == 2
+    assert await check_review_stats(db) == []
+    db.expire_all()
+    stats = await db.get(ArtisanReviewStats, artisan_id)
+    assert (stats.star_3, stats.communication_sum, stats.communication_count) == (1, 2.0, 1)
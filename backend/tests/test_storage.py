@@ -0,0 +1,196 @@
+import hashlib
+import os
+import pytest
+from fastapi import HTTPException
+from app.config import settings
+from app.core.storage import (
+    IMMUTABLE,
+    MUTABLE,
+    LocalStorage,
+    S3Storage,
+    content_digest,
+    content_key,
+    get_storage,
+    parse_range,
+)
+
+CONTENT = bytes(range(256)) * 4
+DIGEST = hashlib.sha256(CONTENT).hexdigest()
+KEY = content_key(DIGEST, ".png")
+
+
+async def put(storage, key: str, data: bytes, tmp_path):
+    source = tmp_path / f"source-{len(os.listdir(tmp_path))}"
+    source.write_bytes(data)
+    await storage.put(str(source), key)
+    assert not source.exists()
+
+
+class NotFound(Exception):
+    response = {"Error": {"Code": "404"}}
+
+
+class FakeS3Client:
+    """The few boto3 S3 client calls S3Storage makes, against a dict."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise NotFound()
+        return {}
+
+    def upload_file(self, source, bucket, key, ExtraArgs):
+        with open(source, "rb") as file:
+            self.objects[(bucket, key)] = (file.read(), ExtraArgs)
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+
+def test_content_keys():
+    assert KEY == f"{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.png"
+    assert content_digest(KEY) == DIGEST
+    assert content_digest(content_key(DIGEST, "_sm.webp")) == DIGEST
+    assert content_digest("avatars/photo.png") is None
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-5", (95, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=5-1", None),
+    ("bytes=-", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range(header, 100)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */100"
+
+
+def test_local_paths_stay_inside_the_root(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    assert storage.path(KEY) == os.path.join(str(tmp_path), KEY)
+    for key in ("../secret", "ab/../../secret", "/etc/passwd", "tmp/upload", "", "."):
+        with pytest.raises(HTTPException) as error:
+            storage.path(key)
+        assert error.value.status_code == 404, key
+
+
+@pytest.mark.anyio
+async def test_local_put_is_idempotent_for_content_keys(tmp_path):
+    storage = LocalStorage(str(tmp_path / "root"))
+    await put(storage, KEY, CONTENT, tmp_path)
+    await put(storage, KEY, CONTENT, tmp_path)
+    assert await storage.exists(KEY)
+    assert (tmp_path / "root" / KEY).read_bytes() == CONTENT
+
+    await storage.delete(KEY)
+    await storage.delete(KEY)
+    assert not await storage.exists(KEY)
+
+
+@pytest.mark.anyio
+async def test_serving_with_etags_and_ranges(client, tmp_path):
+    await put(get_storage(), KEY, CONTENT, tmp_path)
+    url = f"/uploads/{KEY}"
+    size = len(CONTENT)
+
+    response = await client.get(url)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{DIGEST}"'
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "image/png"
+
+    assert (await client.get(url, headers={"If-None-Match": f'"{DIGEST}"'})).status_code == 304
+    assert (await client.get(url, headers={"If-None-Match": f'"other", W/"{DIGEST}"'})).status_code == 304
+    assert (await client.get(url, headers={"If-None-Match": '"other"'})).status_code == 200
+
+    response = await client.get(url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10-19/{size}"
+    assert response.content == CONTENT[10:20]
+
+    response = await client.get(url, headers={"Range": "bytes=-5"})
+    assert (response.status_code, response.content) == (206, CONTENT[-5:])
+
+    response = await client.get(url, headers={"Range": f"bytes={size}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{size}"
+
+    # If-Range: the range only applies to the representation it names
+    response = await client.get(url, headers={"Range": "bytes=0-1", "If-Range": '"stale"'})
+    assert (response.status_code, response.content) == (200, CONTENT)
+    response = await client.get(url, headers={"Range": "bytes=0-1", "If-Range": f'"{DIGEST}"'})
+    assert (response.status_code, response.content) == (206, CONTENT[:2])
+
+    response = await client.head(url)
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(size)
+    assert response.content == b""
+
+
+@pytest.mark.anyio
+async def test_files_not_named_by_digest_are_revalidated(client, tmp_path):
+    await put(get_storage(), "legacy/photo.jpg", b"old upload", tmp_path)
+    response = await client.get("/uploads/legacy/photo.jpg")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == MUTABLE
+    assert (await client.get("/uploads/legacy/photo.jpg",
+                             headers={"If-None-Match": response.headers["etag"]})).status_code == 304
+
+
+@pytest.mark.anyio
+async def test_serving_refuses_paths_outside_the_store(client, tmp_path):
+    os.makedirs(os.path.join(settings.UPLOAD_DIR, "tmp"), exist_ok=True)
+    with open(os.path.join(settings.UPLOAD_DIR, "tmp", "partial"), "wb") as file:
+        file.write(b"in progress")
+    with open(os.path.join(os.path.dirname(settings.UPLOAD_DIR), "outside"), "wb") as file:
+        file.write(b"secret")
+
+    for path in ("/uploads/tmp/partial", "/uploads/%2e%2e/outside", "/uploads/..%2foutside",
+                 "/uploads/missing.png", "/uploads/tmp"):
+        assert (await client.get(path)).status_code == 404, path
+
+
+@pytest.mark.anyio
+async def test_s3_storage(tmp_path):
+    s3 = FakeS3Client()
+    storage = S3Storage("bucket", client=s3, public_url="https://cdn.test/")
+
+    await put(storage, KEY, CONTENT, tmp_path)
+    data, extra = s3.objects[("bucket", KEY)]
+    assert data == CONTENT
+    assert extra == {"ContentType": "image/png", "CacheControl": IMMUTABLE}
+    assert await storage.exists(KEY)
+
+    # Already stored: not uploaded again
+    s3.objects[("bucket", KEY)] = (b"kept", extra)
+    await put(storage, KEY, CONTENT, tmp_path)
+    assert s3.objects[("bucket", KEY)][0] == b"kept"
+
+    assert storage.url(KEY) == f"https://cdn.test/{KEY}"
+    assert S3Storage("bucket", client=s3).url(KEY) == f"/uploads/{KEY}"
+
+    response = await storage.serve(None, KEY)
+    assert response.status_code == 307
+    assert response.headers["location"].startswith(f"https://s3.test/bucket/{KEY}")
+
+    await storage.delete(KEY)
+    assert not await storage.exists(KEY)
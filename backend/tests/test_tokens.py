@@ -0,0 +1,178 @@
+import asyncio
+import base64
+import json
+import time
+from datetime import datetime, timedelta
+import pytest
+from jose import jwt
+from app.models.token import RevokedToken
+from app.core import tokens
+from app.core.tokens import DEFAULT_KID, BloomFilter, Keyring, RevocationList
+from tests.factories import PASSWORD, create_customer
+
+KEYS = {DEFAULT_KID: "default-secret", "2026-10": "october-secret"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_revocations(monkeypatch):
+    # This process's revocations, empty for each test
+    monkeypatch.setattr(tokens, "revocations", RevocationList(
+        capacity=1000, sync_seconds=0, full_sync_seconds=3600, overlap_seconds=60
+    ))
+
+
+def claims(**extra) -> dict:
+    return {"sub": "1", "jti": "abc", "exp": int(time.time()) + 600, **extra}
+
+
+def segment(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+def test_sign_and_verify():
+    keyring = Keyring(KEYS, "2026-10", "HS256")
+    token = keyring.sign(claims())
+    assert jwt.get_unverified_header(token)["kid"] == "2026-10"
+    assert keyring.verify(token)["sub"] == "1"
+
+
+def test_key_rotation():
+    old = Keyring(KEYS, DEFAULT_KID, "HS256")
+    rotated = Keyring(KEYS, "2026-10", "HS256")
+    retired = Keyring({"2026-10": KEYS["2026-10"]}, "2026-10", "HS256")
+    token = old.sign(claims())
+
+    assert rotated.verify(token) is not None
+    assert retired.verify(token) is None
+    # Tokens from before key ids were signed with SECRET_KEY and have no kid
+    legacy = jwt.encode(claims(), KEYS[DEFAULT_KID], algorithm="HS256")
+    assert rotated.verify(legacy) is not None
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "not a token",
+    "a.b.c",
+    # alg "none", unsigned
+    f"{segment({'alg': 'none', 'kid': DEFAULT_KID})}.{segment(claims())}.",
+    # Another HMAC algorithm with the right secret
+    jwt.encode(claims(), KEYS[DEFAULT_KID], algorithm="HS512", headers={"kid": DEFAULT_KID}),
+    # Unknown key id, and a kid that is not a string
+    jwt.encode(claims(), KEYS[DEFAULT_KID], algorithm="HS256", headers={"kid": "unknown"}),
+    jwt.encode(claims(), KEYS[DEFAULT_KID], algorithm="HS256", headers={"kid": ["default"]}),
+    # Signed with the secret of another kid
+    jwt.encode(claims(), KEYS["2026-10"], algorithm="HS256", headers={"kid": DEFAULT_KID}),
+    # Expired, and no expiry at all
+    jwt.encode(claims(exp=int(time.time()) - 10), KEYS[DEFAULT_KID], algorithm="HS256"),
+    jwt.encode({"sub": "1", "jti": "abc"}, KEYS[DEFAULT_KID], algorithm="HS256"),
+])
+def test_verify_rejects(token):
+    assert Keyring(KEYS, DEFAULT_KID, "HS256").verify(token) is None
+
+
+def test_verify_rejects_tampering():
+    keyring = Keyring(KEYS, "2026-10", "HS256")
+    header, payload, signature = keyring.sign(claims()).split(".")
+    forged_payload = segment(claims(sub="2"))
+    forged_header = segment({"alg": "HS256", "typ": "JWT", "kid": DEFAULT_KID})
+    assert keyring.verify(f"{header}.{forged_payload}.{signature}") is None
+    assert keyring.verify(f"{forged_header}.{payload}.{signature}") is None
+
+
+def test_keyring_configuration_errors():
+    with pytest.raises(ValueError):
+        Keyring(KEYS, DEFAULT_KID, "RS256")
+    with pytest.raises(ValueError):
+        Keyring(KEYS, "missing", "HS256")
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000)
+    items = [f"token-{n}" for n in range(1000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+    assert sum(f"other-{n}" in bloom for n in range(10_000)) < 50
+
+
+@pytest.mark.anyio
+async def test_revocation_sync_picks_up_late_commits(db):
+    revocations = RevocationList(capacity=100, sync_seconds=0, full_sync_seconds=3600, overlap_seconds=60)
+    now = datetime.utcnow()
+    expires = now + timedelta(hours=1)
+
+    db.add(RevokedToken(token_id="first", expires_at=expires, revoked_at=now))
+    await db.commit()
+    await revocations.sync(db)
+    assert revocations.is_revoked("first")
+
+    # Committed after the last sync with an earlier timestamp (and a higher id)
+    db.add(RevokedToken(token_id="late", expires_at=expires, revoked_at=now - timedelta(seconds=30)))
+    db.add(RevokedToken(token_id="too-late", expires_at=expires, revoked_at=now - timedelta(seconds=120)))
+    await db.commit()
+    await revocations.sync(db)
+    assert revocations.is_revoked("late")
+    assert not revocations.is_revoked("too-late")
+
+    # A full sync reads everything unexpired
+    db.add(RevokedToken(token_id="expired", expires_at=now - timedelta(seconds=1), revoked_at=now))
+    await db.commit()
+    await revocations.sync(db, full=True)
+    assert revocations.is_revoked("too-late", None)
+    assert not revocations.is_revoked("expired")
+    assert not revocations.is_revoked(None)
+
+
+async def login(client, email: str) -> dict:
+    response = await client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def me(client, access_token: str) -> int:
+    return (await client.get("/api/auth/me", headers={"Authorization": f"Bearer {access_token}"})).status_code
+
+
+@pytest.mark.anyio
+async def test_refresh_rotates_and_reuse_revokes_the_login(client, db):
+    user = await create_customer(db)
+    first = await login(client, user.email)
+    other_login = await login(client, user.email)
+
+    response = await client.post("/api/auth/refresh", params={"refresh_token": first["refresh_token"]})
+    assert response.status_code == 200
+    second = response.json()
+    assert await me(client, second["access_token"]) == 200
+
+    response = await client.post("/api/auth/refresh", params={"refresh_token": first["refresh_token"]})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Refresh token already used; session revoked"
+
+    # Every token of that login is revoked; other logins are not
+    assert await me(client, second["access_token"]) == 401
+    assert (await client.post("/api/auth/refresh", params={"refresh_token": second["refresh_token"]})).status_code == 401
+    assert await me(client, other_login["access_token"]) == 200
+
+
+@pytest.mark.anyio
+async def test_concurrent_refreshes_with_one_token(client, db):
+    user = await create_customer(db)
+    pair = await login(client, user.email)
+
+    responses = await asyncio.gather(*(
+        client.post("/api/auth/refresh", params={"refresh_token": pair["refresh_token"]}) for _ in range(3)
+    ))
+    assert sorted(response.status_code for response in responses) == [200, 401, 401]
+
+
+@pytest.mark.anyio
+async def test_logout_revokes_access_and_refresh_tokens(client, db):
+    user = await create_customer(db)
+    pair = await login(client, user.email)
+
+    response = await client.post("/api/auth/logout", params={"refresh_token": pair["refresh_token"]})
+    assert response.status_code == 204
+    assert await me(client, pair["access_token"]) == 401
+    assert (await client.post("/api/auth/refresh", params={"refresh_token": pair["refresh_token"]})).status_code == 401
+    # Access tokens are not refresh tokens
+    assert (await client.post("/api/auth/refresh", params={"refresh_token": pair["access_token"]})).status_code == 401
@@ -0,0 +1,136 @@
+import os
+import pytest
+from app.config import settings
+from app.core import images
+from app.core.images import THUMBNAIL_SIZES, process_image, sniff_format, thumbnail_url, thumbnail_urls
+from app.core.storage import TMP_DIR
+from tests.factories import auth, create_artisan, png
+
+UPLOAD = "/api/artisans/me/portfolio/upload"
+
+
+def stored_files() -> list:
+    return sorted(
+        os.path.relpath(os.path.join(root, name), settings.UPLOAD_DIR)
+        for root, _, names in os.walk(settings.UPLOAD_DIR)
+        for name in names
+        if os.path.relpath(root, settings.UPLOAD_DIR).split(os.sep)[0] != TMP_DIR
+    )
+
+
+def temporary_files() -> list:
+    directory = os.path.join(settings.UPLOAD_DIR, TMP_DIR)
+    return os.listdir(directory) if os.path.isdir(directory) else []
+
+
+def test_sniff_format():
+    assert sniff_format(png()[:16]) == "png"
+    assert sniff_format(b"\xff\xd8\xff\xe0" + bytes(12)) == "jpg"
+    assert sniff_format(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert sniff_format(b"GIF89a" + bytes(10)) is None
+    assert sniff_format(b"") is None
+
+
+def test_thumbnail_urls_only_for_uploads():
+    assert thumbnail_url("/uploads/ab/cd/abcd.png", "sm") == "/uploads/ab/cd/abcd_sm.webp"
+    assert thumbnail_url("https://example.com/a.png", "sm") == "https://example.com/a.png"
+    assert thumbnail_url(None, "sm") is None
+    assert set(thumbnail_urls("/uploads/ab/cd/abcd.jpg")) == set(THUMBNAIL_SIZES)
+    assert thumbnail_urls("https://example.com/a.png") == {}
+
+
+def test_process_image_writes_thumbnails(tmp_path):
+    source = tmp_path / "upload"
+    source.write_bytes(png(2000, 1000))
+    name = process_image(str(source), str(tmp_path / "out"), "digest")
+
+    assert name == "digest.png"
+    assert not source.exists()
+    from PIL import Image
+    for size, pixels in THUMBNAIL_SIZES.items():
+        with Image.open(tmp_path / "out" / f"digest_{size}.webp") as thumbnail:
+            assert thumbnail.size == (pixels, pixels // 2)
+
+
+def test_process_image_rejects_broken_and_oversized_images(tmp_path, monkeypatch):
+    broken = tmp_path / "broken"
+    broken.write_bytes(png()[:40])
+    with pytest.raises(ValueError):
+        process_image(str(broken), str(tmp_path / "out"), "broken")
+
+    gif = tmp_path / "gif"
+    from PIL import Image
+    Image.new("P", (8, 8)).save(gif, "GIF")
+    with pytest.raises(ValueError, match="Unsupported image format"):
+        process_image(str(gif), str(tmp_path / "out"), "gif")
+
+    monkeypatch.setattr(images, "MAX_IMAGE_PIXELS", 1000)
+    bomb = tmp_path / "bomb"
+    bomb.write_bytes(png(200, 200))
+    with pytest.raises(ValueError, match="Invalid image"):
+        process_image(str(bomb), str(tmp_path / "out"), "bomb")
+
+
+@pytest.mark.anyio
+async def test_upload_stores_image_and_thumbnails_once(client, db):
+    user, _ = await create_artisan(db)
+    image = png()
+
+    response = await client.post(UPLOAD, headers=auth(user.id), files={"image": ("a.png", image, "image/png")},
+                                 data={"title": "Cuisine"})
+    assert response.status_code == 200, response.text
+    item = response.json()
+    assert item["title"] == "Cuisine"
+    assert item["image_url"].startswith("/uploads/") and item["image_url"].endswith(".png")
+    assert item["thumbnail"] == thumbnail_url(item["image_url"], "md")
+    files = stored_files()
+    assert len(files) == 1 + len(THUMBNAIL_SIZES)
+
+    # Same content under another name: stored once
+    again = (await client.post(UPLOAD, headers=auth(user.id), files={"image": ("b.png", image, "image/png")})).json()
+    assert again["image_url"] == item["image_url"]
+    assert stored_files() == files
+    assert temporary_files() == []
+
+
+@pytest.mark.anyio
+async def test_upload_rejections(client, db, monkeypatch):
+    user, _ = await create_artisan(db)
+    headers = auth(user.id)
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 20_000)
+
+    response = await client.post(UPLOAD, headers=headers, files={"image": ("a.txt", b"hello", "text/plain")})
+    assert (response.status_code, response.json()["detail"]) == (400, "Unsupported image format")
+
+    response = await client.post(UPLOAD, headers=headers, files={"image": ("a.png", os.urandom(30_000), "image/png")})
+    assert response.status_code == 413
+
+    response = await client.post(UPLOAD, headers=headers, files={"image": ("a.png", png(), "image/png")},
+                                 data={"title": "x" * 20_000})
+    assert (response.status_code, response.json()["detail"]) == (413, "Form field too large")
+
+    response = await client.post(UPLOAD, headers=headers, files={"title": (None, "No image")})
+    assert (response.status_code, response.json()["detail"]) == (400, "An image file is required")
+
+    response = await client.post(UPLOAD, headers=headers, json={"image": "a.png"})
+    assert response.status_code == 415
+
+    # Announced as too large: refused before the body is read
+    response = await client.post(UPLOAD, headers={**headers, "Content-Type": "multipart/form-data; boundary=x",
+                                                  "Content-Length": "10000000"}, content=b"")
+    assert response.status_code == 413
+
+    assert stored_files() == []
+    assert temporary_files() == []
+
+
+@pytest.mark.anyio
+async def test_unexpected_file_fields_are_discarded(client, db):
+    user, _ = await create_artisan(db)
+    response = await client.post(UPLOAD, headers=auth(user.id), files={
+        "image": ("a.png", png(), "image/png"),
+        "other": ("b.png", png(color=(0, 0, 255)), "image/png"),
+    })
+    assert response.status_code == 200
+    assert len(stored_files()) == 1 + len(THUMBNAIL_SIZES)
+    assert temporary_files() == []